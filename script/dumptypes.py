@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import os
+from argparse import ArgumentParser
+from pathlib import Path
+
+from odiff.lib import LIBRARIES
+from odiff.paths import REPO_ROOT
+from odiff.typedb import TypeDatabase, dump_header_files
+from odiff.utils import atomic_write
+
+
+def main():
+    parser = ArgumentParser(description="Dump the C types of vendor libraries, as recovered from their DWARF")
+    parser.add_argument(
+        '-o', '--output-dir', type=str, default=str(REPO_ROOT / 'dwarf'), help="Directory to write <library>.h to")
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help="Collect every object again")
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help="Number of objects to collect in parallel. 0 uses one process per CPU")
+    parser.add_argument(
+        '--vendor-archives', action='store_true',
+        help="Read vendor objects from blobs/<library>.a instead of the extracted <library>/*.o")
+    parser.add_argument(dest='libraries', type=str, nargs='*', help="Libraries to dump (default: all)")
+    args = parser.parse_args()
+    unknown = set(args.libraries) - {lib.name for lib in LIBRARIES}
+    if unknown:
+        parser.error(f"Unknown libraries: {', '.join(sorted(unknown))}")
+    jobs: int = args.jobs or os.cpu_count() or 1
+    if args.vendor_archives:
+        for lib in LIBRARIES:
+            lib.use_archive()
+    for lib in LIBRARIES:
+        if args.libraries and lib.name not in args.libraries:
+            continue
+        db = TypeDatabase.load(lib, jobs, use_stored=args.cache)
+        atomic_write(Path(args.output_dir) / f'{lib.name}.h', dump_header_files(db.header_files()).encode())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import os
+import sys
+from argparse import ArgumentParser
+from collections import namedtuple
+from functools import partial
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List, Optional, Dict, Tuple
+
+from funcdiff import CFLAGS, diff_objects
+from odiff.diff import DEFAULT_MAX_COST
+from odiff.funccache import FunctionCache, DISASSEMBLERS
+from odiff.lib import Library, LIBRARIES, ObjectCache
+from odiff.results import run_info, write_json
+from odiff.toolchain import find_toolchain
+from odiff.utils import parallel_map
+
+BASELINE_OPT_LEVEL = '-Os'
+OPT_LEVELS = ['-Os', '-O2', '-O1']
+# Flags that commonly explain the remaining differences with vendor code built at the same optimization level
+EXTRA_FLAG_SETS = [
+    [],
+    ['-fno-inline'],
+    ['-fno-inline-small-functions'],
+    ['-fno-optimize-sibling-calls'],
+    ['-fno-tree-switch-conversion'],
+    ['-fno-tree-loop-optimize'],
+]
+
+# Build flags of a variant, on top of CFLAGS: the optimization level replaces -Os, extra flags are appended
+Variant = namedtuple('Variant', 'opt_level extra_flags')
+VariantResult = namedtuple('VariantResult', 'variant failed similarity functions')
+
+
+def variant_name(variant: Variant) -> str:
+    return ' '.join((variant.opt_level, *variant.extra_flags))
+
+
+def variant_cflags(variant: Variant) -> List[str]:
+    return [*(variant.opt_level if flag == BASELINE_OPT_LEVEL else flag for flag in CFLAGS), *variant.extra_flags]
+
+
+def build_variant(build_dir: Path, lib: Library, vendorobj_path: Path, cache: Optional[ObjectCache],
+                  vendor_cache: Optional[FunctionCache], disassembler: str, max_cost: int,
+                  task: Tuple[int, Variant]) -> VariantResult:
+    idx, variant = task
+    # Every variant builds an object of the same name
+    variant_dir = build_dir / str(idx)
+    variant_dir.mkdir()
+    _, result, reobj_path = lib.build_obj(variant_dir, vendorobj_path, variant_cflags(variant), cache)
+    if result.returncode != 0:
+        return VariantResult(variant, True, 0, [])
+    _, similarity, _, functions = diff_objects(lib.name, vendorobj_path, reobj_path, vendor_cache, disassembler, max_cost)
+    return VariantResult(variant, False, similarity, functions)
+
+
+def best_variants(results: List[VariantResult]) -> Dict[str, Tuple[float, List[Variant]]]:
+    """
+    :returns: Best similarity of each function, and the variants that reach it (in the order of ``results``)
+    """
+    best: Dict[str, Tuple[float, List[Variant]]] = {}
+    for result in results:
+        for func in result.functions:
+            similarity, variants = best.get(func.name, (-1, []))
+            if func.similarity > similarity:
+                best[func.name] = (func.similarity, [result.variant])
+            elif func.similarity == similarity:
+                variants.append(result.variant)
+    return best
+
+
+def print_results(results: List[VariantResult]):
+    baseline = results[0]
+    print(f'{"flags":<60} {"similarity":>10} {"equivalent":>10}')
+    for result in sorted(results, key=lambda r: -r.similarity):
+        if result.failed:
+            print(f'{variant_name(result.variant):<60} {"failed":>10}')
+            continue
+        equivalent = sum(f.status == 'equivalent' for f in result.functions)
+        print(f'{variant_name(result.variant):<60} {result.similarity * 100:>9.1f}% '
+              f'{f"{equivalent}/{len(result.functions)}":>10}')
+    print()
+    baseline_similarities = {f.name: f.similarity for f in baseline.functions}
+    improved = [
+        (name, similarity, variants) for name, (similarity, variants) in best_variants(results).items()
+        if similarity > baseline_similarities.get(name, 0)
+    ]
+    if not improved:
+        print("No variant improves on the baseline for any function")
+        return
+    print("Functions that other flags match better:")
+    for name, similarity, variants in improved:
+        print(f'  {name}: {baseline_similarities.get(name, 0) * 100:.0f}% -> {similarity * 100:.0f}% with '
+              f'{", ".join(variant_name(v) for v in variants)}')
+
+
+def main():
+    parser = ArgumentParser(
+        description="Build an object with variations of the compiler flags, to find those matching its functions best")
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1, help="Number of variants to build in parallel. 0 uses one process per CPU")
+    parser.add_argument(
+        '-O', dest='opt_levels', type=lambda level: f'-O{level}', action='append',
+        help=f"Optimization level to try, e.g. -O2, can be repeated (default: {' '.join(OPT_LEVELS)})")
+    parser.add_argument(
+        '-f', '--flags', dest='flag_sets', type=str, action='append',
+        help="Space-separated flags to try at each optimization level, e.g. --flags='-fno-inline -fno-ipa-cp', can be "
+             "repeated (default: a set of -fno-* flags, one at a time)")
+    parser.add_argument(
+        '--no-cache', dest='cache', action='store_false', help="Always rebuild objects and re-parse vendor objects")
+    parser.add_argument(
+        '--disassembler', choices=DISASSEMBLERS, default='objdump',
+        help="Disassemble with the toolchain's objdump, or decode ELF objects natively (faster)")
+    parser.add_argument(
+        '--max-diff-cost', dest='max_cost', type=int, default=DEFAULT_MAX_COST,
+        help="Number of edits after which large functions are diffed block by block (between labels) instead")
+    parser.add_argument(
+        '--vendor-archives', action='store_true',
+        help="Read vendor objects from blobs/<library>.a instead of the extracted <library>/*.o")
+    parser.add_argument('--json', type=str, help="Also write the results of every variant to this JSON file")
+    parser.add_argument(dest='object', type=str, help="Object to build, e.g. libatcmd/at_server.o")
+    args = parser.parse_args()
+    if args.vendor_archives:
+        for lib in LIBRARIES:
+            lib.use_archive()
+    matches = [(lib, path) for lib in LIBRARIES for path in lib.get_vendorobj_paths([args.object])]
+    if len(matches) != 1:
+        parser.error(f"{args.object} matches {len(matches)} objects instead of one")
+    lib, vendorobj_path = matches[0]
+    try:
+        find_toolchain()
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    jobs: int = args.jobs or os.cpu_count() or 1
+    flag_sets = [flags.split() for flags in args.flag_sets] if args.flag_sets else EXTRA_FLAG_SETS
+    # The baseline (funcdiff's flags) comes first, so that it wins ties
+    variants = [Variant(BASELINE_OPT_LEVEL, [])] + [
+        variant for variant in (
+            Variant(opt_level, flags) for opt_level in args.opt_levels or OPT_LEVELS for flags in flag_sets)
+        if variant != Variant(BASELINE_OPT_LEVEL, [])
+    ]
+
+    cache = ObjectCache() if args.cache else None
+    vendor_cache = FunctionCache(disassembler=args.disassembler) if args.cache else None
+    if vendor_cache is not None:
+        # Bring the vendor object's entry up to date once, rather than in every worker
+        vendor_cache.get(vendorobj_path)
+    with TemporaryDirectory(prefix='flagsearch') as tmpdir:
+        results = list(parallel_map(
+            partial(build_variant, Path(tmpdir), lib, vendorobj_path, cache, vendor_cache, args.disassembler,
+                    args.max_cost),
+            list(enumerate(variants)), jobs))
+    print_results(results)
+    if args.json:
+        best = best_variants(results)
+        write_json(Path(args.json), {
+            'tool': 'flagsearch', **run_info(), 'object': f'{lib.name}/{vendorobj_path.name}',
+            'variants': [{
+                'flags': variant_name(r.variant), 'failed': r.failed, 'similarity': r.similarity,
+                'functions': {f.name: {'status': f.status, 'similarity': f.similarity} for f in r.functions}
+            } for r in results],
+            'best': {
+                name: {'similarity': similarity, 'flags': [variant_name(v) for v in variants]}
+                for name, (similarity, variants) in best.items()
+            }
+        })
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
+import json
 import os
+import shutil
+import sys
+import time
 from argparse import ArgumentParser
+from collections import namedtuple
+from functools import partial
 from html import escape
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import List, Dict, Tuple
+from typing import List, Tuple, Optional, Dict, Any, Set
 
-from odiff.asm import Function, AsmLine
-from odiff.html import HTML_HEADER, HTML_FOOTER, make_diff_table
-from odiff.lib import Library, LIBRARIES
-from odiff.toolchain import objdump
+from odiff.ar import hash_object
+from odiff.asm import AsmLine, Label
+from odiff.buildprofile import ObjectProfile, TIME_REPORT_FLAG, OBJECT_COLUMNS, FUNCTION_COLUMNS, split_time_report, \
+    profile_objects, restore_profile, profile_json, profile_rows
+from odiff.diff import DEFAULT_MAX_COST
+from odiff.funccache import FunctionCache, load_functions, DISASSEMBLERS
+from odiff.html import HTML_HEADER, HTML_FOOTER, make_diff_table, make_sortable_table
+from odiff.lib import Library, LIBRARIES, ObjectCache
+from odiff.results import run_info, write_json, write_csv, library_progress, ProgressHistory
+from odiff.toolchain import find_toolchain
+from odiff.utils import parallel_map, atomic_write
 
 CFLAGS = [
     '-march=rv32imfc',
@@ -32,31 +45,28 @@ CFLAGS = [
 ]
 
 
-def is_funcion_section(name: str) -> bool:
-    return name.startswith('text.') or name.startswith('tcm_code')
+FunctionResult = namedtuple('FunctionResult', 'name status similarity')
 
 
-def diff_objects(vendorobj_path: Path, reobj_path: Path) -> Tuple[str, float, bool]:
-    vendor_dump_result = objdump('-rd', vendorobj_path, capture_output=True)
-    vendor_funcs: Dict[str, Function] = {}
-    for section_asm in vendor_dump_result.stdout.decode().split('Disassembly of section .')[1:]:
-        lines = section_asm.splitlines()
-        if not is_funcion_section(lines[0]):
-            continue
-        f = Function(lines)
-        vendor_funcs[f.name] = f
-
-    re_dump_result = objdump('-rd', reobj_path, capture_output=True)
-    re_funcs: Dict[str, Function] = {}
-    for section_asm in re_dump_result.stdout.decode().split('Disassembly of section .')[1:]:
-        lines = section_asm.splitlines()
-        if not is_funcion_section(lines[0]):
-            continue
-        f = Function(lines)
-        re_funcs[f.name] = f
+def object_id(lib_name: str, obj_name: str) -> str:
+    """
+    Id of an object's element in the report. Libraries share some object names (e.g. ke_msg.o), hence the library.
+    """
+    return f'obj_{lib_name}_{obj_name}'
+
+
+def diff_objects(lib_name: str, vendorobj_path: Path, reobj_path: Path, vendor_cache: Optional[FunctionCache] = None,
+                 disassembler: str = 'objdump', max_cost: int = DEFAULT_MAX_COST) -> \
+        Tuple[str, float, bool, List[FunctionResult]]:
+    if vendor_cache is not None:
+        vendor_funcs = vendor_cache.get(vendorobj_path)
+    else:
+        vendor_funcs = load_functions(vendorobj_path, disassembler)
+    re_funcs = load_functions(reobj_path, disassembler)
 
     html = ''
     similarities: List[float] = []
+    functions: List[FunctionResult] = []
     for i, func_name in enumerate(vendor_funcs):
         content: str
         similarity: float = 0
@@ -68,7 +78,8 @@ def diff_objects(vendorobj_path: Path, reobj_path: Path) -> Tuple[str, float, bo
             content = f'<pre><code>{escape(os.linesep.join(l.indented_text() for l in vendor_funcs[func_name].lines))}</code></pre>'
             similarity = 1
         else:
-            status = 'different'
+            # Still shown as a diff, since the registers are what's left to fix
+            status = 'regalloc' if vendor_funcs[func_name].equivalent(re_funcs[func_name], True) else 'different'
             original_a = [*vendor_funcs[func_name].lines]
             original_b = [*re_funcs[func_name].lines]
             content, similarity = make_diff_table(
@@ -78,12 +89,222 @@ def diff_objects(vendorobj_path: Path, reobj_path: Path) -> Tuple[str, float, bo
                 [x.opcode if isinstance(x, AsmLine) else None for x in original_b],
                 get_offset=lambda l: l.offset_text(),
                 get_text=lambda l: l.indented_text(),
-                ignore_diff=lambda l: not isinstance(l, AsmLine)
+                ignore_diff=lambda l: not isinstance(l, AsmLine),
+                block_start=lambda l: isinstance(l, Label),
+                max_cost=max_cost
             )
-        html += f'<details class="func {status}" id="func_{vendorobj_path.name}_{func_name}"><summary><div class="similarity">{similarity*100:.0f}%</div><h3>{func_name}</h3></summary>\n{content}</details>\n'
+        html += f'<details class="func {status}" id="func_{lib_name}_{vendorobj_path.name}_{func_name}"><summary><div class="similarity">{similarity*100:.0f}%</div><h3>{func_name}</h3></summary>\n{content}</details>\n'
         similarities += (similarity,)
+        functions.append(FunctionResult(func_name, status, similarity))
     # TODO: .rodata equivalence checking; .LANCHORx labels are a pain however
-    return html, (sum(similarities) / len(similarities)) if similarities else 1, all(s == 1 for s in similarities)
+    return html, (sum(similarities) / len(similarities)) if similarities else 1, all(s == 1 for s in similarities), \
+        functions
+
+
+# Bump when ObjectResult changes, so that --incremental doesn't reuse results saved in another layout
+STATE_VERSION = 5
+
+
+class ObjectResult:
+    def __init__(self, name: str, classes: str, summary: str, body: str, similarity: float, equivalent: bool,
+                 buildtime: float, failed: bool, functions: List[FunctionResult],
+                 profile: Optional[ObjectProfile] = None):
+        self.name = name
+        self.classes = classes
+        self.summary = summary
+        self.body = body
+        self.similarity = similarity
+        self.equivalent = equivalent
+        self.buildtime = buildtime
+        self.failed = failed
+        # Saved states have them as lists
+        self.functions = [FunctionResult(*f) for f in functions]
+        self.profile = restore_profile(profile)
+
+    @property
+    def status(self) -> str:
+        return 'failed' if self.failed else 'equivalent' if self.equivalent else 'different'
+
+    def to_json(self) -> Dict[str, Any]:
+        result = {
+            'status': self.status,
+            'similarity': self.similarity,
+            'buildtime': self.buildtime,
+            'functions': {f.name: {'status': f.status, 'similarity': f.similarity} for f in self.functions}
+        }
+        if self.profile is not None:
+            result['profile'] = profile_json(self.profile)
+        return result
+
+    def html(self, lib_name: str, fragment: Optional[str] = None) -> str:
+        """
+        :param lib_name: Library the object belongs to, part of its element id
+        :param fragment: URL of the fragment script the body is lazily loaded from, instead of being inlined
+        """
+        element_id = object_id(lib_name, self.name)
+        if fragment is None:
+            return f'<details id="{element_id}" class="{self.classes}">{self.summary}{self.body}</details>'
+        return f'<details id="{element_id}" class="{self.classes}" data-fragment="{escape(fragment)}">' \
+               f'{self.summary}</details>'
+
+
+def write_fragment(path: Path, url: str, body: str):
+    """
+    Write an object's body as a script, which unlike fetch() also works for reports opened from file:// URLs.
+
+    :param url: URL of the script relative to the report, which identifies the object it belongs to
+    """
+    atomic_write(path, f'funcdiffFragment({json.dumps(url)}, {json.dumps(body)});\n'.encode())
+
+
+def build_and_diff(build_dir: Path, cache: Optional[ObjectCache], vendor_cache: Optional[FunctionCache],
+                   disassembler: str, max_cost: int, cflags: List[str], task: Tuple[Library, Path]) -> ObjectResult:
+    """
+    Build the reverse-engineered counterpart of a vendor object and diff the two.
+
+    :param cflags: Build flags; with ``-ftime-report``, the object is profiled as well
+    """
+    lib, vendorobj_path = task
+    # Libraries share some object names (e.g. ke_msg.o), which must not clash when built concurrently
+    lib_build_dir = build_dir / lib.name
+    lib_build_dir.mkdir(exist_ok=True)
+    buildtime, result, reobj_path = lib.build_obj(lib_build_dir, vendorobj_path, cflags, cache)
+    stderr = result.stderr.decode()
+    profile = None
+    if TIME_REPORT_FLAG in cflags:
+        stderr, timevars = split_time_report(stderr)
+        profile = profile_objects(vendorobj_path, reobj_path if result.returncode == 0 else None, timevars)
+    similarity, all_equivalent, functions = 0, False, []
+    if result.returncode == 0:
+        diff_html, similarity, all_equivalent, functions = diff_objects(
+            lib.name, vendorobj_path, reobj_path, vendor_cache, disassembler, max_cost)
+        classes = f'obj{" equivalent" if all_equivalent else ""}'
+        summary = f'<summary><div class="buildtime">{buildtime:.3f}s {similarity * 100:.0f}%</div><h2>{vendorobj_path.name}</h2></summary>'
+        body = f'{diff_html}\n'
+    else:
+        classes = 'obj failed'
+        summary = f'<summary><div class="buildtime">{buildtime:.3f}s</div><h2>{vendorobj_path.name} 🛑</h2></summary>'
+        body = '\n'
+    if len(stderr) > 0:
+        body += f'<pre><code>{escape(stderr)}</code></pre>'
+    return ObjectResult(vendorobj_path.name, classes, summary, body, similarity, all_equivalent, buildtime,
+                        result.returncode != 0, functions, profile)
+
+
+def input_key(cache: ObjectCache, lib: Library, vendorobj_path: Path, disassembler: str, max_cost: int,
+              cflags: List[str]) -> Optional[str]:
+    """
+    Identify the inputs of an object's diff: the cached RE object, the vendor object and the diff options.
+
+    :returns: Key, or None if the RE object isn't cached (i.e. it is new, has changed or failed to build)
+    """
+    reobj_key = cache.lookup(lib.source_path(vendorobj_path), lib.build_args(cflags))
+    if reobj_key is None:
+        return None
+    return f'{STATE_VERSION}:{reobj_key}:{hash_object(vendorobj_path)}:{disassembler}:{max_cost}'
+
+
+def diff_dir_objects(dir_b: Path, disassembler: str, max_cost: int, profile: bool, a_obj_path: Path) -> ObjectResult:
+    # Objects of the first directory are listed under its name
+    diff_html, similarity, all_equivalent, functions = diff_objects(
+        a_obj_path.parent.name, a_obj_path, dir_b / a_obj_path.name, None, disassembler, max_cost)
+    return ObjectResult(
+        a_obj_path.name, f'obj{" equivalent" if all_equivalent else ""}',
+        f'<summary><div class="buildtime">{similarity * 100:.0f}%</div><h2>{a_obj_path.name}</h2></summary>',
+        f'{diff_html}\n', similarity, all_equivalent, 0, False, functions,
+        profile_objects(a_obj_path, dir_b / a_obj_path.name) if profile else None)
+
+
+def profile_html(lib_results: Dict[str, List[ObjectResult]]) -> str:
+    """
+    Sortable tables of the build times and sizes of the profiled objects, and of the sizes of their functions.
+    """
+    objects, functions = profile_rows({
+        lib: [(o.name, o.buildtime, o.profile) for o in objs if o.profile is not None]
+        for lib, objs in lib_results.items()
+    })
+    return '<article class="lib profile"><h1>Build profile</h1>' \
+           f'<h2>Objects</h2>{make_sortable_table(OBJECT_COLUMNS, objects, ["text delta"])}' \
+           f'<h2>Functions</h2>{make_sortable_table(FUNCTION_COLUMNS, functions, ["size delta"])}</article>'
+
+
+def write_results(lib_results: Dict[str, List[ObjectResult]], scope: List[str], json_path: Optional[str],
+                  csv_path: Optional[str], history_path: str):
+    """
+    Write the results of a run in machine-readable form, and append its progress to the history.
+    """
+    info = run_info()
+    if json_path:
+        write_json(Path(json_path), {
+            'tool': 'funcdiff', **info, 'scope': scope,
+            'libraries': {lib: {o.name: o.to_json() for o in objs} for lib, objs in lib_results.items()}
+        })
+    if csv_path:
+        write_csv(Path(csv_path), ['library', 'object', 'function', 'status', 'similarity', 'buildtime'], (
+            row
+            for lib, objs in lib_results.items() for o in objs
+            for row in ([(lib, o.name, f.name, f.status, f.similarity, o.buildtime) for f in o.functions]
+                        if not o.failed else [(lib, o.name, '', o.status, 0, o.buildtime)])
+        ))
+    # Failed objects count as one item each, since their functions aren't known
+    ProgressHistory(Path(history_path)).append('funcdiff', info, scope, [
+        library_progress(lib, (item for o in objs for item in (o.functions if not o.failed else [o])))
+        for lib, objs in lib_results.items()
+    ])
+
+
+def affected_objects(changed: Set[Path], tasks: List[Tuple[Library, Path]], cache: Optional[ObjectCache],
+                     cflags: List[str]) -> List[Tuple[Library, Path]]:
+    """
+    :param changed: Files changed in source and include directories
+    :returns: Objects whose source changed, and if a header changed, those whose cached build went stale (or all of
+              them without a cache, which records what headers each object depends on)
+    """
+    changed = {path.resolve() for path in changed}
+    headers_changed = any(path.suffix == '.h' for path in changed)
+    affected = []
+    for lib, vendorobj_path in tasks:
+        try:
+            source_path = lib.source_path(vendorobj_path)
+        except FileNotFoundError:
+            continue
+        if source_path.resolve() in changed or headers_changed and (
+                cache is None or cache.lookup(source_path, lib.build_args(cflags)) is None):
+            affected.append((lib, vendorobj_path))
+    return affected
+
+
+def watch(output: Path, patterns: List[str], use_cache: bool, disassembler: str, max_cost: int, cflags: List[str],
+          port: int):
+    """
+    Serve the report, then rebuild and re-diff objects as their sources change and push them to the served page.
+
+    :param use_cache: Use the on-disk object and function caches
+    """
+    # Imported here, as http.server is slow to import and only watch mode needs it
+    from odiff.reportserver import ReportServer
+    from odiff.watch import watch_files
+    tasks = [(lib, vendorobj_path) for lib in LIBRARIES for vendorobj_path in lib.get_vendorobj_paths(patterns)]
+    cache = ObjectCache() if use_cache else None
+    # The vendor side doesn't change, it is parsed once (and kept in memory only without the cache)
+    vendor_cache = FunctionCache(disassembler=disassembler, keep_loaded=True) if use_cache else \
+        FunctionCache(None, disassembler, keep_loaded=True)
+    server = ReportServer(output, port)
+    server.start()
+    print(f"Serving the report at {server.url}, watching sources for changes (Ctrl-C to stop)")
+    with TemporaryDirectory(prefix='funcdiff') as tmpdir:
+        for changed in watch_files(d for lib in LIBRARIES for d in (*lib.source_dirs, *lib.include_dirs)):
+            for lib, vendorobj_path in affected_objects(changed, tasks, cache, cflags):
+                server.set_status(f"Rebuilding {lib.name}/{vendorobj_path.name}...")
+                start = time.perf_counter()
+                obj_result = build_and_diff(
+                    Path(tmpdir), cache, vendor_cache, disassembler, max_cost, cflags, (lib, vendorobj_path))
+                server.publish(object_id(lib.name, obj_result.name), obj_result.html(lib.name))
+                status = f"{lib.name}/{obj_result.name}: " + (
+                    'failed' if obj_result.failed else f'{obj_result.similarity * 100:.0f}%') + \
+                    f" ({time.perf_counter() - start:.2f}s)"
+                server.set_status(status)
+                print(status)
 
 
 def main():
@@ -93,12 +314,80 @@ def main():
         '-d', '--diff-objects', dest='diff_objects', action='store_true',
         help="Diff between 2 object directories instead of building sources and diffing them against vendor objects. "
              "The first given directory acts as the reference directory.")
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help="Number of objects to build and diff in parallel. 0 uses one process per CPU")
+    parser.add_argument(
+        '--no-cache', dest='cache', action='store_false',
+        help="Always rebuild objects and re-parse vendor objects")
+    parser.add_argument(
+        '--disassembler', choices=DISASSEMBLERS, default='objdump',
+        help="Disassemble with the toolchain's objdump, or decode ELF objects natively (faster)")
+    parser.add_argument(
+        '--max-diff-cost', dest='max_cost', type=int, default=DEFAULT_MAX_COST,
+        help="Number of edits after which large functions are diffed block by block (between labels) instead")
+    parser.add_argument(
+        '--lazy', action='store_true',
+        help="Only write object summaries to the report, and their contents to separate files (<output>.d/) that "
+             "are loaded when an object is opened")
+    parser.add_argument('--json', type=str, help="Also write per-object and per-function results to this JSON file")
+    parser.add_argument('--csv', type=str, help="Also write per-function results to this CSV file")
+    parser.add_argument(
+        '--history', type=str,
+        help="CSV file that a row per library is appended to on every run (default: <output>.history.csv)")
+    parser.add_argument(
+        '-i', '--incremental', action='store_true',
+        help="Reuse the results of the previous report for objects whose sources and headers didn't change")
+    parser.add_argument(
+        '--profile', action='store_true',
+        help="Build with -ftime-report, and add tables of compile times and of the section and function sizes of vendor "
+             "and RE objects to the report")
+    parser.add_argument(
+        '--vendor-archives', action='store_true',
+        help="Read vendor objects from blobs/<library>.a instead of the extracted <library>/*.o")
+    parser.add_argument(
+        '-w', '--watch', action='store_true',
+        help="After writing the report, serve it locally and keep rebuilding and re-diffing objects whose sources "
+             "change, updating the served page as they do")
+    parser.add_argument('--port', type=int, default=8000, help="Port to serve the report on in watch mode")
     parser.add_argument(
         dest='patterns_or_dirs', type=str, nargs='*',
         help="Glob-like pattern(s) of files to build, or 2 directories to diff in object diffing mode")
     args = parser.parse_args()
+    if args.incremental and not args.cache:
+        parser.error("--incremental requires the object cache")
+    if args.watch and args.diff_objects:
+        parser.error("--watch only applies to builds of RE sources")
+    if args.vendor_archives:
+        for lib in LIBRARIES:
+            lib.use_archive()
+    if not args.diff_objects or args.disassembler == 'objdump':
+        # Checked before the report is opened, rather than failing halfway through writing it
+        try:
+            find_toolchain()
+        except FileNotFoundError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+    jobs: int = args.jobs or os.cpu_count() or 1
+    cflags = [*CFLAGS, TIME_REPORT_FLAG] if args.profile else CFLAGS
     html = open(args.output, 'w')
     html.write(HTML_HEADER)
+    fragments_dir = Path(f'{args.output}.d')
+    if args.lazy:
+        # Fragments are all rewritten, drop those of objects that aren't part of the report anymore
+        shutil.rmtree(fragments_dir, ignore_errors=True)
+
+    lib_results: Dict[str, List[ObjectResult]] = {}
+
+    def write_object(lib_name: str, obj_result: ObjectResult):
+        lib_results.setdefault(lib_name, []).append(obj_result)
+        if not args.lazy:
+            html.write(obj_result.html(lib_name))
+            return
+        fragment = f'{lib_name}/{obj_result.name}.js'
+        url = f'{fragments_dir.name}/{fragment}'
+        write_fragment(fragments_dir / fragment, url, obj_result.body)
+        html.write(obj_result.html(lib_name, url))
 
     if args.diff_objects:
         if len(args.patterns_or_dirs) != 2:
@@ -110,34 +399,72 @@ def main():
         if not dir_b.is_dir():
             raise NotADirectoryError(f"{dir_b} is not a directory")
         html.write('<article class="lib"><h1>Directory diff</h1>')
-        for a_obj_path in dir_a.glob('*.o'):
-            diff_html, similarity, all_equivalent = diff_objects(a_obj_path, dir_b / a_obj_path.name)
-            html.write(
-                f'<details id="obj_{a_obj_path.name}" class="obj{" equivalent" if all_equivalent else ""}"><summary><div class="buildtime">{similarity * 100:.0f}%</div><h2>{a_obj_path.name}</h2></summary>{diff_html}\n')
-            html.write('</details>')
+        for obj_result in parallel_map(
+                partial(diff_dir_objects, dir_b, args.disassembler, args.max_cost, args.profile), sorted(dir_a.glob('*.o')), jobs):
+            write_object(dir_a.name, obj_result)
         html.write('</article>')
     else:
         patterns: List[str] = args.patterns_or_dirs
+        # Objects of all libraries go through a single pool so that workers are kept busy across library boundaries;
+        # results come back in submission order, which keeps the report layout stable.
+        tasks = [(lib, vendorobj_path) for lib in LIBRARIES for vendorobj_path in lib.get_vendorobj_paths(patterns)]
+        cache = ObjectCache() if args.cache else None
+        vendor_cache = FunctionCache(disassembler=args.disassembler) if args.cache else None
+        if vendor_cache is not None:
+            # Much cheaper than disassembling objects one by one in the workers
+            vendor_cache.prefetch([p for _, p in tasks])
+        # Per-object results are kept next to the report for --incremental. Entries of objects that aren't part of
+        # this run are carried over, so that runs on a subset of the objects don't lose them.
+        state_path = Path(f'{args.output}.state.json')
+        state: Dict[str, Dict[str, Any]] = {}
+        if cache is not None and state_path.is_file():
+            state = json.loads(state_path.read_text())
+        keys = [
+            input_key(cache, lib, p, args.disassembler, args.max_cost, cflags) if args.incremental else None
+            for lib, p in tasks
+        ]
+        reused: List[Optional[ObjectResult]] = [
+            ObjectResult(**state[f'{lib.name}/{p.name}']['result'])
+            if key is not None and state.get(f'{lib.name}/{p.name}', {}).get('key') == key else None
+            for (lib, p), key in zip(tasks, keys)
+        ]
+        if args.incremental:
+            print(f"Reusing {sum(r is not None for r in reused)} of {len(tasks)} objects from the previous report")
         with TemporaryDirectory(prefix='funcdiff') as tmpdir:
-            tmpdir_path = Path(tmpdir)
+            results = parallel_map(
+                partial(build_and_diff, Path(tmpdir), cache, vendor_cache, args.disassembler, args.max_cost, cflags),
+                [task for task, prev in zip(tasks, reused) if prev is None], jobs)
+            task_idx = 0
             for lib in LIBRARIES:
                 html.write(f'<article class="lib"><h1>{lib.name}</h1>')
                 for vendorobj_path in lib.get_vendorobj_paths(patterns):
-                    buildtime, result, _ = lib.build_obj(Path(tmpdir), vendorobj_path, CFLAGS)
-                    tag = f'<details id="obj_{vendorobj_path.name}" class="obj'
-                    if result.returncode == 0:
-                        diff_html, similarity, all_equivalent = diff_objects(
-                            vendorobj_path, tmpdir_path / vendorobj_path.name)
-                        html.write(
-                            f'{tag}{" equivalent" if all_equivalent else ""}"><summary><div class="buildtime">{buildtime:.3f}s {similarity * 100:.0f}%</div><h2>{vendorobj_path.name}</h2></summary>{diff_html}\n')
+                    obj_result = reused[task_idx] or next(results)
+                    write_object(lib.name, obj_result)
+                    if reused[task_idx] is not None:
+                        key = keys[task_idx]
+                    elif cache is not None and not obj_result.failed:
+                        # Objects that were just built are in the cache now
+                        key = input_key(cache, lib, vendorobj_path, args.disassembler, args.max_cost, cflags)
                     else:
-                        html.write(
-                            f'{tag} failed"><summary><div class="buildtime">{buildtime:.3f}s</div><h2>{vendorobj_path.name} 🛑</h2></summary>\n')
-                    if len(result.stderr) > 0:
-                        html.write(f'<pre><code>{escape(result.stderr.decode())}</code></pre>')
-                    html.write('</details>')
+                        key = None
+                    if key is not None:
+                        state[f'{lib.name}/{vendorobj_path.name}'] = {'key': key, 'result': vars(obj_result)}
+                    task_idx += 1
                 html.write('</article>')
+        if cache is not None:
+            atomic_write(state_path, json.dumps(state).encode())
+    if args.profile:
+        html.write(profile_html(lib_results))
     html.write(HTML_FOOTER)
+    html.close()
+    write_results(
+        lib_results, args.patterns_or_dirs, args.json, args.csv, args.history or f'{args.output}.history.csv')
+    if args.watch:
+        try:
+            watch(Path(args.output), args.patterns_or_dirs, args.cache, args.disassembler, args.max_cost, cflags,
+                  args.port)
+        except KeyboardInterrupt:
+            pass
 
 
 if __name__ == '__main__':
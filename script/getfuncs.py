@@ -1,23 +1,55 @@
 #!/usr/bin/env python3
 import sys
-src = open('../blobs/bl602_demo_wifi.ghidra.c').readlines()
+from argparse import ArgumentParser
+from pathlib import Path
 
-feature = 'DAT_44c0'
-if len(sys.argv) == 2:
-    feature = sys.argv[1]
+from odiff.ghidra import GhidraIndex, iter_decompiled
+from odiff.linkmap import MapIndex
+from odiff.paths import BLOBS_DIR
 
-outs = []
-for i in sys.stdin.readlines():
-    fname, begin, end = i.strip().split(' ')
-    begin = int(begin) - 1
-    end = int(end)
-    slocal = src[begin:end]
-    found = False
-    for i in slocal:
-        if i.find(feature) != -1:
-            found = True
-            break
-    if found:
-        outs.extend(slocal)
 
-print(''.join(outs))
\ No newline at end of file
+def main():
+    parser = ArgumentParser(description="Print the decompiled functions that mention a symbol, register or address")
+    parser.add_argument(
+        '--decompiled', type=str, default=str(BLOBS_DIR / 'bl602_demo_wifi.ghidra.c'),
+        help="C export of Ghidra's decompiler")
+    parser.add_argument(
+        '--map', type=str, default=str(BLOBS_DIR / 'bl602_demo_wifi.map'), help="Linker map of the firmware")
+    parser.add_argument(
+        '-f', '--function', dest='functions', type=str, action='append',
+        help="Print a function by name or (0x-prefixed) address instead, through an index of the export")
+    parser.add_argument(dest='feature', type=str, nargs='?', default='DAT_44c0', help="Text to look for")
+    args = parser.parse_args()
+    decompiled_path = Path(args.decompiled)
+    symbols = MapIndex.load(Path(args.map))
+
+    if args.functions:
+        index = GhidraIndex.load(decompiled_path, symbols)
+        for query in args.functions:
+            if query.lower().startswith('0x'):
+                func = index.function_at(int(query, 16))
+                funcs = [func] if func is not None else []
+            else:
+                funcs = index.lookup(query)
+            if not funcs:
+                print(f"{query}: no such function", file=sys.stderr)
+            for func in funcs:
+                print(index.read(func))
+        return
+
+    # Symbols are also looked for by address, as in the labels Ghidra makes up (DAT_4201a2c4, FUN_2304b718...)
+    features = [args.feature] + [f'{sym.address:08x}' for sym in symbols.lookup(args.feature)]
+    # Functions to search can be restricted by piping 'name begin end' lines; all are searched otherwise
+    names = None if sys.stdin.isatty() else {line.split(' ')[0] for line in sys.stdin if line.strip()} or None
+    outs = []
+    with open(decompiled_path) as f:
+        for func in iter_decompiled(f):
+            if names is not None and func.name not in names:
+                continue
+            if any(line.find(feature) != -1 for line in func.lines for feature in features):
+                outs.extend(func.lines)
+    print(''.join(outs))
+
+
+if __name__ == '__main__':
+    main()
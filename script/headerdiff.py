@@ -1,18 +1,24 @@
 #!/usr/bin/env python3
+import os
+import sys
 from argparse import ArgumentParser
+from collections import namedtuple
+from functools import partial
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 
-from elftools.dwarf.die import DIE
-from elftools.elf.elffile import ELFFile
-
-from odiff.c import HeaderFile, CVariable
-from odiff.dwarf2c import die_get_name, die_get_at_type, die_to_ctype_or_func, is_static, Context
+from odiff.c import HeaderFile
+from odiff.ccompare import TypeComparator
+from odiff.cintern import intern_types
+from odiff.dwarf2c import Context
 from odiff.html import HTML_HEADER, HTML_FOOTER, make_diff_table
-from odiff.lib import LIBRARIES
-from odiff.paths import VENDOR_PATH_PREFIX, REPO_ROOT
-from odiff.utils import get_or_create, remove_prefixes
+from odiff.lib import Library, LIBRARIES, ObjectCache
+from odiff.results import run_info, write_json, write_csv, library_progress, ProgressHistory
+from odiff.riscvreloc import patch_elftools_relocs
+from odiff.toolchain import find_toolchain
+from odiff.typedb import ObjectHeaders, TypeDatabase, collect_object
+from odiff.utils import parallel_map
 
 CFLAGS = [
     '-march=rv32imfc',
@@ -35,85 +41,84 @@ CFLAGS = [
 ]
 
 
-def process_file(filename: Path, header_files: Dict[str, HeaderFile], ctx: Context):
-    with open(filename, 'rb') as f:
-        elf = ELFFile(f)
-        symtab = elf.get_section_by_name('.symtab')
-        dwarf = elf.get_dwarf_info()
-        try:
-            cu = next(dwarf.iter_CUs())
-        except StopIteration:
-            return
-        lp = dwarf.line_program_for_CU(cu)
-        include_directories: List[str] = [x.decode() for x in lp.header.include_directory]
-        file_entries: List[HeaderFile] = [
-            get_or_create(
-                header_files,
-                remove_prefixes(
-                    f'{include_directories[x.dir_index - 1]}/{x.name.decode()}',
-                    [VENDOR_PATH_PREFIX, f'{REPO_ROOT}/'])
-                if x.dir_index != 0 else x.name.decode(),
-                lambda path: HeaderFile(path)
-            )
-            for x in lp['file_entry']
-        ]
-        cu_die: DIE = cu.get_top_DIE()
-        for die in cu_die.iter_children():
-            die: DIE
-            if not 'DW_AT_decl_file' in die.attributes:
-                continue
-            decl_file = file_entries[die.attributes['DW_AT_decl_file'].value - 1]
-            decl_line = die.attributes['DW_AT_decl_line'].value
-            name: Optional[str] = die_get_name(die)
-            if die.tag == 'DW_TAG_variable':
-                if 'DW_AT_specification' in die.attributes:
-                    var_spec_die = cu.get_DIE_from_refaddr(die.attributes['DW_AT_specification'].value)
-                    name = die_get_name(var_spec_die)
-                    assert name is not None
-                    entry = CVariable(
-                        die=die, type=die_get_at_type(var_spec_die), name=name,
-                        extern='DW_AT_external' in die.attributes, static=False)
-                else:
-                    _, static = is_static(symtab, name)
-                    entry = CVariable(
-                        die=die, type=die_get_at_type(die), name=name,
-                        extern='DW_AT_external' in die.attributes, static=static)
-            else:
-                if name is None:
-                    continue
-                entry = die_to_ctype_or_func(ctx, die, symtab)
-            decl_file.defs[name] = entry
-            decl_file.def_lines[name] = decl_line
+HeaderResult = namedtuple('HeaderResult', 'name status similarity')
+
+
+def build_and_collect(build_dir: Path, cache: Optional[ObjectCache], task: Tuple[Library, Path]) -> \
+        Tuple[Optional[str], Optional[ObjectHeaders]]:
+    """
+    :returns: Build errors if the reverse-engineered object failed to build, or what was collected from it
+    """
+    lib, vendorobj_path = task
+    # Libraries share some object names (e.g. ke_msg.o), which must not clash when built concurrently
+    lib_build_dir = build_dir / lib.name
+    lib_build_dir.mkdir(exist_ok=True)
+    _, result, reobj_path = lib.build_obj(lib_build_dir, vendorobj_path, CFLAGS, cache)
+    if result.returncode != 0:
+        return result.stderr.decode(), None
+    print(f"Collecting reverse-engineered {lib.name}/{vendorobj_path.name}")
+    return None, collect_object(f're_{lib.name}/{vendorobj_path.name}', reobj_path)
 
 
 def main():
     parser = ArgumentParser(description="Generate HTML diffs between symbols in header files")
     parser.add_argument('-o', '--output', type=str, default='report.html', help="Output file name")
+    parser.add_argument(
+        '--no-cache', dest='cache', action='store_false',
+        help="Always rebuild objects and collect the vendor types again")
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help="Number of objects to build and collect in parallel. 0 uses one process per CPU")
+    parser.add_argument('--json', type=str, help="Also write per-header results to this JSON file")
+    parser.add_argument('--csv', type=str, help="Also write per-header results to this CSV file")
+    parser.add_argument(
+        '--history', type=str,
+        help="CSV file that a row is appended to on every run (default: <output>.history.csv)")
+    parser.add_argument(
+        '--vendor-archives', action='store_true',
+        help="Read vendor objects from blobs/<library>.a instead of the extracted <library>/*.o")
     parser.add_argument(dest='patterns', type=str, nargs='*', help="Glob-like pattern(s) of files to build")
     args = parser.parse_args()
+    if args.vendor_archives:
+        for lib in LIBRARIES:
+            lib.use_archive()
+    # Checked before the report is opened, rather than failing halfway through writing it
+    try:
+        find_toolchain()
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    jobs: int = args.jobs or os.cpu_count() or 1
     html = open(args.output, 'w')
     html.write(HTML_HEADER)
-    from odiff.riscvreloc import patch_elftools_relocs
     patch_elftools_relocs()
     patterns: List[str] = args.patterns
+    # Vendor objects rarely change, their types are kept in a database per library
     vendor_header_files: Dict[str, HeaderFile] = {}
     for lib in LIBRARIES:
-        vendor_lib_ctx = Context('vendor_' + lib.name)
-        for vendorobj_path in lib.get_vendorobj_paths(patterns):
-            print(f"Collecting vendor {lib.name}/{vendorobj_path.name}")
-            process_file(vendorobj_path, vendor_header_files, vendor_lib_ctx)
-    # print("\n".join(f"=========== {k}\n{v}" for k, v in vendor_header_files.items()))
+        # Libraries the patterns don't touch aren't collected at all
+        if next(lib.get_vendorobj_paths(patterns), None) is None:
+            continue
+        TypeDatabase.load(lib, jobs, use_stored=args.cache, patterns=patterns).merge_into(vendor_header_files, patterns)
+    # Every object comes with its own copy of the types of the headers it includes
+    intern_types(vendor_header_files)
+    # RE objects are collected in parallel, then merged in order with a Context per library, which checks the ODR
+    tasks = [(lib, vendorobj_path) for lib in LIBRARIES for vendorobj_path in lib.get_vendorobj_paths(patterns)]
     re_header_files: Dict[str, HeaderFile] = {}
+    failed_objects: List[str] = []
+    header_results: List[HeaderResult] = []
+    cache = ObjectCache() if args.cache else None
+    re_ctxs = {lib.name: Context('re_' + lib.name) for lib in LIBRARIES}
+    comparator = TypeComparator()
     with TemporaryDirectory(prefix='headerdiff') as tmpdir:
-        for lib in LIBRARIES:
-            re_lib_ctx = Context('re_' + lib.name)
-            for vendorobj_path in lib.get_vendorobj_paths(patterns):
-                _, result, reobj_path = lib.build_obj(Path(tmpdir), vendorobj_path, CFLAGS)
-                if result.returncode != 0:
-                    print(f"{vendorobj_path.name} failed to build: {result.stderr.decode()}")
-                    continue
-                print(f"Collecting reverse-engineered {lib.name}/{vendorobj_path.name}")
-                process_file(reobj_path, re_header_files, re_lib_ctx)
+        for (lib, vendorobj_path), (errors, obj) in zip(
+                tasks, parallel_map(partial(build_and_collect, Path(tmpdir), cache), tasks, jobs)):
+            if errors is not None:
+                print(f"{vendorobj_path.name} failed to build: {errors}")
+                failed_objects.append(f'{lib.name}/{vendorobj_path.name}')
+                continue
+            obj.merge_into(re_header_files, re_ctxs[lib.name])
+    intern_types(re_header_files)
     for vhdr_name, vhdr in sorted(vendor_header_files.items(), key=lambda x: x[0]):
         if not vhdr_name.startswith('components/'):
             continue
@@ -122,22 +127,40 @@ def main():
         if rehdr is None:
             html.write('Not there!')
             html.write(f'<pre><code>{vhdr.to_source()}</code></pre>')
+            header_results.append(HeaderResult(vhdr_name, 'missing', 0))
         else:
             html.write(f'<pre><code>{vhdr.to_source()}</code></pre>')
-            original_a = [(vhdr.def_lines[k], k, v) for k, v in vhdr.sorted_defs]
-            original_b = [(rehdr.def_lines[k], k, v) for k, v in rehdr.sorted_defs]
+            # Definitions are aligned by name, those that don't match structurally show up as changed
+            mismatches = {k: comparator.compare(v, rehdr.defs[k]) for k, v in vhdr.defs.items() if k in rehdr.defs}
+            original_a = [(vhdr.def_lines[k], k, v, None) for k, v in vhdr.sorted_defs]
+            original_b = [(rehdr.def_lines[k], k, v, mismatches.get(k)) for k, v in rehdr.sorted_defs]
             content, similarity = make_diff_table(
                 original_a,
                 original_b,
-                [x[1] for x in original_a],
-                [x[1] for x in original_b],
+                [(x[1], True) for x in original_a],
+                [(x[1], x[3] is None) for x in original_b],
                 get_offset=lambda x: str(x[0]),
-                get_text=lambda x: f'{x[1]}: {x[2]}'
+                get_text=lambda x: f'{x[1]}: {x[2]}' + (f'  /* {x[3]} */' if x[3] else '')
             )
             html.write(content)
+            header_results.append(HeaderResult(vhdr_name, 'equivalent' if similarity == 1 else 'different', similarity))
         html.write('</article>')
     html.write(HTML_FOOTER)
 
+    info = run_info()
+    if args.json:
+        write_json(Path(args.json), {
+            'tool': 'headerdiff', **info, 'scope': patterns,
+            'headers': {h.name: {'status': h.status, 'similarity': h.similarity} for h in header_results},
+            'failed_objects': failed_objects
+        })
+    if args.csv:
+        write_csv(Path(args.csv), ['header', 'status', 'similarity'], header_results)
+    # Headers aren't tied to a library, they share a single row. Objects that failed to build count as one item each
+    ProgressHistory(Path(args.history or f'{args.output}.history.csv')).append('headerdiff', info, patterns, [
+        library_progress('headers', [*header_results, *(HeaderResult(o, 'failed', 0) for o in failed_objects)])
+    ])
+
 
 if __name__ == '__main__':
     main()
@@ -1,115 +1,166 @@
-import sys
-from collections import namedtuple
-
-from elftools.elf.elffile import ELFFile
-from elftools.dwarf.descriptions import describe_form_class
-
-Subroutine = namedtuple("Subroutine", "name inlines")
-InlinedFunction = namedtuple("InlinedFunction", "name ranges")
-
-def any_inlined(die):
-    for child in die.iter_children():
-        if child.tag == 'DW_TAG_inlined_subroutine':
-            return True
-    return False
-
-def process_inlined(locs, die, inlines, depth):
-    inlinefn = die.get_DIE_from_attribute('DW_AT_abstract_origin')
-    name = inlinefn.attributes["DW_AT_name"].value.decode('ascii')
-    #print(('  '*depth) + name)
-
-    ranges = []
-    if 'DW_AT_ranges' in die.attributes:
-        rs = locs.get_range_list_at_offset(die.attributes['DW_AT_ranges'].value)
-        for re in rs:
-            lowpc = re.begin_offset
-            highpc = re.end_offset
-            ranges.append((lowpc, highpc))
-            #print(('  '*(depth+1)) + f' {hex(lowpc)} - {hex(highpc)}')
-    elif 'DW_AT_high_pc' in die.attributes:
-        lowpc = die.attributes['DW_AT_low_pc'].value
-        highpc = die.attributes['DW_AT_high_pc'].value + lowpc
-        ranges.append((lowpc, highpc))
-        #print(('  '*(depth+1)) + f' {hex(lowpc)} - {hex(highpc)}')
-    inlines.append(InlinedFunction(name, ranges))
-
-def process_children(locs, die, inlines, depth):
-    for child in die.iter_children():
-        if child.tag == 'DW_TAG_inlined_subroutine':
-            process_inlined(locs, child, inlines, depth+1)
-        process_children(locs, child, inlines, depth+1)
-
-def peek_line(f):
-    pos = f.tell()
-    line = f.readline()
-    f.seek(pos)
-    return line
-
-if __name__ == '__main__':
-    #path = 'bl602_demo_wifi.elf'
-    path = 'sdk_app_ble_sync.elf'
-    f = open(path, 'rb')
-    elffile = ELFFile(f)
-    dwarfinfo = elffile.get_dwarf_info()
-
-    proprietary = []
-    for CU in dwarfinfo.iter_CUs():
-        root = CU.get_top_DIE()
-        is_ble = 'components/network/ble/blecontroller' in root.get_full_path()
-        is_wifi = 'bl602/bl602_wifi/' in root.get_full_path()
-        if ('ble' in path and not is_ble) or ('wifi' in path and not is_wifi):
-            continue
-        proprietary.append(root)
-    
-    subroutines = []
-    locs = dwarfinfo.range_lists()
-    for root in proprietary:
-        for DIE in root.iter_children():
-            if not DIE.tag == 'DW_TAG_subprogram':
-                continue
-            if not 'DW_AT_name' in DIE.attributes:
-                continue
-            if 'DW_AT_inline' in DIE.attributes:
-                continue
-            inlines = []
-            name = DIE.attributes["DW_AT_name"].value.decode('ascii')
-            #print(name)
-            process_children(locs, DIE, inlines, 1)
-            if len(inlines) > 0:
-                subroutines.append(Subroutine(name, inlines))
-    
-    #print(f"{len(subroutines)} subroutines")
-    f.close()
-    f = open(path + '.txt', 'r')
-    function_prefix = '                            ;'
-    while True:
-        line = f.readline()
-        if not line:
-            break
-        if not line.startswith(function_prefix):
-            continue
-        function = line[len(function_prefix):].rstrip()
-        sub = next((x for x in subroutines if (f'{x.name}(' in function)), None)
-        if not sub:
-            continue
-        print(line, end='')
-        while True:
-            sline = f.readline()
-            addr = sline.split(' ')[0]
-            if len(addr) != 8:
-                print(sline, end='')
-                continue
-            addr = int(addr, 16)
-            matches = list(filter(lambda inl: any(addr >= r[0] and addr < r[1] for r in inl.ranges), sub.inlines))
-            if len(matches) == 0:
-                print(sline, end='')
-            else:
-                hint = ", ".join(map(lambda m: m.name, matches))
-                sline = sline.rstrip()
-                sline = sline.ljust(max(len(sline) + 10, 100))
-                print(f'{sline};{hint}')
-
-            sline = peek_line(f)
-            if sline.startswith(function_prefix):
-                print()
-                break
+import sys
+from argparse import ArgumentParser
+from bisect import bisect_right
+from collections import namedtuple
+from pathlib import Path
+from typing import List, Dict, Tuple, Optional
+
+from odiff.asm import AsmLine
+from odiff.dwarfindex import DwarfIndex
+from odiff.ghidra import LISTING_FUNCTION_PREFIX, LISTING_ADDRESS_RE, iter_listing
+
+Subroutine = namedtuple("Subroutine", "name inlines")
+InlinedFunction = namedtuple("InlinedFunction", "name ranges")
+
+# Paths of the CUs of the proprietary libraries, whose functions are annotated
+PROPRIETARY_CU_PATHS = {
+    'ble': 'components/network/ble/blecontroller',
+    'wifi': 'bl602/bl602_wifi/',
+}
+
+def load_subroutines(path):
+    """
+    Subroutines of the proprietary libraries with functions inlined into them, read from the DWARF index of the ELF
+    (which is built on first use).
+    """
+    filters = [cu_path for key, cu_path in PROPRIETARY_CU_PATHS.items() if key in path]
+    return [
+        Subroutine(name, [InlinedFunction(inline.name, inline.ranges) for inline in inlines])
+        for name, inlines in DwarfIndex.load(Path(path)).iter_inlining_subprograms(*filters)
+    ]
+
+def describe_address(path, addr):
+    """
+    Print the function containing an address, and the functions inlined there.
+    """
+    index = DwarfIndex.load(Path(path))
+    sub = index.function_at(addr)
+    if sub is None:
+        print(f'{addr:08x}: not within any function')
+        return
+    decl = f' ({sub.decl.file}:{sub.decl.line})' if sub.decl else ''
+    print(f'{addr:08x}: {sub.name}+0x{addr - sub.low:x}{decl}')
+    for inline in index.inlines_at(addr):
+        call = f' (called at {inline.call.file}:{inline.call.line})' if inline.call else ''
+        print(f'{"  " * inline.depth}{inline.name}{call}')
+
+class InlineIndex:
+    """
+    Sorted interval index over the inlined ranges of all subroutines. The address space is cut at every range bound
+    into elementary segments, each listing the inlined functions that cover it, so that looking an address up is a
+    bisection rather than a scan of every range.
+    """
+
+    def __init__(self, subroutines: List[Subroutine]):
+        self.subroutines = subroutines
+        # Subroutines by name. Like a scan of the list, the first one wins if several (static) ones share a name
+        self.by_name: Dict[str, int] = {}
+        events: List[Tuple[int, int, int, int]] = []
+        for sub_idx, sub in enumerate(subroutines):
+            self.by_name.setdefault(sub.name, sub_idx)
+            for inline_idx, inline in enumerate(sub.inlines):
+                for lowpc, highpc in inline.ranges:
+                    if lowpc < highpc:
+                        events.append((lowpc, 1, sub_idx, inline_idx))
+                        events.append((highpc, -1, sub_idx, inline_idx))
+        events.sort()
+        self.bounds: List[int] = []
+        # Inlined functions covering [bounds[i], bounds[i + 1]), as (subroutine, inline) indices in list order
+        self.segments: List[Tuple[Tuple[int, int], ...]] = []
+        active: Dict[Tuple[int, int], int] = {}
+        idx = 0
+        while idx < len(events):
+            addr = events[idx][0]
+            while idx < len(events) and events[idx][0] == addr:
+                _, delta, sub_idx, inline_idx = events[idx]
+                key = (sub_idx, inline_idx)
+                count = active.get(key, 0) + delta
+                if count:
+                    active[key] = count
+                else:
+                    del active[key]
+                idx += 1
+            self.bounds.append(addr)
+            self.segments.append(tuple(sorted(active)))
+
+    def subroutine(self, name: str) -> Optional[int]:
+        return self.by_name.get(name)
+
+    def hint(self, sub_idx: int, addr: int) -> str:
+        """
+        :returns: Names of the functions inlined into subroutine ``sub_idx`` at ``addr``
+        """
+        seg = bisect_right(self.bounds, addr) - 1
+        if seg < 0:
+            return ""
+        inlines = self.subroutines[sub_idx].inlines
+        return ", ".join(inlines[inline_idx].name for s, inline_idx in self.segments[seg] if s == sub_idx)
+
+
+def print_hinted(sline, hint):
+    if not hint:
+        print(sline, end='')
+    else:
+        sline = sline.rstrip()
+        sline = sline.ljust(max(len(sline) + 10, 100))
+        print(f'{sline};{hint}')
+
+def annotate_ghidra(path, index: InlineIndex):
+    """
+    Annotate the Ghidra listing exported next to the ELF (<path>.txt).
+    """
+    with open(path + '.txt', 'r') as f:
+        for function in iter_listing(f):
+            sub_idx = index.subroutine(function.name) if function.name else None
+            if sub_idx is None:
+                continue
+            print(f'{LISTING_FUNCTION_PREFIX}{function.signature}')
+            for sline in function.lines:
+                match = LISTING_ADDRESS_RE.match(sline)
+                if match is None:
+                    print(sline, end='')
+                    continue
+                print_hinted(sline, index.hint(sub_idx, int(match.group(1), 16)))
+            print()
+
+def annotate_native(path, index: InlineIndex):
+    """
+    Annotate a listing disassembled straight from the ELF, which doesn't need a Ghidra export.
+    """
+    from odiff.elfasm import linked_functions
+    with open(path, 'rb') as f:
+        functions = linked_functions(f)
+    for function in functions:
+        sub_idx = index.subroutine(function.name)
+        if sub_idx is None:
+            continue
+        print(f'{LISTING_FUNCTION_PREFIX}{function.name}')
+        for line in function.lines:
+            if not isinstance(line, AsmLine):
+                print(f'                            {line.name}:')
+                continue
+            sline = f'{line.offset:08x}        {line.opcode:<12}{",".join(line.operands)}'.rstrip()
+            if line.target:
+                sline += f' <{line.target}>'
+            print_hinted(sline + '\n', index.hint(sub_idx, line.offset))
+        print()
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Annotate the instructions of proprietary functions with the functions inlined into them")
+    parser.add_argument('path', nargs='?', default='sdk_app_ble_sync.elf', help="Firmware ELF with DWARF info")
+    parser.add_argument(
+        '--disassembler', choices=('ghidra', 'native'), default='ghidra',
+        help="Annotate the Ghidra listing exported to <path>.txt, or disassemble the ELF natively")
+    parser.add_argument(
+        '-a', '--address', type=lambda s: int(s, 16), action='append',
+        help="Only print the function containing a (hex) address and the functions inlined there, can be repeated")
+    args = parser.parse_args()
+    if args.address:
+        for addr in args.address:
+            describe_address(args.path, addr)
+        sys.exit(0)
+    index = InlineIndex(load_subroutines(args.path))
+    if args.disassembler == 'native':
+        annotate_native(args.path, index)
+    else:
+        annotate_ghidra(args.path, index)
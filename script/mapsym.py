@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+from argparse import ArgumentParser
+from pathlib import Path
+
+from odiff.linkmap import MapIndex, MapSymbol
+from odiff.paths import BLOBS_DIR
+
+
+def format_symbol(sym: MapSymbol) -> str:
+    return f'0x{sym.address:08x} {sym.size:#8x}  {sym.name}  {sym.section}  {sym.object}'
+
+
+def main():
+    parser = ArgumentParser(description="Look up symbols and addresses in a linker map")
+    parser.add_argument(
+        '-m', '--map', type=str, default=str(BLOBS_DIR / 'bl602_demo_wifi.map'),
+        help="Linker map to search (default: blobs/bl602_demo_wifi.map)")
+    parser.add_argument(
+        dest='queries', type=str, nargs='+', help="Addresses (0x-prefixed) to find the symbol of, or symbol names")
+    args = parser.parse_args()
+    index = MapIndex.load(Path(args.map))
+    for query in args.queries:
+        if query.lower().startswith('0x'):
+            address = int(query, 16)
+            sym = index.symbol_at(address)
+            if sym is None:
+                print(f'{query}: not within any symbol')
+            else:
+                print(f'{query}: {index.describe(address)}\n  {format_symbol(sym)}')
+            continue
+        syms = index.lookup(query)
+        print(f'{query}: {len(syms)} symbol{"" if len(syms) == 1 else "s"}')
+        for sym in syms:
+            print(f'  {format_symbol(sym)}')
+
+
+if __name__ == '__main__':
+    main()
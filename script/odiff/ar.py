@@ -0,0 +1,168 @@
+import hashlib
+import io
+import mmap
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Dict, Optional, Tuple, BinaryIO, Iterator, List, Union
+
+AR_MAGIC = b'!<arch>\n'
+AR_HEADER_SIZE = 60
+
+
+class Archive:
+    """
+    Memory-mapped ``ar`` archive, in the System V/GNU flavor the toolchain's ar writes. Members are zero-copy views
+    into the mapping.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self._mmap)
+        if data[:len(AR_MAGIC)] != AR_MAGIC:
+            raise ValueError(f"{path} is not an ar archive")
+        self.members: Dict[str, memoryview] = {}
+        long_names = b''
+        pos = len(AR_MAGIC)
+        while pos + AR_HEADER_SIZE <= len(data):
+            header = bytes(data[pos:pos + AR_HEADER_SIZE])
+            if header[58:60] != b'`\n':
+                raise ValueError(f"Corrupted ar member header at offset {pos} of {path}")
+            name = header[:16].decode().rstrip()
+            size = int(header[48:58])
+            body = data[pos + AR_HEADER_SIZE:pos + AR_HEADER_SIZE + size]
+            # Members are 2-byte aligned
+            pos += AR_HEADER_SIZE + size + (size & 1)
+            if name == '//':
+                long_names = bytes(body)
+            elif name in ('/', '/SYM64/'):
+                continue  # Symbol table
+            elif name.startswith('/'):
+                offset = int(name[1:])
+                self.members[long_names[offset:long_names.index(b'/\n', offset)].decode()] = body
+            else:
+                self.members[name.rstrip('/')] = body
+
+    def names(self) -> List[str]:
+        return sorted(self.members)
+
+
+# Archives opened by this process, mapped once each
+_archives: Dict[Path, Archive] = {}
+
+
+def open_archive(path: Path) -> Archive:
+    try:
+        return _archives[path]
+    except KeyError:
+        archive = Archive(path)
+        _archives[path] = archive
+        return archive
+
+
+def split_member_path(path: Path) -> Optional[Tuple[Path, str]]:
+    """
+    Objects can be referred to inside an archive as if it were a directory, e.g. ``blobs/libatcmd.a/at_server.o``.
+
+    :returns: Archive path and member name, or None if ``path`` isn't within an archive
+    """
+    if path.parent.suffix == '.a' and path.parent.is_file():
+        return path.parent, path.name
+    return None
+
+
+def object_data(path: Path) -> Union[bytes, memoryview]:
+    """
+    :returns: Contents of an object file or archive member, the latter without copying it
+    """
+    member = split_member_path(path)
+    if member is None:
+        return path.read_bytes()
+    archive_path, name = member
+    try:
+        return open_archive(archive_path).members[name]
+    except KeyError:
+        raise FileNotFoundError(f"{name} not found in {archive_path}") from None
+
+
+def open_object(path: Path) -> BinaryIO:
+    if split_member_path(path) is None:
+        return open(path, 'rb')
+    return _MemberReader(object_data(path))
+
+
+def hash_object(path: Path) -> str:
+    return hashlib.sha256(object_data(path)).hexdigest()
+
+
+def stat_object(path: Path) -> Tuple[int, int]:
+    """
+    :returns: Modification time in ns (of the archive for a member) and size
+    """
+    member = split_member_path(path)
+    if member is None:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    return os.stat(member[0]).st_mtime_ns, len(object_data(path))
+
+
+@contextmanager
+def object_file(path: Path) -> Iterator[str]:
+    """
+    Path an external tool (e.g. objdump) can read an object file or archive member from. Members are exposed through
+    an in-memory file where the platform has them, rather than extracted to disk.
+    """
+    if split_member_path(path) is None:
+        yield str(path)
+        return
+    data = object_data(path)
+    if hasattr(os, 'memfd_create'):
+        fd = os.memfd_create(path.name)
+        try:
+            with open(fd, 'wb', closefd=False) as f:
+                f.write(data)
+            yield f'/proc/{os.getpid()}/fd/{fd}'
+        finally:
+            os.close(fd)
+    else:
+        with NamedTemporaryFile(suffix=path.name) as f:
+            f.write(data)
+            f.flush()
+            yield f.name
+
+
+class _MemberReader(io.RawIOBase):
+    """
+    Seekable stream over an archive member, for pyelftools.
+    """
+
+    def __init__(self, data: memoryview):
+        super().__init__()
+        self._data = data
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        chunk = self._data[self._pos:self._pos + len(b)]
+        b[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._data)
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
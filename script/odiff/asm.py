@@ -1,11 +1,26 @@
+import hashlib
 import os
 import re
-from typing import Optional, List, Generator, Union
+from typing import Optional, List, Generator, Union, Dict
 
 ASM_LINE_RE = re.compile(
     r'^\s*([0-9A-Fa-f]+):\s*[0-9A-Fa-f]+\s+(\S+)\s*(?:([^,# ]+(?:,\s*[^,# ]+)*)\s*)?(?:<([^>#]+)>\s*)?(?:#(.*))?$')
 LABEL_RE = re.compile(r'^([0-9A-Fa-f]{8}) <([^>#]+)>:$')
 RELOC_RE = re.compile(r'^\s*[0-9A-Fa-f]+: R_RISCV_(\S+)\s+(\S+)$')
+# Relocations whose symbol is shown as the target of the relocated instruction
+TARGET_RELOCS = ('HI20', 'LO12_I', 'CALL')
+# Registers that register allocation is free to choose; zero, ra, sp, gp and tp have fixed roles
+ALLOCATABLE_REGISTER_RE = re.compile(r'\b(?:f?[st](?:1[01]|[0-9])|f?a[0-7])\b')
+# Opcodes whose last operand is an address, which objdump prints resolved
+BRANCH_OPCODES = frozenset((
+    'beq', 'bne', 'blt', 'bge', 'bltu', 'bgeu', 'beqz', 'bnez', 'blez', 'bgez', 'bltz', 'bgtz', 'j', 'jal'))
+
+
+def is_listed_label(name: str) -> bool:
+    """
+    Whether a local label is kept in function listings. Variable location labels (.LVLx) are just noise.
+    """
+    return name[0] == '.' and not name.startswith('.LV')
 
 
 class AsmLine:
@@ -72,27 +87,38 @@ class Label:
 
 
 class Function:
-    def __init__(self, lines: List[str]):
-        self.name = '_unknown'
-        self.asm_lines: List[AsmLine] = []
-        self.labels: List[Label] = []
+    def __init__(self, name: str, asm_lines: List[AsmLine], labels: List[Label]):
+        self.name = name
+        self.asm_lines = asm_lines
+        self.labels = labels
+        self._fingerprints: Dict[bool, bytes] = {}
+
+    @classmethod
+    def from_objdump(cls, lines: List[str]) -> 'Function':
+        """
+        Parse a function from the lines of its section in ``objdump -rd`` output.
+        """
+        name = '_unknown'
+        asm_lines: List[AsmLine] = []
+        labels: List[Label] = []
         for line in lines[1:]:
             if (match := ASM_LINE_RE.match(line)) is not None:
-                self.asm_lines.append(AsmLine(
+                asm_lines.append(AsmLine(
                     offset=int(match.group(1), 16),
                     opcode=match.group(2),
                     operands=[o.strip() for o in match.group(3).split(',')] if match.group(3) else [],
                     target=match.group(4),
                     comment=match.group(5)))
-            elif (match := RELOC_RE.match(line)) is not None and match.group(1) in ('HI20', 'LO12_I', 'CALL'):
-                self.asm_lines[-1].target = match.group(2)
+            elif (match := RELOC_RE.match(line)) is not None and match.group(1) in TARGET_RELOCS:
+                asm_lines[-1].target = match.group(2)
             elif (match := LABEL_RE.match(line)) is not None:
                 label_offset = int(match.group(1), 16)
                 label_name = match.group(2)
                 if label_name[0] != '.' and label_offset == 0:
-                    self.name = label_name
-                elif label_name[0] == '.' and not label_name.startswith('.LV'):
-                    self.labels.append(Label(offset=label_offset, name=label_name))
+                    name = label_name
+                elif is_listed_label(label_name):
+                    labels.append(Label(offset=label_offset, name=label_name))
+        return cls(name, asm_lines, labels)
 
     @property
     def lines(self) -> Generator[Union[AsmLine, Label], None, None]:
@@ -111,5 +137,64 @@ class Function:
             return self.name == o.name and self.asm_lines == o.asm_lines
         return False
 
-    def equivalent(self, o: 'Function') -> bool:
-        return self.name == o.name and self.asm_lines == o.asm_lines
+    def fingerprint(self, abstract_registers: bool = False) -> bytes:
+        """
+        Digest of the normalized instruction stream: opcodes, operands and relocation targets. Branch destinations are
+        replaced by instruction indices and local symbols (.L*, .LANCHOR*, sections) are left out, since both depend
+        on the layout of the object rather than on the code.
+
+        :param abstract_registers: Number allocatable registers by order of first use, so that functions that only
+                                   differ by register allocation share a fingerprint
+        """
+        if (digest := self._fingerprints.get(abstract_registers)) is not None:
+            return digest
+        indices = {line.offset: i for i, line in enumerate(self.asm_lines)}
+        registers: Dict[str, str] = {}
+
+        def abstract(match: 're.Match[str]') -> str:
+            name = match.group(0)
+            return registers.setdefault(name, f'{"f" if name[0] == "f" else "x"}#{len(registers)}')
+
+        h = hashlib.blake2b(digest_size=16)
+        for line in self.asm_lines:
+            operands = line.operands
+            target = line.target
+            if line.opcode in BRANCH_OPCODES and operands:
+                try:
+                    dest = indices.get(int(operands[-1], 16))
+                except ValueError:
+                    dest = None
+                if dest is not None:
+                    operands = [*operands[:-1], f'@{dest}']
+                    target = None
+            if abstract_registers:
+                operands = [ALLOCATABLE_REGISTER_RE.sub(abstract, o) for o in operands]
+            if target is not None and target[0] == '.':
+                target = None
+            h.update(f'{line.opcode}\0{",".join(operands)}\0{target or ""}\n'.encode())
+        digest = self._fingerprints[abstract_registers] = h.digest()
+        return digest
+
+    def equivalent(self, o: 'Function', abstract_registers: bool = False) -> bool:
+        """
+        :param abstract_registers: Also consider functions that only differ by register allocation equivalent
+        """
+        return self.name == o.name and self.fingerprint(abstract_registers) == o.fingerprint(abstract_registers)
+
+
+def is_function_section(name: str) -> bool:
+    return name.startswith('text.') or name.startswith('tcm_code')
+
+
+def parse_objdump(text: str) -> Dict[str, Function]:
+    """
+    Parse the functions out of ``objdump -rd`` output of a ``-ffunction-sections`` object.
+    """
+    funcs: Dict[str, Function] = {}
+    for section_asm in text.split('Disassembly of section .')[1:]:
+        lines = section_asm.splitlines()
+        if not is_function_section(lines[0]):
+            continue
+        f = Function.from_objdump(lines)
+        funcs[f.name] = f
+    return funcs
@@ -0,0 +1,144 @@
+import re
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Tuple, Optional, Sequence, List, Any
+
+from odiff.ar import open_object
+
+# Flag making GCC print the time spent in each of its passes to stderr, after any diagnostics
+TIME_REPORT_FLAG = '-ftime-report'
+# Table printed by -ftime-report, from its header (which GCC 10 changed) to its TOTAL line
+TIME_REPORT_RE = re.compile(
+    r'^\n?(?:Time variable|Execution times) .*?^ TOTAL .*?(?:\n|$)', re.MULTILINE | re.DOTALL)
+# Entry of that table, e.g. `` phase parsing   :   0.02 ( 40%)   0.00 (  0%)   0.03 ( 43%)   142k (  9%)``. Older GCCs
+# label the columns of every entry instead (``0.02 (40%) usr``), the times come in the same order either way.
+TIME_REPORT_ENTRY_RE = re.compile(r'^ (\S.*?)\s*:(.*)$', re.MULTILINE)
+TIME_RE = re.compile(r'\d+\.\d+')
+
+# Sizes in bytes, as counted by binutils' size: text is everything allocated and read-only (code and constants)
+SectionSizes = namedtuple('SectionSizes', 'text data bss')
+# Sizes of the vendor object and of the RE one (None if it failed to build), byte size of each function in either
+# (None where it's missing) and CPU time (user and system) GCC spent on each -ftime-report item, TOTAL included
+ObjectProfile = namedtuple('ObjectProfile', 'vendor_sizes re_sizes function_sizes timevars')
+
+# Columns of the rows of profile_rows
+OBJECT_COLUMNS = [
+    'library', 'object', 'buildtime', 'compile CPU time', 'slowest pass',
+    'vendor text', 'RE text', 'text delta', 'vendor data', 'RE data', 'vendor bss', 'RE bss']
+FUNCTION_COLUMNS = ['library', 'object', 'function', 'vendor size', 'RE size', 'size delta']
+
+
+def split_time_report(stderr: str) -> Tuple[str, Dict[str, float]]:
+    """
+    Take the ``-ftime-report`` table out of the stderr output of GCC.
+
+    :returns: The rest of the output (i.e. the diagnostics), and the CPU time of each item of the table, in seconds
+    """
+    match = TIME_REPORT_RE.search(stderr)
+    if match is None:
+        return stderr, {}
+    timevars: Dict[str, float] = {}
+    for name, columns in TIME_REPORT_ENTRY_RE.findall(match.group(0)):
+        times = TIME_RE.findall(columns)
+        if len(times) >= 2:
+            timevars[name] = round(float(times[0]) + float(times[1]), 2)
+    return stderr[:match.start()] + stderr[match.end():], timevars
+
+
+def slowest_pass(timevars: Dict[str, float]) -> Optional[str]:
+    """
+    :returns: The item of a time report that took longest, other than the total and the phases that sum up items
+    """
+    passes = [(time, name) for name, time in timevars.items() if name != 'TOTAL' and not name.startswith('phase ')]
+    return max(passes)[1] if passes and max(passes)[0] > 0 else None
+
+
+def object_sizes(obj_path: Path) -> Tuple[SectionSizes, Dict[str, int]]:
+    """
+    :param obj_path: Object file, or archive member (see odiff.ar)
+    :returns: Sizes of the object's sections, and the byte size of each of its functions
+    """
+    # Imported here, as pyelftools is slow to import and only profiled runs need it
+    from elftools.elf.constants import SH_FLAGS
+    from elftools.elf.elffile import ELFFile
+    text = data = bss = 0
+    functions: Dict[str, int] = {}
+    with open_object(obj_path) as f:
+        elf = ELFFile(f)
+        for section in elf.iter_sections():
+            if not section['sh_flags'] & SH_FLAGS.SHF_ALLOC:
+                continue
+            if section['sh_type'] == 'SHT_NOBITS':
+                bss += section['sh_size']
+            elif section['sh_flags'] & SH_FLAGS.SHF_WRITE:
+                data += section['sh_size']
+            else:
+                text += section['sh_size']
+        symtab = elf.get_section_by_name('.symtab')
+        for sym in symtab.iter_symbols() if symtab is not None else ():
+            if sym['st_info']['type'] == 'STT_FUNC' and sym.name:
+                functions[sym.name] = functions.get(sym.name, 0) + sym['st_size']
+    return SectionSizes(text, data, bss), functions
+
+
+def profile_objects(vendorobj_path: Path, reobj_path: Optional[Path],
+                    timevars: Optional[Dict[str, float]] = None) -> ObjectProfile:
+    """
+    :param reobj_path: RE object, None if it failed to build
+    :param timevars: Time report of the build of the RE object, see split_time_report
+    """
+    vendor_sizes, vendor_functions = object_sizes(vendorobj_path)
+    re_sizes, re_functions = object_sizes(reobj_path) if reobj_path is not None else (None, {})
+    function_sizes = {
+        name: (vendor_functions.get(name), re_functions.get(name))
+        for name in [*vendor_functions, *(n for n in re_functions if n not in vendor_functions)]
+    }
+    return ObjectProfile(vendor_sizes, re_sizes, function_sizes, timevars or {})
+
+
+def restore_profile(saved: Optional[Sequence]) -> Optional[ObjectProfile]:
+    """
+    Rebuild a profile saved as JSON, which turned its tuples into lists.
+    """
+    if saved is None:
+        return None
+    vendor_sizes, re_sizes, function_sizes, timevars = saved
+    return ObjectProfile(
+        SectionSizes(*vendor_sizes), SectionSizes(*re_sizes) if re_sizes is not None else None,
+        {name: tuple(sizes) for name, sizes in function_sizes.items()}, timevars)
+
+
+def profile_json(profile: ObjectProfile) -> Dict[str, Any]:
+    return {
+        'vendor_sizes': profile.vendor_sizes._asdict(),
+        're_sizes': profile.re_sizes._asdict() if profile.re_sizes is not None else None,
+        'function_sizes': {
+            name: {'vendor': vendor, 're': reimpl} for name, (vendor, reimpl) in profile.function_sizes.items()},
+        'timevars': profile.timevars
+    }
+
+
+def size_delta(vendor: Optional[int], reimpl: Optional[int]) -> Optional[int]:
+    return reimpl - vendor if vendor is not None and reimpl is not None else None
+
+
+def profile_rows(lib_profiles: Dict[str, List[Tuple[str, float, ObjectProfile]]]) -> \
+        Tuple[List[tuple], List[tuple]]:
+    """
+    :param lib_profiles: Name, build time and profile of each object, per library
+    :returns: Per-object rows and per-function rows, see OBJECT_COLUMNS and FUNCTION_COLUMNS. Values are None where
+              unknown, e.g. for objects that failed to build
+    """
+    objects: List[tuple] = []
+    functions: List[tuple] = []
+    for lib, profiles in lib_profiles.items():
+        for name, buildtime, profile in profiles:
+            vendor, reimpl = profile.vendor_sizes, profile.re_sizes or SectionSizes(None, None, None)
+            objects.append((
+                lib, name, round(buildtime, 3), profile.timevars.get('TOTAL'), slowest_pass(profile.timevars),
+                vendor.text, reimpl.text, size_delta(vendor.text, reimpl.text),
+                vendor.data, reimpl.data, vendor.bss, reimpl.bss))
+            functions.extend(
+                (lib, name, func, vendor_size, re_size, size_delta(vendor_size, re_size))
+                for func, (vendor_size, re_size) in profile.function_sizes.items())
+    return objects, functions
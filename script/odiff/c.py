@@ -1,15 +1,19 @@
+import re
 from abc import ABC, abstractmethod
 from typing import OrderedDict, Union, Optional, Dict, List, Tuple
 
-from elftools.dwarf.die import DIE
-
 
 class CElement(ABC):
-    def __init__(self, die: Optional[DIE]):
-        self.die = die
+    """
+    Elements don't keep the DIE they were converted from, which would keep the whole DWARF tree alive. Concrete classes
+    declare ``__slots__``, as there are many of them.
+    """
+    __slots__ = ()
 
 
 class CNamed(ABC):
+    __slots__ = ()
+
     def __init__(self, name: str):
         self.name = name
 
@@ -19,15 +23,19 @@ class CNamed(ABC):
 
 
 class CType(CElement, ABC):
+    __slots__ = ()
+
     @abstractmethod
     def to_namedef(self, name: str) -> str:
         ...
 
 
 class CPrimitive(CType):
-    def __init__(self, die: Optional[DIE], name: str):
-        super().__init__(die)
+    __slots__ = ('name', 'size')
+
+    def __init__(self, name: str, size: Optional[int] = None):
         self.name = name
+        self.size = size
 
     def __str__(self):
         return self.name
@@ -36,20 +44,24 @@ class CPrimitive(CType):
         return f'{self} {alias}'
 
 
-CVoid = CPrimitive(None, 'void')
-CEllipsis = CPrimitive(None, '...')
+CVoid = CPrimitive('void')
+CEllipsis = CPrimitive('...')
 
 
 class CCompound(CType, CNamed, ABC):
-    def __init__(self, die: Optional[DIE], name: Optional[str]):
-        CType.__init__(self, die)
+    __slots__ = ('name', 'size')
+
+    def __init__(self, name: Optional[str], size: Optional[int] = None):
         CNamed.__init__(self, name)
+        self.size = size
 
 
 class CStruct(CCompound):
-    def __init__(self, die: Optional[DIE], name: Optional[str], members: OrderedDict[str, CType],
-                 member_offsets: Dict[str, int]):
-        super().__init__(die, name)
+    __slots__ = ('members', 'member_offsets')
+
+    def __init__(self, name: Optional[str], members: OrderedDict[str, CType], member_offsets: Dict[str, int],
+                 size: Optional[int] = None):
+        super().__init__(name, size)
         self.members = members
         self.member_offsets = member_offsets
 
@@ -71,8 +83,10 @@ class CStruct(CCompound):
 
 
 class CUnion(CCompound):
-    def __init__(self, die: Optional[DIE], name: Optional[str], members: OrderedDict[str, CType]):
-        super().__init__(die, name)
+    __slots__ = ('members',)
+
+    def __init__(self, name: Optional[str], members: OrderedDict[str, CType], size: Optional[int] = None):
+        super().__init__(name, size)
         self.members = members
 
     def __str__(self):
@@ -93,8 +107,10 @@ class CUnion(CCompound):
 
 
 class CEnum(CCompound):
-    def __init__(self, die: Optional[DIE], name: Optional[str], members: OrderedDict[str, int]):
-        super().__init__(die, name)
+    __slots__ = ('members',)
+
+    def __init__(self, name: Optional[str], members: OrderedDict[str, int], size: Optional[int] = None):
+        super().__init__(name, size)
         self.members = members
 
     def __str__(self):
@@ -111,8 +127,9 @@ class CEnum(CCompound):
 
 
 class CPointer(CType):
-    def __init__(self, die: Optional[DIE], of: CType):
-        super().__init__(die)
+    __slots__ = ('of',)
+
+    def __init__(self, of: CType):
         self.of = of
 
     def __str__(self):
@@ -127,8 +144,9 @@ class CPointer(CType):
 
 
 class CArray(CType):
-    def __init__(self, die: Optional[DIE], of: CType, length: Optional[int] = None):
-        super().__init__(die)
+    __slots__ = ('of', 'length')
+
+    def __init__(self, of: CType, length: Optional[int] = None):
         self.of = of
         self.length = length
 
@@ -140,8 +158,9 @@ class CArray(CType):
 
 
 class CConst(CType):
-    def __init__(self, die: Optional[DIE], of: CType):
-        super().__init__(die)
+    __slots__ = ('of',)
+
+    def __init__(self, of: CType):
         self.of = of
 
     def __str__(self):
@@ -156,8 +175,9 @@ class CConst(CType):
 
 
 class CVolatile(CType):
-    def __init__(self, die: Optional[DIE], of: CType):
-        super().__init__(die)
+    __slots__ = ('of',)
+
+    def __init__(self, of: CType):
         self.of = of
 
     def __str__(self):
@@ -172,8 +192,9 @@ class CVolatile(CType):
 
 
 class CFunctionPtr(CType):
-    def __init__(self, die: Optional[DIE], return_type: CType, args: List[Tuple[CType, Optional[str]]]):
-        super().__init__(die)
+    __slots__ = ('return_type', 'args')
+
+    def __init__(self, return_type: CType, args: List[Tuple[CType, Optional[str]]]):
         self.return_type = return_type
         self.args = args
 
@@ -190,8 +211,9 @@ class CFunctionPtr(CType):
 
 
 class CTypedef(CType, CNamed):
-    def __init__(self, die: Optional[DIE], name: Optional[str], of: CType):
-        CType.__init__(self, die)
+    __slots__ = ('name', 'of')
+
+    def __init__(self, name: Optional[str], of: CType):
         CNamed.__init__(self, name)
         self.of = of
 
@@ -206,14 +228,16 @@ class CTypedef(CType, CNamed):
 
 
 class CFunction(CElement, CNamed):
-    def __init__(self, die: Optional[DIE], name: Optional, return_type: CType, args: List[Tuple[CType, Optional[str]]],
-                 static: bool = False):
-        CElement.__init__(self, die)
+    __slots__ = ('name', 'return_type', 'args', 'static', 'defined')
+
+    def __init__(self, name: Optional, return_type: CType, args: List[Tuple[CType, Optional[str]]],
+                 static: bool = False, defined: bool = False):
         CNamed.__init__(self, name)
         self.name = name
         self.return_type = return_type
         self.args = args
         self.static = static
+        self.defined = defined
 
     def format_args(self):
         if not self.args:
@@ -234,12 +258,14 @@ class CFunction(CElement, CNamed):
 
 
 class CVariable(CElement, CNamed):
-    def __init__(self, die: Optional[DIE], type: CType, name: str, extern: bool, static: bool):
-        CElement.__init__(self, die)
+    __slots__ = ('name', 'type', 'extern', 'static', 'defined')
+
+    def __init__(self, type: CType, name: str, extern: bool, static: bool, defined: bool = True):
         CNamed.__init__(self, name)
         self.type = type
         self.extern = extern
         self.static = static
+        self.defined = defined
 
     def __str__(self):
         return f"var {'static ' if self.static else ''}{'extern ' if self.extern else ''}{self.type}"
@@ -256,6 +282,7 @@ class HeaderFile:
         self.path = path
         self.defs: Dict[str, Union[CElement, CNamed]] = {}
         self.def_lines: Dict[str, int] = {}
+        self.def_columns: Dict[str, int] = {}
 
     @property
     def sorted_defs(self):
@@ -269,3 +296,33 @@ class HeaderFile:
             f'/*{self.def_lines[k]:4d}*/ '
             f'{v.to_def() if isinstance(v, CNamed) else v.to_namedef(k)};'
             for k, v in self.sorted_defs)
+
+    def to_dump(self) -> str:
+        """
+        Render definitions like the dumps in dwarf/: declarations of functions and variables are left out, and
+        definitions are grouped by kind and followed by their line and column.
+        """
+        groups: List[List[str]] = []
+        prev_kind = None
+        for k, v in self.sorted_defs:
+            if isinstance(v, CFunction):
+                if not v.defined:
+                    continue
+                kind = 'func'
+                text = v.to_def()
+            elif isinstance(v, CVariable):
+                if not v.defined:
+                    continue
+                kind = 'var'
+                text = f'{"static " if v.static else ""}{v.type.to_namedef(k)}'
+            else:
+                kind = 'type'
+                text = v.to_def() if isinstance(v, CNamed) else v.to_namedef(k)
+            # Nested members are indented by 4 spaces in dumps
+            text = re.sub(r'^( +)', r'\1\1', text, flags=re.MULTILINE)
+            text += f'; // :{self.def_lines[k]}:{self.def_columns.get(k, 0)}'
+            if kind != prev_kind or '\n' in text or '\n' in groups[-1][-1]:
+                groups.append([])
+            groups[-1].append(text)
+            prev_kind = kind
+        return '\n\n'.join('\n'.join(g) for g in groups)
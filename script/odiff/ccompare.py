@@ -0,0 +1,133 @@
+from collections import namedtuple
+from typing import Dict, Tuple, Optional, List, Union, Any
+
+from odiff.c import CElement, CNamed, CType, CPrimitive, CCompound, CStruct, CUnion, CEnum, CPointer, CArray, CConst, \
+    CVolatile, CFunctionPtr, CTypedef, CFunction, CVariable
+
+
+class Mismatch(namedtuple('Mismatch', 'path message')):
+    """
+    First difference found between two elements.
+
+    :ivar path: Members (or ``return``, ``arg N``...) leading from the compared element to the difference
+    :ivar message: What differs there
+    """
+
+    def __str__(self):
+        return f"{'.'.join(self.path)}: {self.message}" if self.path else self.message
+
+
+def _within(step: str, mismatch: Optional[Mismatch]) -> Optional[Mismatch]:
+    return None if mismatch is None else Mismatch((step, *mismatch.path), mismatch.message)
+
+
+def _differ(what: str, a: Any, b: Any) -> Mismatch:
+    return Mismatch((), f'{what} {a} != {b}')
+
+
+class TypeComparator:
+    """
+    Structural comparison of C definitions from two sides, e.g. vendor and reverse-engineered headers.
+
+    Like in C, types referred to by name (structs, unions, enums, typedefs) only need to have the same name: they are
+    compared where they're defined. Anonymous types are compared member by member. Results are memoized on the identity
+    of the compared pair, since types are shared by many definitions.
+    """
+
+    def __init__(self):
+        # Compared elements are kept alive along with the result, so that their ids aren't reused
+        self._memo: Dict[Tuple[int, int], Tuple[Any, Any, Optional[Mismatch]]] = {}
+
+    def compare(self, a: Union[CElement, CNamed], b: Union[CElement, CNamed]) -> Optional[Mismatch]:
+        """
+        Compare the definitions of two elements, e.g. a struct with its members rather than just its name.
+
+        :returns: The first difference, or None if they match
+        """
+        key = (id(a), id(b))
+        try:
+            return self._memo[key][2]
+        except KeyError:
+            pass
+        result = self._compare_def(a, b)
+        self._memo[key] = (a, b, result)
+        return result
+
+    def _compare_def(self, a: Union[CElement, CNamed], b: Union[CElement, CNamed]) -> Optional[Mismatch]:
+        if type(a) is not type(b):
+            return _differ('kind', type(a).__name__, type(b).__name__)
+        if isinstance(a, CFunction):
+            if a.static != b.static:
+                return _differ('static', a.static, b.static)
+            return self._compare_signature(a.return_type, a.args, b.return_type, b.args)
+        if isinstance(a, CVariable):
+            if a.static != b.static:
+                return _differ('static', a.static, b.static)
+            return self._compare_ref(a.type, b.type)
+        if isinstance(a, CTypedef):
+            return self._compare_ref(a.of, b.of)
+        if isinstance(a, (CPrimitive, CCompound)) and a.size != b.size:
+            return _differ('size', a.size, b.size)
+        if isinstance(a, (CStruct, CUnion)):
+            return self._compare_members(a, b)
+        if isinstance(a, CEnum):
+            if list(a.members) != list(b.members):
+                return _differ('enumerators', ', '.join(a.members), ', '.join(b.members))
+            for name, value in a.members.items():
+                if value != b.members[name]:
+                    return _within(name, _differ('value', value, b.members[name]))
+            return None
+        return self._compare_ref(a, b)
+
+    def _compare_members(self, a: Union[CStruct, CUnion], b: Union[CStruct, CUnion]) -> Optional[Mismatch]:
+        names_a, names_b = list(a.members), list(b.members)
+        for idx, name in enumerate(names_a):
+            if idx >= len(names_b):
+                return _within(name, Mismatch((), 'missing'))
+            if names_b[idx] != name:
+                return _within(name, _differ('name', name, names_b[idx]))
+            if isinstance(a, CStruct) and a.member_offsets[name] != b.member_offsets[name]:
+                return _within(name, _differ('offset', f'+{a.member_offsets[name]}', f'+{b.member_offsets[name]}'))
+            mismatch = self._compare_ref(a.members[name], b.members[name])
+            if mismatch is not None:
+                return _within(name, mismatch)
+        if len(names_b) > len(names_a):
+            return _within(names_b[len(names_a)], Mismatch((), 'unexpected'))
+        return None
+
+    def _compare_signature(self, return_a: CType, args_a: List[Tuple[CType, Optional[str]]], return_b: CType,
+                           args_b: List[Tuple[CType, Optional[str]]]) -> Optional[Mismatch]:
+        mismatch = self._compare_ref(return_a, return_b)
+        if mismatch is not None:
+            return _within('return', mismatch)
+        if len(args_a) != len(args_b):
+            return _differ('argument count', len(args_a), len(args_b))
+        for idx, ((type_a, _), (type_b, _)) in enumerate(zip(args_a, args_b)):
+            mismatch = self._compare_ref(type_a, type_b)
+            if mismatch is not None:
+                return _within(f'arg {idx + 1}', mismatch)
+        return None
+
+    def _compare_ref(self, a: CType, b: CType) -> Optional[Mismatch]:
+        """
+        Compare types as used by a member, argument or variable.
+        """
+        if a is b:
+            return None
+        if type(a) is not type(b):
+            return _differ('type', a, b)
+        if isinstance(a, (CPrimitive, CTypedef)):
+            return None if a.name == b.name else _differ('type', a, b)
+        if isinstance(a, CCompound):
+            if a.name != b.name:
+                return _differ('type', a, b)
+            return self.compare(a, b) if a.name is None else None
+        if isinstance(a, (CArray, CPointer, CConst, CVolatile)):
+            if isinstance(a, CArray) and a.length != b.length:
+                return _differ('type', a, b)
+            mismatch = self._compare_ref(a.of, b.of)
+            # Show the whole types, unless the difference is within an anonymous type
+            return _differ('type', a, b) if mismatch is not None and not mismatch.path else mismatch
+        if isinstance(a, CFunctionPtr):
+            return self._compare_signature(a.return_type, a.args, b.return_type, b.args)
+        raise TypeError(f"Can't compare {type(a).__name__}")
@@ -0,0 +1,113 @@
+from typing import Dict, List, Tuple, Hashable, Iterable
+
+from odiff.c import CType, CVoid, CEllipsis, CPrimitive, CStruct, CUnion, CEnum, CArray, CTypedef, CFunctionPtr, \
+    CFunction, CVariable, HeaderFile
+
+
+def _label(ctype: CType) -> Hashable:
+    """
+    Everything that tells types apart, except for the types they refer to.
+    """
+    if isinstance(ctype, CPrimitive):
+        return CPrimitive, ctype.name, ctype.size
+    if isinstance(ctype, CStruct):
+        return CStruct, ctype.name, ctype.size, tuple(ctype.member_offsets.items())
+    if isinstance(ctype, CUnion):
+        return CUnion, ctype.name, ctype.size, tuple(ctype.members)
+    if isinstance(ctype, CEnum):
+        return CEnum, ctype.name, ctype.size, tuple(ctype.members.items())
+    if isinstance(ctype, CArray):
+        return CArray, ctype.length
+    if isinstance(ctype, CTypedef):
+        return CTypedef, ctype.name
+    if isinstance(ctype, CFunctionPtr):
+        return CFunctionPtr, tuple(name for _, name in ctype.args)
+    return type(ctype)
+
+
+def _children(ctype: CType) -> List[CType]:
+    if isinstance(ctype, (CStruct, CUnion)):
+        return list(ctype.members.values())
+    if isinstance(ctype, CFunctionPtr):
+        return [ctype.return_type, *(t for t, _ in ctype.args)]
+    if isinstance(ctype, (CPrimitive, CEnum)):
+        return []
+    return [ctype.of]
+
+
+def _set_children(ctype: CType, children: List[CType]):
+    if isinstance(ctype, (CStruct, CUnion)):
+        for name, child in zip(list(ctype.members), children):
+            ctype.members[name] = child
+    elif isinstance(ctype, CFunctionPtr):
+        ctype.return_type = children[0]
+        ctype.args = [(t, name) for t, (_, name) in zip(children[1:], ctype.args)]
+    elif children:
+        ctype.of = children[0]
+
+
+def _element_types(entry) -> Iterable[CType]:
+    if isinstance(entry, CFunction):
+        return [entry.return_type, *(t for t, _ in entry.args)]
+    if isinstance(entry, CVariable):
+        return [entry.type]
+    return [entry]
+
+
+def intern_types(header_files: Dict[str, HeaderFile]) -> int:
+    """
+    Deduplicate the types of ``header_files``, e.g. the copies of a header's types from every object including it, so
+    that each distinct type is only kept once. Definitions are updated in place to refer to the remaining types.
+
+    Types can be recursive (through pointers), so they're grouped by partition refinement: starting from their own
+    attributes, groups are split by the groups of the types they refer to until no group splits anymore.
+
+    :returns: Number of types that were merged into an identical one
+    """
+    # Gather every reachable type. The global void and ... come first, to be kept over unpickled copies
+    types: List[CType] = []
+    index: Dict[int, int] = {}
+    stack: List[CType] = []
+    for header in header_files.values():
+        for entry in header.defs.values():
+            stack.extend(_element_types(entry))
+    stack += [CEllipsis, CVoid]
+    while stack:
+        ctype = stack.pop()
+        if id(ctype) in index:
+            continue
+        index[id(ctype)] = len(types)
+        types.append(ctype)
+        stack.extend(_children(ctype))
+    children = [[index[id(c)] for c in _children(t)] for t in types]
+
+    def number(keys: List[Hashable]) -> Tuple[List[int], int]:
+        ids: Dict[Hashable, int] = {}
+        return [ids.setdefault(k, len(ids)) for k in keys], len(ids)
+
+    groups, count = number([_label(t) for t in types])
+    while True:
+        refined, refined_count = number([(groups[i], *(groups[c] for c in children[i])) for i in range(len(types))])
+        groups = refined
+        if refined_count == count:
+            break
+        count = refined_count
+
+    # The first type of each group stands for the others
+    first: Dict[int, int] = {}
+    for i, group in enumerate(groups):
+        first.setdefault(group, i)
+    canonical = [types[first[group]] for group in groups]
+    for i, ctype in enumerate(types):
+        if first[groups[i]] == i:
+            _set_children(ctype, [canonical[c] for c in children[i]])
+    for header in header_files.values():
+        for name, entry in header.defs.items():
+            if isinstance(entry, CFunction):
+                entry.return_type = canonical[index[id(entry.return_type)]]
+                entry.args = [(canonical[index[id(t)]], arg_name) for t, arg_name in entry.args]
+            elif isinstance(entry, CVariable):
+                entry.type = canonical[index[id(entry.type)]]
+            else:
+                header.defs[name] = canonical[index[id(entry)]]
+    return len(types) - count
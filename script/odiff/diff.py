@@ -0,0 +1,168 @@
+import difflib
+from typing import List, Tuple, Sequence, Optional, Hashable
+
+# (tag, alo, ahi, blo, bhi), like difflib.SequenceMatcher.get_opcodes
+Opcode = Tuple[str, int, int, int, int]
+
+# Below this length, difflib's SequenceMatcher is fast enough and its autojunk heuristic doesn't kick in yet
+SMALL_DIFF_LEN = 200
+# Maximum number of insertions + deletions the Myers diff looks for before giving up
+DEFAULT_MAX_COST = 1000
+
+
+def _myers(a: Sequence[Hashable], b: Sequence[Hashable], max_cost: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Find a shortest edit script between ``a`` and ``b`` with Myers' O(ND) algorithm.
+
+    :returns: Index pairs of the matched elements, or None if more than ``max_cost`` edits are needed
+    """
+    n, m = len(a), len(b)
+    max_d = min(n + m, max_cost)
+    off = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    # Furthest reaching x of every diagonal k in [-d, d], after each round d
+    trace: List[List[int]] = []
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[off + k - 1] < v[off + k + 1]):
+                x = v[off + k + 1]
+            else:
+                x = v[off + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[off + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, d, n, m)
+        trace.append(v[off - d:off + d + 1])
+    return None
+
+
+def _backtrack(trace: List[List[int]], d: int, x: int, y: int) -> List[Tuple[int, int]]:
+    matches: List[Tuple[int, int]] = []
+    for d in range(d, 0, -1):
+        prev_v = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and prev_v[k - 1 + d - 1] < prev_v[k + 1 + d - 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = prev_v[prev_k + d - 1]
+        prev_y = prev_x - prev_k
+        # The edit goes one step right (deletion) or down (insertion) from the previous point, then follows a snake
+        mid_x, mid_y = (prev_x, prev_y + 1) if prev_k == k + 1 else (prev_x + 1, prev_y)
+        while x > mid_x and y > mid_y:
+            x -= 1
+            y -= 1
+            matches.append((x, y))
+        x, y = prev_x, prev_y
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        matches.append((x, y))
+    matches.reverse()
+    return matches
+
+
+def _match(a: Sequence[Hashable], b: Sequence[Hashable], max_cost: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Like _myers, with the common prefix and suffix taken out first since they often make up most of the input.
+    """
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < len(a) - prefix and suffix < len(b) - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    middle = _myers(a[prefix:len(a) - suffix], b[prefix:len(b) - suffix], max_cost)
+    if middle is None:
+        return None
+    return [
+        *((i, i) for i in range(prefix)),
+        *((x + prefix, y + prefix) for x, y in middle),
+        *((len(a) - suffix + i, len(b) - suffix + i) for i in range(suffix))
+    ]
+
+
+def _split_blocks(keys: Sequence[Hashable], starts: Sequence[bool]) -> List[Tuple[int, int]]:
+    bounds = [i for i, start in enumerate(starts) if start and i > 0]
+    return list(zip([0, *bounds], [*bounds, len(keys)]))
+
+
+def _block_start(blocks: List[Tuple[int, int]], idx: int, end: int) -> int:
+    return blocks[idx][0] if idx < len(blocks) else end
+
+
+def _match_blocks(a: Sequence[Hashable], b: Sequence[Hashable], starts_a: Sequence[bool], starts_b: Sequence[bool],
+                  max_cost: int) -> List[Tuple[int, int]]:
+    """
+    Align the basic blocks of ``a`` and ``b`` first, then diff the elements between identical blocks. Where that still
+    needs more than ``max_cost`` edits, the blocks in between are paired up in order and diffed one by one.
+    """
+    blocks_a = _split_blocks(a, starts_a)
+    blocks_b = _split_blocks(b, starts_b)
+    block_matches = _match(
+        [tuple(a[lo:hi]) for lo, hi in blocks_a], [tuple(b[lo:hi]) for lo, hi in blocks_b], max_cost) or []
+    matches: List[Tuple[int, int]] = []
+    prev_a, prev_b = 0, 0
+    for block_a, block_b in [*block_matches, (len(blocks_a), len(blocks_b))]:
+        alo, ahi = _block_start(blocks_a, prev_a, len(a)), _block_start(blocks_a, block_a, len(a))
+        blo, bhi = _block_start(blocks_b, prev_b, len(b)), _block_start(blocks_b, block_b, len(b))
+        # The whole input is known to be too costly already
+        gap = _match(a[alo:ahi], b[blo:bhi], max_cost) if block_matches else None
+        if gap is not None:
+            matches += ((x + alo, y + blo) for x, y in gap)
+        else:
+            for (lo_a, hi_a), (lo_b, hi_b) in zip(blocks_a[prev_a:block_a], blocks_b[prev_b:block_b]):
+                matches += ((x + lo_a, y + lo_b) for x, y in _match(a[lo_a:hi_a], b[lo_b:hi_b], max_cost) or [])
+        if block_a == len(blocks_a):
+            break
+        lo, hi = blocks_a[block_a]
+        matches += ((lo + i, blocks_b[block_b][0] + i) for i in range(hi - lo))
+        prev_a, prev_b = block_a + 1, block_b + 1
+    return matches
+
+
+def _opcodes(matches: List[Tuple[int, int]], n: int, m: int) -> List[Opcode]:
+    # Same grouping of the matching runs as SequenceMatcher.get_opcodes
+    runs: List[Tuple[int, int, int]] = []
+    for x, y in matches:
+        if runs and runs[-1][0] + runs[-1][2] == x and runs[-1][1] + runs[-1][2] == y:
+            runs[-1] = (runs[-1][0], runs[-1][1], runs[-1][2] + 1)
+        else:
+            runs.append((x, y, 1))
+    opcodes: List[Opcode] = []
+    i, j = 0, 0
+    for ai, bj, size in [*runs, (n, m, 0)]:
+        if i < ai and j < bj:
+            opcodes.append(('replace', i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(('delete', i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(('insert', i, ai, j, bj))
+        i, j = ai + size, bj + size
+        if size:
+            opcodes.append(('equal', ai, i, bj, j))
+    return opcodes
+
+
+def diff_sequences(a: Sequence[Hashable], b: Sequence[Hashable], block_starts_a: Optional[Sequence[bool]] = None,
+                   block_starts_b: Optional[Sequence[bool]] = None, max_cost: int = DEFAULT_MAX_COST) -> \
+        Tuple[List[Opcode], float]:
+    """
+    Diff two sequences. Small ones go through difflib; larger ones through a Myers diff, which gives up after
+    ``max_cost`` edits and then aligns on basic blocks instead, if their starts are given.
+
+    :returns: difflib-style opcodes, and the similarity ratio (2 * matches / total length, like SequenceMatcher)
+    """
+    if max(len(a), len(b)) < SMALL_DIFF_LEN:
+        matcher = difflib.SequenceMatcher(None, a, b)
+        return matcher.get_opcodes(), matcher.ratio()
+    matches = _match(a, b, max_cost)
+    if matches is None:
+        if block_starts_a is not None and block_starts_b is not None:
+            matches = _match_blocks(a, b, block_starts_a, block_starts_b, max_cost)
+        else:
+            matches = []
+    return _opcodes(matches, len(a), len(b)), 2 * len(matches) / (len(a) + len(b))
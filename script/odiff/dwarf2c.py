@@ -1,9 +1,12 @@
+from __future__ import annotations
+
 from collections import OrderedDict
 from struct import Struct
-from typing import Optional, Tuple, List, TypeVar, Dict, Union
+from typing import Optional, Tuple, List, TypeVar, Dict, Union, TYPE_CHECKING
 
-from elftools.dwarf.die import DIE
-from elftools.elf.sections import SymbolTableSection
+if TYPE_CHECKING:
+    from elftools.dwarf.die import DIE
+    from elftools.elf.sections import SymbolTableSection
 
 from odiff.c import CType, CVoid, CEllipsis, CFunction, CPointer, CArray, CStruct, CUnion, CTypedef, CPrimitive, \
     CFunctionPtr, CVolatile, CConst, CEnum
@@ -13,6 +16,10 @@ def die_get_name(die: DIE) -> Optional[str]:
     return die.attributes['DW_AT_name'].value.decode() if 'DW_AT_name' in die.attributes else None
 
 
+def die_get_byte_size(die: DIE) -> Optional[int]:
+    return die.attributes['DW_AT_byte_size'].value if 'DW_AT_byte_size' in die.attributes else None
+
+
 def die_get_at_type(die: DIE) -> CType:
     try:
         return die_to_ctype(die.cu.get_DIE_from_refaddr(die.attributes['DW_AT_type'].value))
@@ -47,14 +54,14 @@ def die_to_func(die: DIE) -> CFunction:
     if die.tag != 'DW_TAG_subprogram':
         raise ValueError(f"Wrong DIE tag {die.tag} for a function")
     return_type, args = die_to_funclike_args(die)
-    return CFunction(die=die, name=die_get_name(die), return_type=return_type, args=args)
+    return CFunction(name=die_get_name(die), return_type=return_type, args=args)
 
 
 CT = TypeVar('CT')
 
 
-def cache_ctype(ctype: CT) -> CT:
-    ctype.die.cu.ctype_cache[ctype.die.offset] = ctype
+def cache_ctype(die: DIE, ctype: CT) -> CT:
+    die.cu.ctype_cache[die.offset] = ctype
     return ctype
 
 
@@ -73,17 +80,18 @@ def die_to_ctype(die: DIE) -> CType:
             of_die: DIE = die.cu.get_DIE_from_refaddr(die.attributes['DW_AT_type'].value)
             if of_die.tag == 'DW_TAG_subroutine_type':
                 return of
-        return cache_ctype(CPointer(die=die, of=of))
+        return cache_ctype(die, CPointer(of=of))
     elif die.tag == 'DW_TAG_array_type':
         array_length: Optional[int] = None
         for child_die in die.iter_children():
             if child_die.tag == 'DW_TAG_subrange_type' and 'DW_AT_upper_bound' in child_die.attributes:
                 array_length = child_die.attributes['DW_AT_upper_bound'].value + 1
-        return cache_ctype(CArray(die=die, of=die_get_at_type(die), length=array_length))
+        return cache_ctype(die, CArray(of=die_get_at_type(die), length=array_length))
     elif die.tag == 'DW_TAG_structure_type':
         members: TOrderedDict[str, CType] = OrderedDict()
         member_offsets: Dict[str, int] = {}
-        struct = cache_ctype(CStruct(die=die, name=die_get_name(die), members=members, member_offsets=member_offsets))
+        struct = cache_ctype(die, CStruct(
+            name=die_get_name(die), members=members, member_offsets=member_offsets, size=die_get_byte_size(die)))
         for memb_die in die.iter_children():
             if memb_die.tag == 'DW_TAG_member':
                 memb_name = die_get_name(memb_die)
@@ -92,14 +100,14 @@ def die_to_ctype(die: DIE) -> CType:
         return struct
     elif die.tag == 'DW_TAG_union_type':
         members: TOrderedDict[str, CType] = OrderedDict()
-        union = cache_ctype(CUnion(die=die, name=die_get_name(die), members=members))
+        union = cache_ctype(die, CUnion(name=die_get_name(die), members=members, size=die_get_byte_size(die)))
         for memb_die in die.iter_children():
             if memb_die.tag == 'DW_TAG_member':
                 members[die_get_name(memb_die)] = die_get_at_type(memb_die)
         return union
     elif die.tag == 'DW_TAG_enumeration_type':
         members: TOrderedDict[str, int] = OrderedDict()
-        enum = cache_ctype(CEnum(die=die, name=die_get_name(die), members=members))
+        enum = cache_ctype(die, CEnum(name=die_get_name(die), members=members, size=die_get_byte_size(die)))
         for memb_die in die.iter_children():
             if memb_die.tag == 'DW_TAG_enumerator':
                 members[die_get_name(memb_die)] = memb_die.attributes['DW_AT_const_value'].value
@@ -109,19 +117,19 @@ def die_to_ctype(die: DIE) -> CType:
         if isinstance(of, CArray):
             return of  # A cv array is an array of cv, and its element types are already cv-qualified
         if die.tag == 'DW_TAG_const_type':
-            return cache_ctype(CConst(die=die, of=of))
+            return cache_ctype(die, CConst(of=of))
         else:
-            return cache_ctype(CVolatile(die=die, of=of))
+            return cache_ctype(die, CVolatile(of=of))
     elif die.tag == 'DW_TAG_subroutine_type':
         return_type, args = die_to_funclike_args(die)
-        return cache_ctype(CFunctionPtr(die=die, return_type=return_type, args=args))
+        return cache_ctype(die, CFunctionPtr(return_type=return_type, args=args))
     elif die.tag == 'DW_TAG_base_type':
         name = die.attributes['DW_AT_name'].value.decode()
         if name == '_Bool':
             name = 'bool'
-        return cache_ctype(CPrimitive(die=die, name=name))
+        return cache_ctype(die, CPrimitive(name=name, size=die_get_byte_size(die)))
     elif die.tag == 'DW_TAG_typedef':
-        return cache_ctype(CTypedef(die=die, name=die.attributes['DW_AT_name'].value.decode(), of=die_get_at_type(die)))
+        return cache_ctype(die, CTypedef(name=die.attributes['DW_AT_name'].value.decode(), of=die_get_at_type(die)))
     else:
         raise TypeError(f"What is a type {die.tag}?")
 
@@ -177,6 +185,43 @@ class Context:
         f.args = funcdef.args
 
 
+class ContextRecorder(Context):
+    """
+    Stands in for a library's Context while an object is collected on its own (e.g. in a worker process): function
+    declarations and definitions are recorded, to be replayed on the actual Context when the object is merged.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.calls: List[Tuple[CFunction, bool, bool]] = []
+
+    def func(self, func_name: str) -> Optional[CFunction]:
+        # Resolved on replay, against the functions of the objects merged before this one
+        return None
+
+    def decl_func(self, func: CFunction):
+        self.calls.append((func, False, False))
+
+    def def_func(self, funcdef: CFunction, inline: bool):
+        self.calls.append((funcdef, True, inline))
+
+    def replay(self, ctx: Context) -> Dict[int, CFunction]:
+        """
+        Apply the recorded calls to ``ctx``, which raises on ODR violations like when collecting into it directly.
+
+        :returns: Functions already known to ``ctx`` that recorded declarations resolve to, by declaration id
+        """
+        substitutions: Dict[int, CFunction] = {}
+        for func, defined, inline in self.calls:
+            if defined:
+                ctx.def_func(func, inline)
+            elif (known := ctx.func(func.name)) is not None:
+                substitutions[id(func)] = known
+            else:
+                ctx.decl_func(func)
+        return substitutions
+
+
 def die_to_ctype_or_func(ctx: Context, die: DIE, symtab: SymbolTableSection) -> Union[CType, CFunction]:
     if die.tag != 'DW_TAG_subprogram':
         return die_to_ctype(die)
@@ -184,15 +229,15 @@ def die_to_ctype_or_func(ctx: Context, die: DIE, symtab: SymbolTableSection) ->
     in_obj, static = is_static(symtab, func_name)
     if static:
         return_type, args = die_to_funclike_args(die)
-        return CFunction(die=die, name=func_name, return_type=return_type, args=args, static=True)
+        return CFunction(name=func_name, return_type=return_type, args=args, static=True, defined=True)
     if in_obj:
         return_type, args = die_to_funclike_args(die)
-        cfunc = CFunction(die=die, name=func_name, return_type=return_type, args=args, static=False)
+        cfunc = CFunction(name=func_name, return_type=return_type, args=args, static=False, defined=True)
         ctx.def_func(cfunc, 'DW_AT_inline' in die.attributes)
         return cfunc
     if (cfunc := ctx.func(func_name)) is not None:
         return cfunc
     return_type, args = die_to_funclike_args(die)
-    cfunc = CFunction(die=die, name=func_name, return_type=return_type, args=args, static=False)
+    cfunc = CFunction(name=func_name, return_type=return_type, args=args, static=False)
     ctx.decl_func(cfunc)
     return cfunc
\ No newline at end of file
@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from collections import namedtuple
+from pathlib import Path
+from typing import List, Optional, Dict, Tuple, Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from elftools.dwarf.die import DIE
+    from elftools.elf.elffile import ELFFile
+
+from odiff.paths import CACHE_DIR
+from odiff.utils import hash_file
+
+# Bump when the schema or what gets indexed changes
+FORMAT_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE cus (id INTEGER PRIMARY KEY, path TEXT NOT NULL);
+CREATE TABLE files (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);
+-- Top-level subprograms of each CU, in DIE order. Out-of-line instances of inline functions are named after their
+-- abstract origin (named_by_origin); abstract instances have inline set and no ranges
+CREATE TABLE subprograms (
+    id INTEGER PRIMARY KEY, cu INTEGER NOT NULL, name TEXT, named_by_origin INTEGER NOT NULL, inline INTEGER NOT NULL,
+    external INTEGER NOT NULL, decl_file INTEGER, decl_line INTEGER);
+-- Inlined instances within each subprogram, in DIE (pre-)order
+CREATE TABLE inlines (
+    id INTEGER PRIMARY KEY, subprogram INTEGER NOT NULL, name TEXT, depth INTEGER NOT NULL, call_file INTEGER,
+    call_line INTEGER);
+CREATE TABLE subprogram_ranges (subprogram INTEGER NOT NULL, low INTEGER NOT NULL, high INTEGER NOT NULL);
+CREATE TABLE inline_ranges (inline INTEGER NOT NULL, low INTEGER NOT NULL, high INTEGER NOT NULL);
+CREATE INDEX subprograms_name ON subprograms (name);
+CREATE INDEX inlines_subprogram ON inlines (subprogram);
+CREATE INDEX subprogram_ranges_low ON subprogram_ranges (low);
+CREATE INDEX inline_ranges_inline ON inline_ranges (inline);
+CREATE INDEX inline_ranges_low ON inline_ranges (low);
+'''
+
+# Source location: path of the file, as recorded in the line program of its CU, and line
+DeclLocation = namedtuple('DeclLocation', 'file line')
+IndexedSubprogram = namedtuple('IndexedSubprogram', 'id name cu decl low high')
+IndexedInline = namedtuple('IndexedInline', 'id name depth call ranges')
+
+
+def die_origin_name(die: DIE) -> Optional[str]:
+    """
+    Name of a DIE, or of the DIE it's an instance (or the definition) of.
+    """
+    while True:
+        if 'DW_AT_name' in die.attributes:
+            return die.attributes['DW_AT_name'].value.decode()
+        for attr in ('DW_AT_abstract_origin', 'DW_AT_specification'):
+            if attr in die.attributes:
+                die = die.get_DIE_from_attribute(attr)
+                break
+        else:
+            return None
+
+
+class _Indexer:
+    def __init__(self, elf: ELFFile, db: sqlite3.Connection):
+        self.dwarf = elf.get_dwarf_info()
+        self.range_lists = self.dwarf.range_lists()
+        self.db = db
+        self.file_ids: Dict[str, int] = {}
+        self.subprograms: List[Tuple] = []
+        self.inlines: List[Tuple] = []
+        self.subprogram_ranges: List[Tuple[int, int, int]] = []
+        self.inline_ranges: List[Tuple[int, int, int]] = []
+
+    def _file_id(self, path: str) -> int:
+        return self.file_ids.setdefault(path, len(self.file_ids) + 1)
+
+    def _ranges(self, die: DIE, base: int) -> List[Tuple[int, int]]:
+        if 'DW_AT_ranges' in die.attributes:
+            ranges = []
+            for entry in self.range_lists.get_range_list_at_offset(die.attributes['DW_AT_ranges'].value, cu=die.cu):
+                if hasattr(entry, 'base_address'):  # BaseAddressEntry
+                    base = entry.base_address
+                elif getattr(entry, 'is_absolute', False):
+                    ranges.append((entry.begin_offset, entry.end_offset))
+                else:
+                    ranges.append((base + entry.begin_offset, base + entry.end_offset))
+            return ranges
+        if 'DW_AT_low_pc' in die.attributes and 'DW_AT_high_pc' in die.attributes:
+            low = die.attributes['DW_AT_low_pc'].value
+            high = die.attributes['DW_AT_high_pc']
+            # DWARF 4 encodes high_pc as an offset from low_pc, unless it's an address
+            return [(low, high.value if high.form == 'DW_FORM_addr' else low + high.value)]
+        return []
+
+    def _inlines(self, die: DIE, subprogram_id: int, base: int, files: List[Optional[int]], depth: int):
+        for child in die.iter_children():
+            if child.tag == 'DW_TAG_inlined_subroutine':
+                inline_id = len(self.inlines) + 1
+                call_file = child.attributes['DW_AT_call_file'].value if 'DW_AT_call_file' in child.attributes else 0
+                self.inlines.append((
+                    inline_id, subprogram_id, die_origin_name(child), depth,
+                    files[call_file] if 0 < call_file < len(files) else None,
+                    child.attributes['DW_AT_call_line'].value if 'DW_AT_call_line' in child.attributes else None))
+                self.inline_ranges.extend((inline_id, low, high) for low, high in self._ranges(child, base))
+                self._inlines(child, subprogram_id, base, files, depth + 1)
+            else:
+                self._inlines(child, subprogram_id, base, files, depth)
+
+    def index(self):
+        cus: List[Tuple[int, str]] = []
+        for cu in self.dwarf.iter_CUs():
+            top = cu.get_top_DIE()
+            cu_id = len(cus) + 1
+            cus.append((cu_id, top.get_full_path()))
+            base = top.attributes['DW_AT_low_pc'].value if 'DW_AT_low_pc' in top.attributes else 0
+            # DW_AT_decl_file and DW_AT_call_file index the file entries of the CU's line program, from 1
+            files: List[Optional[int]] = [None]
+            line_program = self.dwarf.line_program_for_CU(cu)
+            if line_program is not None:
+                include_directories = [d.decode() for d in line_program.header.include_directory]
+                for entry in line_program['file_entry']:
+                    name = entry.name.decode()
+                    files.append(self._file_id(
+                        f'{include_directories[entry.dir_index - 1]}/{name}' if entry.dir_index != 0 else name))
+            for die in top.iter_children():
+                if die.tag != 'DW_TAG_subprogram':
+                    continue
+                subprogram_id = len(self.subprograms) + 1
+                decl_file = die.attributes['DW_AT_decl_file'].value if 'DW_AT_decl_file' in die.attributes else 0
+                self.subprograms.append((
+                    subprogram_id, cu_id, die_origin_name(die), 'DW_AT_name' not in die.attributes,
+                    'DW_AT_inline' in die.attributes, 'DW_AT_external' in die.attributes,
+                    files[decl_file] if 0 < decl_file < len(files) else None,
+                    die.attributes['DW_AT_decl_line'].value if 'DW_AT_decl_line' in die.attributes else None))
+                self.subprogram_ranges.extend((subprogram_id, low, high) for low, high in self._ranges(die, base))
+                self._inlines(die, subprogram_id, base, files, 1)
+        self.db.executemany('INSERT INTO cus VALUES (?, ?)', cus)
+        self.db.executemany('INSERT INTO files VALUES (?, ?)', ((i, p) for p, i in self.file_ids.items()))
+        self.db.executemany('INSERT INTO subprograms VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self.subprograms)
+        self.db.executemany('INSERT INTO inlines VALUES (?, ?, ?, ?, ?, ?)', self.inlines)
+        self.db.executemany('INSERT INTO subprogram_ranges VALUES (?, ?, ?)', self.subprogram_ranges)
+        self.db.executemany('INSERT INTO inline_ranges VALUES (?, ?, ?)', self.inline_ranges)
+
+
+class DwarfIndex:
+    """
+    Subprograms, inlined instances, their address ranges and source locations, extracted once from the DWARF of a
+    linked ELF into an SQLite database, so that tools query it instead of walking every DIE tree again.
+    """
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    @classmethod
+    def load(cls, elf_path: Path, root: Path = CACHE_DIR / 'dwarf') -> 'DwarfIndex':
+        """
+        Open the index of ``elf_path``, building it first if it's missing or the ELF changed.
+        """
+        elf_hash = hash_file(elf_path)
+        db_path = root / f'{elf_path.name}.sqlite'
+        if db_path.exists():
+            db = sqlite3.connect(db_path)
+            try:
+                meta = dict(db.execute('SELECT key, value FROM meta'))
+                if meta.get('version') == str(FORMAT_VERSION) and meta.get('elf_hash') == elf_hash:
+                    return cls(db)
+            except sqlite3.DatabaseError:
+                pass
+            db.close()
+        root.mkdir(parents=True, exist_ok=True)
+        # Built aside and moved in place, so that concurrent readers never see a partial index. Concurrent builds of the
+        # same index each have their own file; a leftover one is from a crashed process of the same pid
+        tmp_path = db_path.with_name(f'.{db_path.name}.{os.getpid()}.tmp')
+        tmp_path.unlink(missing_ok=True)
+        db = sqlite3.connect(tmp_path)
+        db.executescript(SCHEMA)
+        # pyelftools is only needed to build indexes, and is slow to import
+        from elftools.elf.elffile import ELFFile
+        with open(elf_path, 'rb') as f:
+            _Indexer(ELFFile(f), db).index()
+        db.executemany('INSERT INTO meta VALUES (?, ?)', (('version', str(FORMAT_VERSION)), ('elf_hash', elf_hash)))
+        db.commit()
+        db.close()
+        tmp_path.replace(db_path)
+        return cls(sqlite3.connect(db_path))
+
+    def _subprograms(self, where: str, params: Tuple) -> List[IndexedSubprogram]:
+        rows = self.db.execute(f'''
+            SELECT s.id, s.name, c.path, f.path, s.decl_line, MIN(r.low), MAX(r.high)
+            FROM subprograms s JOIN cus c ON c.id = s.cu LEFT JOIN files f ON f.id = s.decl_file
+            LEFT JOIN subprogram_ranges r ON r.subprogram = s.id
+            WHERE {where} GROUP BY s.id ORDER BY s.id''', params)
+        return [
+            IndexedSubprogram(sub_id, name, cu, DeclLocation(file, line) if file is not None else None, low, high)
+            for sub_id, name, cu, file, line, low, high in rows]
+
+    def lookup(self, name: str) -> List[IndexedSubprogram]:
+        """
+        :returns: Subprograms called ``name``, including declarations and abstract instances of inline functions
+        """
+        return self._subprograms('s.name = ?', (name,))
+
+    def function_at(self, address: int) -> Optional[IndexedSubprogram]:
+        """
+        :returns: The (concrete) subprogram whose code contains ``address``
+        """
+        row = self.db.execute(
+            'SELECT subprogram FROM subprogram_ranges WHERE low <= ? AND ? < high ORDER BY low DESC LIMIT 1',
+            (address, address)).fetchone()
+        if row is None:
+            return None
+        return self._subprograms('s.id = ?', (row[0],))[0]
+
+    def inlines(self, subprogram_id: int) -> List[IndexedInline]:
+        """
+        :returns: Functions inlined into a subprogram, in DIE order (outer ones before those inlined into them)
+        """
+        ranges: Dict[int, List[Tuple[int, int]]] = {}
+        for inline_id, low, high in self.db.execute('''
+                SELECT r.inline, r.low, r.high FROM inline_ranges r JOIN inlines i ON i.id = r.inline
+                WHERE i.subprogram = ? ORDER BY r.rowid''', (subprogram_id,)):
+            ranges.setdefault(inline_id, []).append((low, high))
+        return [
+            IndexedInline(inline_id, name, depth, DeclLocation(file, line) if file is not None else None,
+                          ranges.get(inline_id, []))
+            for inline_id, name, depth, file, line in self.db.execute('''
+                SELECT i.id, i.name, i.depth, f.path, i.call_line FROM inlines i LEFT JOIN files f ON f.id = i.call_file
+                WHERE i.subprogram = ? ORDER BY i.id''', (subprogram_id,))]
+
+    def inlines_at(self, address: int) -> List[IndexedInline]:
+        """
+        :returns: Functions inlined at ``address``, outermost first
+        """
+        sub = self.function_at(address)
+        if sub is None:
+            return []
+        return [inline for inline in self.inlines(sub.id) if any(low <= address < high for low, high in inline.ranges)]
+
+    def iter_inlining_subprograms(self, *cu_path_filters: str) -> Iterator[Tuple[str, List[IndexedInline]]]:
+        """
+        Named, concrete subprograms that have functions inlined into them, with those functions, in DIE order.
+
+        :param cu_path_filters: Only yield subprograms of CUs whose path contains all of these
+        """
+        current_id: Optional[int] = None
+        current_name = ''
+        inlines: List[IndexedInline] = []
+        rows = self.db.execute(f'''
+            SELECT s.id, s.name, i.id, i.name, i.depth, f.path, i.call_line, r.low, r.high
+            FROM inlines i JOIN subprograms s ON s.id = i.subprogram JOIN cus c ON c.id = s.cu
+            LEFT JOIN files f ON f.id = i.call_file LEFT JOIN inline_ranges r ON r.inline = i.id
+            WHERE NOT s.named_by_origin AND NOT s.inline AND s.name IS NOT NULL{
+                ''.join(' AND instr(c.path, ?) > 0' for _ in cu_path_filters)}
+            ORDER BY i.id, r.rowid''', cu_path_filters)
+        # Inlines are numbered in DIE order across the whole ELF, so those of a subprogram come in a row
+        for sub_id, sub_name, inline_id, name, depth, file, line, low, high in rows:
+            if sub_id != current_id:
+                if current_id is not None:
+                    yield current_name, inlines
+                current_id, current_name, inlines = sub_id, sub_name, []
+            if not inlines or inlines[-1].id != inline_id:
+                inlines.append(IndexedInline(
+                    inline_id, name, depth, DeclLocation(file, line) if file is not None else None, []))
+            if low is not None:
+                inlines[-1].ranges.append((low, high))
+        if current_id is not None:
+            yield current_name, inlines
@@ -0,0 +1,165 @@
+from bisect import bisect_right
+from collections import defaultdict
+from typing import BinaryIO, Dict, List, Tuple, Optional
+
+from elftools.elf.elffile import ELFFile
+from elftools.elf.relocation import RelocationSection
+from elftools.elf.sections import Symbol
+
+from odiff.asm import Function, AsmLine, Label, is_function_section, is_listed_label
+from odiff.rvdis import decode
+
+# Relocations whose symbol objdump-based parsing shows as the target of the relocated instruction (see TARGET_RELOCS)
+R_RISCV_CALL = 18
+R_RISCV_HI20 = 26
+R_RISCV_LO12_I = 27
+TARGET_RELOC_TYPES = (R_RISCV_CALL, R_RISCV_HI20, R_RISCV_LO12_I)
+
+
+def _symbol_sort_key(sym: Symbol) -> Tuple:
+    """
+    Order symbols like objdump's ``compare_symbols`` does, which decides which of several symbols at the same address
+    is printed as a label or used to describe a branch target.
+    """
+    name: str = sym.name
+    return (
+        sym['st_value'],
+        'gnu_compiled' in name or 'gcc2_compiled' in name,
+        sym['st_info']['type'] == 'STT_FILE' or name[-2:] in ('.o', '.a'),
+        sym['st_info']['type'] not in ('STT_FUNC', 'STT_GNU_IFUNC'),
+        sym['st_info']['bind'] == 'STB_LOCAL',
+        sym['st_info']['bind'] != 'STB_GLOBAL',
+        -sym['st_size'],
+        name.startswith('.'),
+        name.encode()
+    )
+
+
+def _is_listed_symbol(sym: Symbol) -> bool:
+    # Same filtering as objdump's remove_useless_symbols. RISC-V mapping symbols ($x, $d) and the fake labels gas
+    # emits for pcrel relocations ('.L0 ') are target special symbols, which objdump never shows either.
+    name: str = sym.name
+    return bool(name) and sym['st_info']['type'] not in ('STT_SECTION', 'STT_FILE') and name[0] != '$' \
+        and not name.startswith('.L0 ')
+
+
+class _SymbolTable:
+    """
+    Symbols of a section, as objdump would use them to label a listing.
+    """
+
+    def __init__(self, symbols: List[Symbol]):
+        self.values: List[int] = []
+        self.names: List[str] = []
+        for sym in sorted(symbols, key=_symbol_sort_key):
+            # The first symbol in sort order wins for a given address
+            if not self.values or self.values[-1] != sym['st_value']:
+                self.values.append(sym['st_value'])
+                self.names.append(sym.name)
+
+    def describe(self, addr: int) -> Optional[str]:
+        idx = bisect_right(self.values, addr) - 1
+        if idx < 0:
+            return None
+        offset = addr - self.values[idx]
+        return self.names[idx] if offset == 0 else f'{self.names[idx]}+0x{offset:x}'
+
+
+def disassemble(data: bytes, base: int, symbols: _SymbolTable, reloc_targets: Dict[int, str]) -> \
+        Tuple[List[AsmLine], List[Label]]:
+    asm_lines: List[AsmLine] = []
+    offset = 0
+    while offset + 2 <= len(data):
+        pc = base + offset
+        size, opcode, operands, target_addr = decode(data, offset, pc)
+        target = reloc_targets.get(pc)
+        if target is None and target_addr is not None:
+            target = symbols.describe(target_addr)
+        asm_lines.append(AsmLine(offset=pc, opcode=opcode, operands=operands, target=target))
+        offset += size
+    labels = [
+        Label(offset=value, name=name)
+        for value, name in zip(symbols.values, symbols.names)
+        if base <= value < base + len(data) and is_listed_label(name)
+    ]
+    return asm_lines, labels
+
+
+def _reloc_targets(elf: ELFFile, reloc_section: Optional[RelocationSection]) -> Dict[int, str]:
+    targets: Dict[int, str] = {}
+    if reloc_section is None:
+        return targets
+    symtab = elf.get_section(reloc_section['sh_link'])
+    for reloc in reloc_section.iter_relocations():
+        if reloc['r_info_type'] not in TARGET_RELOC_TYPES:
+            continue
+        sym = symtab.get_symbol(reloc['r_info_sym'])
+        name = sym.name
+        if sym['st_info']['type'] == 'STT_SECTION':
+            name = elf.get_section(sym['st_shndx']).name
+        addend: int = reloc['r_addend']
+        if addend > 0:
+            name += f'+0x{addend:x}'
+        elif addend < 0:
+            name += f'-0x{-addend:x}'
+        targets[reloc['r_offset']] = name
+    return targets
+
+
+def object_functions(stream: BinaryIO) -> Dict[str, Function]:
+    """
+    Disassemble the functions of a ``-ffunction-sections`` relocatable object, without going through objdump.
+    """
+    elf = ELFFile(stream)
+    symtab = elf.get_section_by_name('.symtab')
+    section_symbols: Dict[int, List[Symbol]] = defaultdict(list)
+    for sym in symtab.iter_symbols():
+        if isinstance(sym['st_shndx'], int) and _is_listed_symbol(sym):
+            section_symbols[sym['st_shndx']].append(sym)
+    reloc_sections: Dict[int, RelocationSection] = {
+        section['sh_info']: section for section in elf.iter_sections() if isinstance(section, RelocationSection)
+    }
+    funcs: Dict[str, Function] = {}
+    for idx, section in enumerate(elf.iter_sections()):
+        if not section.name.startswith('.') or not is_function_section(section.name[1:]):
+            continue
+        symbols = _SymbolTable(section_symbols[idx])
+        asm_lines, labels = disassemble(
+            section.data(), 0, symbols, _reloc_targets(elf, reloc_sections.get(idx)))
+        name = symbols.names[0] if symbols.values and symbols.values[0] == 0 else '_unknown'
+        if name[0] == '.':
+            name = '_unknown'
+        funcs[name] = Function(name, asm_lines, labels)
+    return funcs
+
+
+def linked_functions(stream: BinaryIO) -> List[Function]:
+    """
+    Disassemble every sized function symbol of a linked ELF. Instruction offsets are absolute addresses.
+    """
+    elf = ELFFile(stream)
+    symtab = elf.get_section_by_name('.symtab')
+    funcs_syms: List[Symbol] = []
+    section_symbols: Dict[int, List[Symbol]] = defaultdict(list)
+    for sym in symtab.iter_symbols():
+        if not isinstance(sym['st_shndx'], int) or not _is_listed_symbol(sym):
+            continue
+        section_symbols[sym['st_shndx']].append(sym)
+        if sym['st_info']['type'] == 'STT_FUNC' and sym['st_size'] > 0:
+            funcs_syms.append(sym)
+    funcs: List[Function] = []
+    section_data: Dict[int, bytes] = {}
+    section_tables: Dict[int, _SymbolTable] = {}
+    for sym in sorted(funcs_syms, key=lambda s: s['st_value']):
+        shndx: int = sym['st_shndx']
+        section = elf.get_section(shndx)
+        if section['sh_type'] != 'SHT_PROGBITS':
+            continue
+        if shndx not in section_data:
+            section_data[shndx] = section.data()
+            section_tables[shndx] = _SymbolTable(section_symbols[shndx])
+        start = sym['st_value'] - section['sh_addr']
+        asm_lines, labels = disassemble(
+            section_data[shndx][start:start + sym['st_size']], sym['st_value'], section_tables[shndx], {})
+        funcs.append(Function(sym.name, asm_lines, labels))
+    return funcs
@@ -0,0 +1,164 @@
+import hashlib
+import pickle
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional, List
+
+from odiff.ar import open_object, object_file, hash_object, stat_object, split_member_path
+from odiff.asm import Function, parse_objdump
+from odiff.paths import CACHE_DIR
+from odiff.toolchain import find_toolchain, objdump, objdump_version
+from odiff.utils import atomic_write
+
+# Bump when the layout of Function & co. changes, so that stale pickles are not loaded
+FORMAT_VERSION = 2
+DISASSEMBLERS = ('objdump', 'native')
+# Objects per objdump run when disassembling many at once, which keeps command lines short
+OBJDUMP_BATCH_SIZE = 100
+# Header objdump prints before the listing of each file (or archive member)
+OBJDUMP_FILE_RE = re.compile(r'^(\S.*):\s+file format \S+$', re.MULTILINE)
+
+
+def load_functions(obj_path: Path, disassembler: str = 'objdump') -> Dict[str, Function]:
+    """
+    :param obj_path: Object file, or archive member (see odiff.ar)
+    :param disassembler: ``objdump`` parses the output of the toolchain's objdump, ``native`` decodes the ELF in-process
+    """
+    if disassembler == 'native':
+        # Imported here, as pyelftools takes a while to import and the objdump path doesn't need it
+        from odiff.elfasm import object_functions
+        with open_object(obj_path) as f:
+            return object_functions(f)
+    if disassembler != 'objdump':
+        raise ValueError(f'Unknown disassembler {disassembler}')
+    with object_file(obj_path) as path:
+        return parse_objdump(objdump('-rd', path, capture_output=True).stdout.decode())
+
+
+def split_objdump(text: str) -> Dict[str, str]:
+    """
+    Split the output of objdump over several files, or the members of an archive.
+
+    :returns: Listing of each file, by name as objdump printed it (i.e. as passed, or the member name)
+    """
+    parts = OBJDUMP_FILE_RE.split(text)
+    return dict(zip(parts[1::2], parts[2::2]))
+
+
+def load_objects_functions(obj_paths: List[Path], disassembler: str = 'objdump') -> Dict[Path, Dict[str, Function]]:
+    """
+    Like load_functions for several objects. With objdump, they're disassembled by a single run per archive or per
+    batch of object files, as process startup otherwise dominates for small objects.
+    """
+    if disassembler != 'objdump':
+        return {obj_path: load_functions(obj_path, disassembler) for obj_path in obj_paths}
+    funcs: Dict[Path, Dict[str, Function]] = {}
+    archive_members: Dict[Path, List[Path]] = defaultdict(list)
+    files: List[Path] = []
+    for obj_path in obj_paths:
+        member = split_member_path(obj_path)
+        if member is not None:
+            archive_members[member[0]].append(obj_path)
+        else:
+            files.append(obj_path)
+    for archive_path, members in archive_members.items():
+        listings = split_objdump(objdump('-rd', archive_path, capture_output=True).stdout.decode())
+        for obj_path in members:
+            funcs[obj_path] = parse_objdump(listings[obj_path.name])
+    for start in range(0, len(files), OBJDUMP_BATCH_SIZE):
+        batch = files[start:start + OBJDUMP_BATCH_SIZE]
+        listings = split_objdump(objdump('-rd', *batch, capture_output=True).stdout.decode())
+        for obj_path in batch:
+            funcs[obj_path] = parse_objdump(listings[str(obj_path)])
+    return funcs
+
+
+class FunctionCache:
+    """
+    On-disk index of the functions parsed out of objects that rarely change, i.e. the vendor ones.
+
+    An entry is reused as long as the object's mtime and size are unchanged; otherwise the object is rehashed and the
+    entry is only thrown away if its content changed.
+    """
+
+    def __init__(self, root: Optional[Path] = CACHE_DIR / 'funcs', disassembler: str = 'objdump',
+                 keep_loaded: bool = False):
+        """
+        :param root: Directory of the index, None to only keep functions in memory (along with ``keep_loaded``)
+        :param keep_loaded: Keep the functions of objects in memory once loaded, for long-running processes. Vendor
+                            objects are assumed not to change meanwhile
+        """
+        self.root = root
+        self.disassembler = disassembler
+        self._loaded: Optional[Dict[Path, Dict[str, Function]]] = {} if keep_loaded else None
+
+    def _entry_path(self, obj_path: Path) -> Path:
+        disassembler = self.disassembler
+        if disassembler == 'objdump':
+            # Listings change with binutils versions, and objdump's banner doesn't name the target it was built for
+            disassembler = f'{find_toolchain().objdump}\0{objdump_version()}'
+        key = hashlib.sha256(f'{FORMAT_VERSION}\0{disassembler}\0{obj_path.resolve()}'.encode()).hexdigest()
+        return self.root / f'{key}.pickle'
+
+    def _load_entry(self, entry_path: Path) -> Optional[dict]:
+        try:
+            with open(entry_path, 'rb') as f:
+                return pickle.load(f)
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _save_entry(self, entry_path: Path, entry: dict):
+        atomic_write(entry_path, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _lookup(self, obj_path: Path) -> Optional[Dict[str, Function]]:
+        """
+        :returns: Cached functions of the object, or None if they need to be loaded
+        """
+        if self.root is None:
+            return None
+        entry_path = self._entry_path(obj_path)
+        entry = self._load_entry(entry_path)
+        if entry is None:
+            return None
+        mtime_ns, size = stat_object(obj_path)
+        if entry['mtime_ns'] == mtime_ns and entry['size'] == size:
+            return entry['funcs']
+        if entry['hash'] != hash_object(obj_path):
+            return None
+        # Touched, but unchanged
+        entry['mtime_ns'] = mtime_ns
+        entry['size'] = size
+        self._save_entry(entry_path, entry)
+        return entry['funcs']
+
+    def _store(self, obj_path: Path, funcs: Dict[str, Function]) -> Dict[str, Function]:
+        # Fingerprints are pickled along, so that they're computed once per vendor object
+        for func in funcs.values():
+            func.fingerprint()
+            func.fingerprint(abstract_registers=True)
+        if self.root is None:
+            return funcs
+        mtime_ns, size = stat_object(obj_path)
+        self._save_entry(self._entry_path(obj_path), {
+            'hash': hash_object(obj_path), 'funcs': funcs, 'mtime_ns': mtime_ns, 'size': size
+        })
+        return funcs
+
+    def get(self, obj_path: Path) -> Dict[str, Function]:
+        if self._loaded is not None and obj_path in self._loaded:
+            return self._loaded[obj_path]
+        funcs = self._lookup(obj_path)
+        if funcs is None:
+            funcs = self._store(obj_path, load_functions(obj_path, self.disassembler))
+        if self._loaded is not None:
+            self._loaded[obj_path] = funcs
+        return funcs
+
+    def prefetch(self, obj_paths: List[Path]):
+        """
+        Bring the entries of ``obj_paths`` up to date, loading the functions of the stale ones all at once.
+        """
+        stale = [obj_path for obj_path in obj_paths if self._lookup(obj_path) is None]
+        for obj_path, funcs in load_objects_functions(stale, self.disassembler).items():
+            self._store(obj_path, funcs)
@@ -0,0 +1,203 @@
+import os
+import pickle
+import re
+from bisect import bisect_right
+from collections import namedtuple
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, List, Dict
+
+from odiff.linkmap import MapIndex
+from odiff.paths import CACHE_DIR
+from odiff.utils import atomic_write
+
+# Bump when the parsing or the layout of index files changes
+FORMAT_VERSION = 1
+# Functions of a listing start with their signature, as a comment at this indentation
+LISTING_FUNCTION_PREFIX = '                            ;'
+LISTING_ADDRESS_RE = re.compile(r'^([0-9a-f]{8}) ')
+# Name of the function in a signature, e.g. ``undefined4 * mm_env_init(int param_1)``
+FUNCTION_NAME_RE = re.compile(r'([A-Za-z_][\w.$]*)\(')
+# Functions Ghidra named itself, after their address
+DEFAULT_NAME_RE = re.compile(r'^FUN_([0-9a-f]{8})$')
+
+# Function of a listing. Its lines follow the signature one, up to the next function; addresses are those of its
+# first and last instructions, or None if it has none
+ListingFunction = namedtuple('ListingFunction', 'signature name first_line lines start_address last_address')
+# Function of a decompiled (pseudo-C) export, from its signature line to its closing brace
+DecompiledFunction = namedtuple('DecompiledFunction', 'signature name first_line lines')
+# Function of an indexed export: line span (first line 1-based, end exclusive), byte span and address range (start
+# address and the address of the last instruction, or None where unknown)
+IndexedFunction = namedtuple('IndexedFunction', 'name first_line end_line offset length start_address last_address')
+
+
+def function_name(signature: str) -> Optional[str]:
+    match = FUNCTION_NAME_RE.search(signature)
+    return match.group(1) if match else None
+
+
+def iter_listing(lines: Iterable[str]) -> Iterator[ListingFunction]:
+    """
+    Parse a listing exported by Ghidra, one function at a time. Lines before the first function are skipped.
+    """
+    signature: Optional[str] = None
+    first_line = 0
+    func_lines: List[str] = []
+    start_address: Optional[int] = None
+    last_address: Optional[int] = None
+    for line_no, line in enumerate(lines, 1):
+        if line.startswith(LISTING_FUNCTION_PREFIX):
+            if signature is not None:
+                yield ListingFunction(
+                    signature, function_name(signature), first_line, func_lines, start_address, last_address)
+            signature = line[len(LISTING_FUNCTION_PREFIX):].rstrip()
+            first_line = line_no
+            func_lines = []
+            start_address = last_address = None
+            continue
+        if signature is None:
+            continue
+        func_lines.append(line)
+        if (match := LISTING_ADDRESS_RE.match(line)) is not None:
+            last_address = int(match.group(1), 16)
+            if start_address is None:
+                start_address = last_address
+    if signature is not None:
+        yield ListingFunction(signature, function_name(signature), first_line, func_lines, start_address, last_address)
+
+
+def _is_signature(line: str) -> bool:
+    return bool(line) and not line[0].isspace() and not line.startswith(('//', '#', 'typedef')) \
+        and line.rstrip().endswith(')') and '(' in line
+
+
+def iter_decompiled(lines: Iterable[str]) -> Iterator[DecompiledFunction]:
+    """
+    Parse a C export of Ghidra's decompiler, one function at a time: a signature line, then a body from ``{`` to ``}``
+    both in the first column. Declarations and everything outside of bodies are skipped.
+    """
+    signature: Optional[str] = None
+    signature_line = 0
+    between: List[str] = []
+    current: Optional[DecompiledFunction] = None
+    for line_no, line in enumerate(lines, 1):
+        if current is not None:
+            current.lines.append(line)
+            if line.rstrip() == '}':
+                yield current
+                current = None
+            continue
+        if signature is not None and line.rstrip() == '{':
+            current = DecompiledFunction(
+                signature.rstrip(), function_name(signature), signature_line, [signature, *between, line])
+            signature = None
+            continue
+        if _is_signature(line):
+            signature = line
+            signature_line = line_no
+            between = []
+        elif signature is not None:
+            # Only blank lines may separate a signature from its body
+            if line.strip():
+                signature = None
+            else:
+                between.append(line)
+
+
+class GhidraIndex:
+    """
+    On-disk index of the functions of a Ghidra export (listing or C), to look functions up by name or by address and
+    read them without parsing the whole export again.
+    """
+
+    def __init__(self, path: Path, functions: List[IndexedFunction]):
+        self.path = path
+        self.functions = functions
+        self.by_name: Dict[str, List[IndexedFunction]] = {}
+        for func in functions:
+            self.by_name.setdefault(func.name, []).append(func)
+        self._by_address = sorted(
+            (f for f in functions if f.start_address is not None), key=lambda f: f.start_address)
+        self._starts = [f.start_address for f in self._by_address]
+
+    @classmethod
+    def build(cls, path: Path, symbols: Optional[MapIndex] = None) -> 'GhidraIndex':
+        """
+        :param symbols: To find the addresses of decompiled functions that Ghidra didn't name after their address
+        """
+        # Byte offset of each line, recorded as the parser streams through the export
+        offsets = [0]
+
+        def tracked_lines(f) -> Iterator[str]:
+            for line in f:
+                offsets.append(offsets[-1] + len(line.encode()))
+                yield line
+
+        with open(path, 'r', newline='') as f:
+            if path.suffix == '.c':
+                functions = [
+                    cls._decompiled_entry(func, offsets, symbols) for func in iter_decompiled(tracked_lines(f))]
+            else:
+                functions = [cls._listing_entry(func, offsets) for func in iter_listing(tracked_lines(f))]
+        return cls(path, functions)
+
+    @staticmethod
+    def _decompiled_entry(func: DecompiledFunction, offsets: List[int],
+                          symbols: Optional[MapIndex]) -> IndexedFunction:
+        start_address = last_address = None
+        if func.name is not None and (match := DEFAULT_NAME_RE.match(func.name)) is not None:
+            start_address = last_address = int(match.group(1), 16)
+        elif func.name is not None and symbols is not None and (syms := symbols.lookup(func.name)):
+            start_address = syms[0].address
+            last_address = syms[0].address + max(syms[0].size, 1) - 1
+        end_line = func.first_line + len(func.lines)
+        start, end = offsets[func.first_line - 1], offsets[end_line - 1]
+        return IndexedFunction(func.name, func.first_line, end_line, start, end - start, start_address, last_address)
+
+    @staticmethod
+    def _listing_entry(func: ListingFunction, offsets: List[int]) -> IndexedFunction:
+        # The signature line comes before the function's lines
+        end_line = func.first_line + 1 + len(func.lines)
+        start, end = offsets[func.first_line - 1], offsets[end_line - 1]
+        return IndexedFunction(
+            func.name, func.first_line, end_line, start, end - start, func.start_address, func.last_address)
+
+    @classmethod
+    def load(cls, path: Path, symbols: Optional[MapIndex] = None,
+             root: Path = CACHE_DIR / 'ghidra') -> 'GhidraIndex':
+        """
+        Load the index of the export at ``path``, building (and storing) it again if the export changed.
+        """
+        st = os.stat(path)
+        index_path = root / f'{path.name}.pickle'
+        try:
+            with open(index_path, 'rb') as f:
+                version, mtime_ns, size, functions = pickle.load(f)
+            if version == FORMAT_VERSION and mtime_ns == st.st_mtime_ns and size == st.st_size:
+                return cls(path, functions)
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError, ValueError):
+            pass
+        index = cls.build(path, symbols)
+        atomic_write(index_path, pickle.dumps(
+            (FORMAT_VERSION, st.st_mtime_ns, st.st_size, index.functions), protocol=pickle.HIGHEST_PROTOCOL))
+        return index
+
+    def lookup(self, name: str) -> List[IndexedFunction]:
+        return self.by_name.get(name, [])
+
+    def function_at(self, address: int) -> Optional[IndexedFunction]:
+        """
+        :returns: The function whose address range contains ``address``
+        """
+        idx = bisect_right(self._starts, address) - 1
+        if idx < 0:
+            return None
+        func = self._by_address[idx]
+        return func if address <= func.last_address else None
+
+    def read(self, func: IndexedFunction) -> str:
+        """
+        :returns: Text of an indexed function, read straight from its offset in the export
+        """
+        with open(self.path, 'rb') as f:
+            f.seek(func.offset)
+            return f.read(func.length).decode()
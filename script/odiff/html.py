@@ -1,7 +1,9 @@
 import difflib
 from html import escape
 from io import StringIO
-from typing import TypeVar, List, Union, Callable, Tuple
+from typing import TypeVar, List, Union, Callable, Tuple, Optional, Iterable, Sequence, Any
+
+from odiff.diff import diff_sequences, DEFAULT_MAX_COST
 
 HTML_HEADER = '''<!DOCTYPE html>
 <html>
@@ -40,29 +42,107 @@ h1::before, h2::before, h3::before { font-family: serif; font-weight: normal; ma
 .func.different { background: rgba(255, 0, 0, 0.1); }
 .func.missing h3::before { background: rgb(255, 0, 0); }
 .func.equivalent, .obj.equivalent { background: rgba(0, 255, 0, 0.1); }
+.func.regalloc { background: rgba(255, 255, 0, 0.1); }
+.func.regalloc h3::after { content: ' (equivalent modulo register allocation)'; font-style: italic; }
 .func.missing h3::before { background: rgb(255, 0, 0); }
 summary { cursor: pointer; }
 details[open] summary { margin-bottom: .3em; }
 .buildtime, .similarity { display: inline-block; float: right; }
+table.sortable { border-collapse: collapse; margin: .3em 0; }
+table.sortable th, table.sortable td { border: .1em solid #ccc; padding: .1em .4em; }
+table.sortable th { cursor: pointer; background-color: #e0e0e0; }
+table.sortable td.num { text-align: right; }
+table.sortable td.larger { background: rgba(255, 0, 0, 0.1); }
+table.sortable td.smaller { background: rgba(0, 255, 0, 0.1); }
 </style>
 </head>
 <body>
 '''
 
 HTML_FOOTER = '''<script>
-let unroll = document.getElementById(window.location.hash.substring(1));
-while (unroll) {
-    if (unroll.tagName === 'DETAILS') {
-        unroll.open = true;
+// Objects of lazy reports only have their summary inline, their contents are in a script calling funcdiffFragment()
+const fragmentCallbacks = {};
+function loadFragment(details, callback) {
+    const fragment = details.dataset.fragment;
+    if (details.dataset.loaded) {
+        callback();
+        return;
+    }
+    if (!(fragment in fragmentCallbacks)) {
+        fragmentCallbacks[fragment] = [];
+        const script = document.createElement('script');
+        script.src = fragment;
+        document.head.appendChild(script);
+    }
+    fragmentCallbacks[fragment].push(callback);
+}
+function funcdiffFragment(fragment, html) {
+    const details = document.querySelector(`details[data-fragment="${CSS.escape(fragment)}"]`);
+    details.insertAdjacentHTML('beforeend', html);
+    details.dataset.loaded = 'true';
+    fragmentCallbacks[fragment].forEach(callback => callback());
+}
+document.addEventListener('toggle', e => {
+    if (e.target.open && e.target.dataset.fragment) {
+        loadFragment(e.target, () => {});
+    }
+}, true);
+
+function unrollTo(id) {
+    let unroll = document.getElementById(id);
+    if (!unroll) {
+        // The function may be in an object that isn't loaded yet: func_<library>_<object>_<function>
+        const obj = id.match(/^func_(.+?\\.o)_/);
+        const details = obj && document.getElementById('obj_' + obj[1]);
+        if (details && details.dataset.fragment && !details.dataset.loaded) {
+            loadFragment(details, () => unrollTo(id));
+        }
+        return;
     }
-    unroll = unroll.parentElement;
+    const target = unroll;
+    while (unroll) {
+        if (unroll.tagName === 'DETAILS') {
+            unroll.open = true;
+        }
+        unroll = unroll.parentElement;
+    }
+    target.scrollIntoView();
 }
+unrollTo(window.location.hash.substring(1));
+
+// Clicking a column header sorts the rows by it, numerically where possible; clicking it again reverses the order
+document.addEventListener('click', e => {
+    const th = e.target.closest('table.sortable th');
+    if (!th) {
+        return;
+    }
+    const tbody = th.closest('table').tBodies[0];
+    const column = th.cellIndex;
+    const descending = th.dataset.order !== 'descending';
+    th.parentElement.querySelectorAll('th').forEach(x => delete x.dataset.order);
+    th.dataset.order = descending ? 'descending' : 'ascending';
+    const key = row => {
+        const text = row.cells[column].textContent;
+        return text === '' ? null : isNaN(text) ? text : Number(text);
+    };
+    const rows = Array.from(tbody.rows).sort((a, b) => {
+        const x = key(a), y = key(b);
+        // Empty cells go last either way
+        if (x === null || y === null) {
+            return (x === null) - (y === null);
+        }
+        const order = typeof x === typeof y ? (x < y ? -1 : x > y ? 1 : 0) : (typeof x === 'number' ? -1 : 1);
+        return descending ? -order : order;
+    });
+    tbody.append(...rows);
+});
 setTimeout(() => {
-    document.querySelectorAll('details').forEach(x => x.addEventListener("toggle", () => {
-        if (x.hasAttribute("open")) {
+    document.addEventListener('toggle', e => {
+        const x = e.target;
+        if (x.tagName === 'DETAILS' && x.hasAttribute("open")) {
             history.replaceState({}, 'funcdiff: ' + x.id, '#' + x.id);
         }
-    }));
+    }, true);
 }, 100);
 </script>
 </body>
@@ -72,14 +152,51 @@ T = TypeVar('T')
 U = TypeVar('U')
 
 
+def make_sortable_table(columns: Sequence[str], rows: Iterable[Sequence[Any]],
+                        delta_columns: Sequence[str] = ()) -> str:
+    """
+    Table whose rows can be sorted by clicking on a column header. None values are left empty.
+
+    :param delta_columns: Columns of differences, highlighted when positive (larger) or negative (smaller)
+    """
+    html = StringIO()
+    html.write('<table class="sortable"><thead><tr>')
+    html.write(''.join(f'<th>{escape(c)}</th>' for c in columns))
+    html.write('</tr></thead><tbody>\n')
+    deltas = [c in delta_columns for c in columns]
+    for row in rows:
+        html.write('<tr>')
+        for value, is_delta in zip(row, deltas):
+            classes = []
+            if isinstance(value, (int, float)):
+                classes.append('num')
+                if is_delta and value != 0:
+                    classes.append('larger' if value > 0 else 'smaller')
+            class_attr = f' class="{" ".join(classes)}"' if classes else ''
+            html.write(f'<td{class_attr}>{escape(str(value)) if value is not None else ""}</td>')
+        html.write('</tr>\n')
+    html.write('</tbody></table>')
+    return html.getvalue()
+
+
 def make_diff_table(original_a: List[T], original_b: List[T], diffkey_a: List[U], diffkey_b: List[U],
                     get_offset: Callable[[T], str], get_text: Callable[[T], str],
-                    ignore_diff: Callable[[T], bool] = lambda _: False) -> Tuple[str, float]:
-    matcher = difflib.SequenceMatcher(None, diffkey_a, diffkey_b)
+                    ignore_diff: Callable[[T], bool] = lambda _: False,
+                    block_start: Optional[Callable[[T], bool]] = None,
+                    max_cost: int = DEFAULT_MAX_COST) -> Tuple[str, float]:
+    """
+    :param block_start: Whether an item starts a block (e.g. a label), to align large inputs on if diffing them
+                        item by item costs more than ``max_cost`` edits
+    """
+    opcodes, similarity = diff_sequences(
+        diffkey_a, diffkey_b,
+        [block_start(x) for x in original_a] if block_start else None,
+        [block_start(x) for x in original_b] if block_start else None,
+        max_cost)
     diffed_a: List[Union[T, None]] = []
     diffed_b: List[Union[T, None]] = []
     chg_lines: List[bool] = []
-    for tag, alo, ahi, blo, bhi in matcher.get_opcodes():
+    for tag, alo, ahi, blo, bhi in opcodes:
         if tag == 'replace':
             diff_len = max(ahi - alo, bhi - blo)
             diffed_a += original_a[alo:ahi]
@@ -142,4 +259,4 @@ def make_diff_table(original_a: List[T], original_b: List[T], diffkey_a: List[U]
             line(ao, ad, bo, bd)
 
     table.write('</tbody></table>')
-    return table.getvalue(), matcher.ratio()
+    return table.getvalue(), similarity
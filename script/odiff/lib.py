@@ -1,40 +1,181 @@
+import hashlib
+import json
+import os
+import shutil
 import subprocess
 import time
 from fnmatch import fnmatch
 from pathlib import Path
-from typing import List, Tuple, Generator
+from tempfile import TemporaryDirectory
+from typing import List, Tuple, Generator, Optional, Dict, Any
 
-from odiff.paths import REPO_ROOT
-from odiff.toolchain import gcc
+from odiff.ar import open_archive
+from odiff.paths import REPO_ROOT, CACHE_DIR, BLOBS_DIR
+from odiff.toolchain import gcc, gcc_version
+from odiff.utils import hash_file, atomic_write
+
+
+def parse_depfile(text: str) -> List[str]:
+    """
+    Get the prerequisites listed in a Makefile-style dependency file, as written by ``gcc -MD``.
+    """
+    _, _, prerequisites = text.replace('\\\n', ' ').partition(': ')
+    return prerequisites.split()
+
+
+class ObjectCache:
+    """
+    Persistent, content-addressed store of built objects.
+
+    An object is keyed on its source, every header the source includes, the compiler arguments and the toolchain
+    version. The included headers are only known after building, so a manifest keyed on everything but the headers
+    records them (from the ``gcc -MD`` depfile) along with their hashes and the resulting object key.
+    """
+
+    def __init__(self, root: Path = CACHE_DIR / 'obj'):
+        self.root = root
+        self._file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+    def _hash_file(self, path: str) -> Optional[str]:
+        # Headers are shared by most objects, don't rehash them for each one
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stat_key = (path, st.st_mtime_ns, st.st_size)
+        try:
+            return self._file_hashes[stat_key]
+        except KeyError:
+            file_hash = hash_file(Path(path))
+            self._file_hashes[stat_key] = file_hash
+            return file_hash
+
+    def _manifest_path(self, source_path: Path, args: List[str]) -> Path:
+        # The working directory ends up in DW_AT_comp_dir, so it is part of the key
+        h = hashlib.sha256()
+        for part in (gcc_version(), os.getcwd(), str(source_path), self._hash_file(str(source_path)), *args):
+            h.update(part.encode())
+            h.update(b'\0')
+        key = h.hexdigest()
+        return self.root / 'manifests' / key[:2] / f'{key}.json'
+
+    def _object_path(self, key: str) -> Path:
+        return self.root / 'objects' / key[:2] / f'{key}.o'
+
+    def lookup(self, source_path: Path, args: List[str]) -> Optional[str]:
+        """
+        Find the key of a cached object built from ``source_path`` with compiler arguments ``args``.
+
+        :returns: Object key, or None if the object needs to be (re)built
+        """
+        try:
+            manifest: Dict[str, Any] = json.loads(self._manifest_path(source_path, args).read_text())
+        except FileNotFoundError:
+            return None
+        if any(self._hash_file(dep) != dep_hash for dep, dep_hash in manifest['deps'].items()):
+            return None
+        key: str = manifest['key']
+        if not self._object_path(key).is_file():
+            return None
+        return key
+
+    def get(self, key: str, outobj_path: Path) -> Tuple[float, bytes]:
+        """
+        Copy the cached object ``key`` to ``outobj_path``.
+
+        :returns: Tuple of (original build time, compiler stderr output)
+        """
+        object_path = self._object_path(key)
+        meta: Dict[str, Any] = json.loads(object_path.with_suffix('.json').read_text())
+        shutil.copyfile(object_path, outobj_path)
+        return meta['buildtime'], meta['stderr'].encode()
+
+    def put(self, source_path: Path, args: List[str], depfile_path: Path, outobj_path: Path, buildtime: float,
+            stderr: bytes) -> str:
+        """
+        Store a freshly built object along with the headers it depends on.
+
+        :returns: Object key
+        """
+        deps = {
+            dep: self._hash_file(dep)
+            for dep in parse_depfile(depfile_path.read_text())
+            if dep != str(source_path)
+        }
+        manifest_path = self._manifest_path(source_path, args)
+        h = hashlib.sha256(manifest_path.stem.encode())
+        for dep, dep_hash in sorted(deps.items()):
+            h.update(f'\0{dep}\0{dep_hash}'.encode())
+        key = h.hexdigest()
+        object_path = self._object_path(key)
+        atomic_write(object_path, outobj_path.read_bytes())
+        atomic_write(object_path.with_suffix('.json'),
+                     json.dumps({'buildtime': buildtime, 'stderr': stderr.decode()}).encode())
+        atomic_write(manifest_path, json.dumps({'key': key, 'deps': deps}).encode())
+        return key
 
 
 class Library:
-    def __init__(self, name: str, source_dirs: List[Path], vendorobj_dir: Path, include_dirs: List[Path]):
+    def __init__(self, name: str, source_dirs: List[Path], vendorobj_dir: Path, include_dirs: List[Path],
+                 archive_path: Optional[Path] = None):
+        """
+        :param vendorobj_dir: Directory the vendor objects were extracted to
+        :param archive_path: Vendor archive, ``blobs/<name>.a`` by default
+        """
         self.name = name
         self.source_dirs = source_dirs
         self.vendorobj_dir = vendorobj_dir
-        self.vendorobj_paths: List[Path] = [*vendorobj_dir.glob('*.o')]
+        self.vendorobj_paths: List[Path] = sorted(vendorobj_dir.glob('*.o'))
         self.include_dirs = include_dirs
+        self.archive_path = archive_path or BLOBS_DIR / f'{name}.a'
 
-    def build_obj(self, build_dir: Path, vendorobj_path: Path, cflags: List[str]) -> \
-            Tuple[float, subprocess.CompletedProcess[bytes], Path]:
+    def use_archive(self):
         """
-        Build (reverse-engineered) object file from the corresponding vendor path passed in ``vendorobj_path``.
+        Read vendor objects straight from the library's archive rather than from the directory they were extracted to.
+        Their paths are then within the archive, e.g. ``blobs/libatcmd.a/at_server.o``; see odiff.ar.
+        """
+        self.vendorobj_paths = [
+            self.archive_path / name for name in open_archive(self.archive_path).names() if name.endswith('.o')
+        ]
 
-        :returns: Tuple of (elapsed time, subprocess result, output object file path)
+    def source_path(self, vendorobj_path: Path) -> Path:
+        """
+        Get the path of the reverse-engineered source corresponding to the vendor object ``vendorobj_path``.
         """
-        source_path = None
         for source_dir in self.source_dirs:
             if (source_path := source_dir / f'{vendorobj_path.stem}.c').is_file():
-                break
-        if not source_path or not source_path.is_file():
-            raise FileNotFoundError(f"Source file {vendorobj_path.stem}.c for lib {self.name} not found")
-        print(f"Building {self.name}/{source_path.name}")
+                return source_path
+        raise FileNotFoundError(f"Source file {vendorobj_path.stem}.c for lib {self.name} not found")
+
+    def build_args(self, cflags: List[str]) -> List[str]:
+        return [*cflags, *(f'-I{i}' for i in self.include_dirs)]
+
+    def build_obj(self, build_dir: Path, vendorobj_path: Path, cflags: List[str],
+                  cache: Optional[ObjectCache] = None) -> Tuple[float, subprocess.CompletedProcess[bytes], Path]:
+        """
+        Build (reverse-engineered) object file from the corresponding vendor path passed in ``vendorobj_path``.
+
+        If a ``cache`` is passed and holds an up-to-date build of the object, it is reused instead of invoking the
+        compiler; the elapsed time is then the one of the original build.
+
+        :returns: Tuple of (elapsed time, subprocess result, output object file path)
+        """
+        source_path = self.source_path(vendorobj_path)
         outobj_path = build_dir / vendorobj_path.name
-        start = time.time()
-        result = gcc(*cflags, *(f'-I{i}' for i in self.include_dirs), '-c', '-o', outobj_path,
-                     source_path, check=False, capture_output=True)
-        end = time.time()
+        args = self.build_args(cflags)
+        if cache is not None and (key := cache.lookup(source_path, args)) is not None:
+            print(f"Using cached {self.name}/{source_path.name}")
+            buildtime, stderr = cache.get(key, outobj_path)
+            return buildtime, subprocess.CompletedProcess(args, 0, b'', stderr), outobj_path
+        print(f"Building {self.name}/{source_path.name}")
+        with TemporaryDirectory(prefix='odiff-dep') as depdir:
+            depfile_path = Path(depdir) / f'{vendorobj_path.stem}.d'
+            dep_args = ['-MD', '-MF', depfile_path] if cache is not None else []
+            start = time.time()
+            result = gcc(*args, *dep_args, '-c', '-o', outobj_path, source_path, check=False, capture_output=True)
+            end = time.time()
+            if cache is not None and result.returncode == 0:
+                cache.put(source_path, args, depfile_path, outobj_path, end - start, result.stderr)
         return end - start, result, outobj_path
 
     def get_vendorobj_paths(self, patterns: List[str]) -> Generator[Path, None, None]:
@@ -0,0 +1,210 @@
+import os
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from pathlib import Path
+from struct import Struct
+from typing import List, Optional, Dict, Tuple, Iterable
+
+from odiff.paths import CACHE_DIR
+from odiff.utils import atomic_write
+
+MAGIC = b'ODIFFMAP'
+# Bump when the parsing or the layout of index files changes
+FORMAT_VERSION = 2
+# Magic, version, mtime (ns) and size of the parsed map, count of symbols and size of the string table
+HEADER_STRUCT = Struct('<8sIqqII')
+# Address, size, and indices of the name, input section and object in the string table
+RECORD_FIELDS = 5
+
+MEMORY_MAP_START = 'Linker script and memory map'
+# Output (column 0) or input (column 1) section, possibly with its address and size on the next line
+SECTION_RE = re.compile(r'^( ?)([.\w][^\s*]*)(?:\s+0x([0-9a-f]+)\s+0x([0-9a-f]+)(?:\s+(\S.*))?)?$')
+SECTION_CONTINUATION_RE = re.compile(r'^\s+0x([0-9a-f]+)\s+0x([0-9a-f]+)(?:\s+(\S.*))?$')
+SYMBOL_RE = re.compile(r'^\s+0x([0-9a-f]+)\s+([^\s=()]+)$')
+# Sections of -ffunction-sections/-fdata-sections objects are named after the (possibly static) symbol they hold
+SECTION_SYMBOL_RE = re.compile(r'^\.[a-z_]+\.(?!str\d|cst\d)(.+)$')
+
+MapSymbol = namedtuple('MapSymbol', 'address size name section object')
+
+
+def _object_name(path: str) -> str:
+    """
+    :returns: e.g. ``libbl602_wifi.a(mm.o)`` for ``/.../lib/libbl602_wifi.a(mm.o)``
+    """
+    return os.path.basename(path.split('(', 1)[0]) + (f'({path.split("(", 1)[1]}' if '(' in path else '')
+
+
+def _input_section_symbols(section: str, address: int, size: int, obj: str,
+                           symbols: List[Tuple[int, str]]) -> List[MapSymbol]:
+    end = address + size
+    result: List[MapSymbol] = []
+    if not symbols or symbols[0][0] > address:
+        # Static symbols aren't listed, but usually have a section of their own. Otherwise, they're named after the
+        # section and the object (or archive member), e.g. ``libc_a-strstr.o:.text``
+        match = SECTION_SYMBOL_RE.match(section)
+        member = obj[obj.index('(') + 1:-1] if obj.endswith(')') and '(' in obj else obj
+        result.append(MapSymbol(
+            address, (symbols[0][0] if symbols else end) - address, match.group(1) if match else f'{member}:{section}',
+            section, obj))
+    for idx, (addr, name) in enumerate(symbols):
+        # Symbols extend to the next one (past aliases), or to the end of the section
+        next_addr = next((a for a, _ in symbols[idx + 1:] if a > addr), end)
+        result.append(MapSymbol(addr, max(next_addr - addr, 0), name, section, obj))
+    return result
+
+
+def parse_map(text: str) -> List[MapSymbol]:
+    """
+    Parse the symbols placed by a GNU ld ``-Map`` file, along with the input section and the object (or archive
+    member) they come from. Sections that aren't loaded (debug info, ``.comment``...) are left out.
+
+    :returns: Symbols sorted by address
+    """
+    symbols: List[MapSymbol] = []
+    lines = text[text.index(MEMORY_MAP_START):].splitlines()
+    current: Optional[Tuple[str, int, int, str]] = None
+    current_symbols: List[Tuple[int, str]] = []
+
+    def flush():
+        if current is not None and current[1] != 0 and current[2] != 0:
+            symbols.extend(_input_section_symbols(*current, sorted(current_symbols)))
+        current_symbols.clear()
+
+    idx = 0
+    while idx < len(lines):
+        line = lines[idx]
+        idx += 1
+        if (match := SYMBOL_RE.match(line)) is not None:
+            if current is not None:
+                current_symbols.append((int(match.group(1), 16), match.group(2)))
+            continue
+        if (match := SECTION_RE.match(line)) is None:
+            continue
+        indent, name, address, size, obj = match.groups()
+        if address is None and idx < len(lines) and (cont := SECTION_CONTINUATION_RE.match(lines[idx])) is not None:
+            address, size, obj = cont.groups()
+            idx += 1
+        flush()
+        current = None
+        if indent and address is not None and obj is not None:
+            current = (name, int(address, 16), int(size, 16), _object_name(obj))
+    flush()
+    # Zero-sized symbols first, so that a bisection lands on the sized one at the same address
+    symbols.sort(key=lambda s: (s.address, s.size != 0))
+    return symbols
+
+
+class MapIndex:
+    """
+    Symbols of a linker map, sorted by address and by name so that lookups are bisections. Indexes are stored in a
+    compact binary form (a string table and fixed-size records), which loads much faster than the map parses.
+    """
+
+    def __init__(self, strings: List[str], records: array, by_name: array):
+        self._strings = strings
+        self._records = records
+        self._by_name = by_name
+        self._addresses = records[0::RECORD_FIELDS]
+        self._names = [strings[records[i * RECORD_FIELDS + 2]] for i in by_name]
+
+    @classmethod
+    def from_symbols(cls, symbols: Iterable[MapSymbol]) -> 'MapIndex':
+        string_ids: Dict[str, int] = {}
+        records = array('I')
+        for sym in symbols:
+            records.extend((sym.address, sym.size, *(
+                string_ids.setdefault(s, len(string_ids)) for s in (sym.name, sym.section, sym.object))))
+        strings = list(string_ids)
+        count = len(records) // RECORD_FIELDS
+        by_name = array('I', sorted(range(count), key=lambda i: strings[records[i * RECORD_FIELDS + 2]]))
+        return cls(strings, records, by_name)
+
+    def to_bytes(self, mtime_ns: int, size: int) -> bytes:
+        string_table = '\0'.join(self._strings).encode()
+        return HEADER_STRUCT.pack(MAGIC, FORMAT_VERSION, mtime_ns, size, len(self), len(string_table)) + \
+            self._records.tobytes() + self._by_name.tobytes() + string_table
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Tuple[int, int, 'MapIndex']:
+        """
+        :returns: mtime (ns) and size of the map the index was built from, and the index
+        :raises ValueError: If ``data`` isn't an index in the current format
+        """
+        if len(data) < HEADER_STRUCT.size:
+            raise ValueError("Truncated map index")
+        magic, version, mtime_ns, size, count, strings_size = HEADER_STRUCT.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Not a map index, or in an older format")
+        item_size = array('I').itemsize
+        records_end = HEADER_STRUCT.size + count * RECORD_FIELDS * item_size
+        by_name_end = records_end + count * item_size
+        if len(data) != by_name_end + strings_size:
+            raise ValueError("Truncated map index")
+        records = array('I', data[HEADER_STRUCT.size:records_end])
+        by_name = array('I', data[records_end:by_name_end])
+        strings = data[by_name_end:].decode().split('\0')
+        return mtime_ns, size, cls(strings, records, by_name)
+
+    @classmethod
+    def load(cls, map_path: Path, root: Path = CACHE_DIR / 'maps') -> 'MapIndex':
+        """
+        Load the index of ``map_path``, parsing the map (and storing its index) again if it changed.
+        """
+        st = os.stat(map_path)
+        index_path = root / f'{map_path.name}.idx'
+        try:
+            mtime_ns, size, index = cls.from_bytes(index_path.read_bytes())
+            if mtime_ns == st.st_mtime_ns and size == st.st_size:
+                return index
+        except (FileNotFoundError, ValueError):
+            pass
+        index = cls.from_symbols(parse_map(map_path.read_text()))
+        atomic_write(index_path, index.to_bytes(st.st_mtime_ns, st.st_size))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._addresses)
+
+    def _symbol(self, i: int) -> MapSymbol:
+        address, size, name, section, obj = self._records[i * RECORD_FIELDS:(i + 1) * RECORD_FIELDS]
+        return MapSymbol(address, size, self._strings[name], self._strings[section], self._strings[obj])
+
+    def symbols(self) -> List[MapSymbol]:
+        """
+        :returns: Every symbol, sorted by address
+        """
+        return [self._symbol(i) for i in range(len(self))]
+
+    def symbol_at(self, address: int) -> Optional[MapSymbol]:
+        """
+        :returns: The symbol ``address`` is within, or None if it's not within any
+        """
+        idx = bisect_right(self._addresses, address) - 1
+        while idx >= 0:
+            sym = self._symbol(idx)
+            if address < sym.address + sym.size or address == sym.address:
+                return sym
+            # Zero-sized symbols (e.g. section boundaries) may sit right after the enclosing one
+            if sym.size != 0:
+                return None
+            idx -= 1
+        return None
+
+    def describe(self, address: int) -> Optional[str]:
+        """
+        :returns: e.g. ``bl_printk+0x8``, or None if ``address`` isn't within a symbol
+        """
+        sym = self.symbol_at(address)
+        if sym is None:
+            return None
+        return sym.name if address == sym.address else f'{sym.name}+0x{address - sym.address:x}'
+
+    def lookup(self, name: str) -> List[MapSymbol]:
+        """
+        :returns: Symbols called ``name`` (there may be several static ones), with the object they come from
+        """
+        start = bisect_left(self._names, name)
+        end = bisect_right(self._names, name, start)
+        return [self._symbol(i) for i in self._by_name[start:end]]
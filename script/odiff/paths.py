@@ -3,5 +3,7 @@ from pathlib import Path
 
 SCRIPT_PATH = Path(os.path.abspath(__file__))
 REPO_ROOT = SCRIPT_PATH.parent.parent.parent
+CACHE_DIR = REPO_ROOT / '.odiff-cache'
+BLOBS_DIR = REPO_ROOT / 'blobs'
 
 VENDOR_PATH_PREFIX = '/home/rjwang/work/bl_iot_sdk.release/'
@@ -0,0 +1,132 @@
+import json
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+from typing import Dict, Tuple
+
+# Seconds between keep-alive comments on idle event streams
+KEEPALIVE_INTERVAL = 15
+
+# Appended to the served report: replaces the elements that the server pushes updates of, keeping them open if they
+# were, and shows what the server is doing
+LIVE_SCRIPT = '''<div id="live-status" style="position: fixed; bottom: 0; right: 0; padding: .3em; background: #eee;">
+</div>
+<script>
+const liveStatus = document.getElementById('live-status');
+const liveEvents = new EventSource('/events');
+liveEvents.addEventListener('update', e => {
+    const update = JSON.parse(e.data);
+    const template = document.createElement('template');
+    template.innerHTML = update.html;
+    const updated = template.content.firstElementChild;
+    const current = document.getElementById(update.id);
+    if (current) {
+        updated.open = current.open;
+        current.replaceWith(updated);
+    }
+});
+liveEvents.addEventListener('status', e => { liveStatus.textContent = JSON.parse(e.data); });
+liveEvents.onerror = () => { liveStatus.textContent = 'Disconnected'; };
+</script>
+'''
+
+
+class ReportServer:
+    """
+    Local HTTP server of a report, which pushes updated elements of the report to open pages (as server-sent events)
+    without reloading them. Updates are replayed to pages that connect later, so reloading a page doesn't lose them.
+    """
+
+    def __init__(self, report_path: Path, port: int):
+        self.report_path = report_path
+        # Latest HTML of each updated element by id, along with the update's sequence number
+        self._updates: Dict[str, Tuple[int, str]] = {}
+        self._status = ''
+        self._sequence = 0
+        self._changed = threading.Condition()
+        handler = partial(_ReportRequestHandler, self, directory=str(report_path.parent))
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}/'
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def publish(self, element_id: str, html: str):
+        with self._changed:
+            self._sequence += 1
+            self._updates[element_id] = (self._sequence, html)
+            self._changed.notify_all()
+
+    def set_status(self, status: str):
+        with self._changed:
+            self._sequence += 1
+            self._status = status
+            self._changed.notify_all()
+
+    def page(self) -> bytes:
+        html = self.report_path.read_text()
+        end = html.rfind('</body>')
+        return (html[:end] + LIVE_SCRIPT + html[end:] if end != -1 else html + LIVE_SCRIPT).encode()
+
+    def wait_for_events(self, seen: int) -> Tuple[int, str, Dict[str, str]]:
+        """
+        :param seen: Sequence number of the last update a page got
+        :returns: Current sequence number, status and the elements updated after ``seen``; none on timeout
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._sequence > seen, KEEPALIVE_INTERVAL)
+            return self._sequence, self._status, {
+                element_id: html for element_id, (sequence, html) in self._updates.items() if sequence > seen}
+
+
+class _ReportRequestHandler(SimpleHTTPRequestHandler):
+    def __init__(self, server: ReportServer, *args, **kwargs):
+        self.report_server = server
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/':
+            self._send_page()
+        elif self.path == '/events':
+            self._send_events()
+        else:
+            # Fragments of lazy reports
+            super().do_GET()
+
+    def _send_page(self):
+        page = self.report_server.page()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(page)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(page)
+
+    def _send_events(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        seen = 0
+        try:
+            while True:
+                sequence, status, updates = self.report_server.wait_for_events(seen)
+                if sequence == seen:
+                    self.wfile.write(b': keep-alive\n\n')
+                else:
+                    events = [('update', {'id': element_id, 'html': html}) for element_id, html in updates.items()]
+                    events.append(('status', status))
+                    self.wfile.write(''.join(
+                        f'event: {name}\ndata: {json.dumps(data)}\n\n' for name, data in events).encode())
+                self.wfile.flush()
+                seen = sequence
+        except (BrokenPipeError, ConnectionResetError):
+            pass
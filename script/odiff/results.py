@@ -0,0 +1,79 @@
+import csv
+import json
+import subprocess
+from datetime import datetime, timezone
+from io import StringIO
+from pathlib import Path
+from typing import List, Sequence, Iterable, Any, Dict
+from collections import Counter, namedtuple
+
+from odiff.paths import REPO_ROOT
+from odiff.utils import atomic_write
+
+STATUSES = ('equivalent', 'regalloc', 'different', 'missing', 'failed')
+HISTORY_FIELDS = ['time', 'commit', 'tool', 'scope', 'library', 'total', *STATUSES, 'similarity']
+
+# Progress of a library: item (function, header...) count per status and their mean similarity
+LibraryProgress = namedtuple('LibraryProgress', 'library statuses similarity')
+
+
+def run_info() -> Dict[str, str]:
+    """
+    :returns: Time of the run, and the commit of the repository it ran on (if any)
+    """
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True)
+    return {
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': result.stdout.decode().strip() if result.returncode == 0 else ''
+    }
+
+
+def write_json(path: Path, results: Dict[str, Any]):
+    atomic_write(path, json.dumps(results, indent=1).encode())
+
+
+def write_csv(path: Path, fields: Sequence[str], rows: Iterable[Sequence[Any]]):
+    text = StringIO()
+    writer = csv.writer(text, lineterminator='\n')
+    writer.writerow(fields)
+    writer.writerows(rows)
+    atomic_write(path, text.getvalue().encode())
+
+
+def library_progress(library: str, items: Iterable[Any]) -> LibraryProgress:
+    """
+    :param items: Results with ``status`` and ``similarity`` attributes
+    """
+    statuses: Counter = Counter()
+    similarities: List[float] = []
+    for item in items:
+        statuses[item.status] += 1
+        if item.status != 'failed':
+            similarities.append(item.similarity)
+    return LibraryProgress(library, statuses, (sum(similarities) / len(similarities)) if similarities else 0)
+
+
+class ProgressHistory:
+    """
+    CSV file that every run appends a row per library to, so that progress can be charted over time.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def append(self, tool: str, info: Dict[str, str], scope: List[str], progress: Iterable[LibraryProgress]):
+        """
+        :param info: See run_info
+        :param scope: Patterns the run was restricted to, empty for a complete run
+        """
+        new = not self.path.is_file()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            if new:
+                writer.writerow(HISTORY_FIELDS)
+            for library, statuses, similarity in progress:
+                writer.writerow([
+                    info['time'], info['commit'], tool, ' '.join(scope), library, sum(statuses.values()),
+                    *(statuses[s] for s in STATUSES), f'{similarity:.4f}'
+                ])
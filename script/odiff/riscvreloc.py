@@ -1,27 +1,37 @@
+from collections import namedtuple
 from io import BytesIO
 from struct import Struct
+from typing import List, Tuple, Optional, Callable, TYPE_CHECKING
 
 from elftools.common.exceptions import ELFRelocationError
-from elftools.elf.relocation import RelocationHandler
-from elftools.elf.sections import SymbolTableSection
 
-ENUM_RELOC_TYPE_RISCV= dict(
+if TYPE_CHECKING:
+    from elftools.elf.relocation import RelocationHandler, RelocationSection
+
+ENUM_RELOC_TYPE_RISCV = dict(
     R_RISCV_32=1,
+    R_RISCV_64=2,
     R_RISCV_ADD8=33,
     R_RISCV_ADD16=34,
     R_RISCV_ADD32=35,
+    R_RISCV_ADD64=36,
     R_RISCV_SUB8=37,
     R_RISCV_SUB16=38,
     R_RISCV_SUB32=39,
+    R_RISCV_SUB64=40,
     R_RISCV_SUB6=52,
     R_RISCV_SET6=53,
     R_RISCV_SET8=54,
     R_RISCV_SET16=55,
+    R_RISCV_SET32=56,
+    R_RISCV_32_PCREL=57,
+    R_RISCV_SET_ULEB128=60,
+    R_RISCV_SUB_ULEB128=61,
 )
 
 
 def _reloc_calc_riscv(value, sym_value, offset, addend=0):
-    return value + sym_value
+    return sym_value + addend
 
 
 def _reloc_calc_riscv_add(value, sym_value, offset, addend=0):
@@ -32,48 +42,40 @@ def _reloc_calc_riscv_sub(value, sym_value, offset, addend=0):
     return value - sym_value - addend
 
 
-def _reloc_calc_riscv_set(value, sym_value, offset, addend=0):
-    return sym_value + addend
+def _reloc_calc_riscv_pcrel(value, sym_value, offset, addend=0):
+    # Sections of relocatable objects are at address 0, so the place is the offset
+    return sym_value + addend - offset
 
 
-# noinspection PyProtectedMember
+# Size of the relocated field in bytes, and how many of its low bits are relocated (R_RISCV_*6 only patch 6 bits)
+_Recipe = namedtuple('_Recipe', 'bytesize bits calc_func')
+
 _RELOCATION_RECIPES_RISCV = {
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_32']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=4, has_addend=True,
-        calc_func=_reloc_calc_riscv),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_ADD8']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=1, has_addend=True,
-        calc_func=_reloc_calc_riscv_add),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_ADD16']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=2, has_addend=True,
-        calc_func=_reloc_calc_riscv_add),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_ADD32']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=1, has_addend=True,
-        calc_func=_reloc_calc_riscv_add),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB8']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=2, has_addend=True,
-        calc_func=_reloc_calc_riscv_sub),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB16']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=2, has_addend=True,
-        calc_func=_reloc_calc_riscv_sub),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB32']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=4, has_addend=True,
-        calc_func=_reloc_calc_riscv_sub),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB6']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=1, has_addend=True,
-        calc_func=_reloc_calc_riscv_sub),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_SET6']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=1, has_addend=True,
-        calc_func=_reloc_calc_riscv_set),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_SET8']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=1, has_addend=True,
-        calc_func=_reloc_calc_riscv_set),
-    ENUM_RELOC_TYPE_RISCV['R_RISCV_SET16']: RelocationHandler._RELOCATION_RECIPE_TYPE(
-        bytesize=2, has_addend=True,
-        calc_func=_reloc_calc_riscv_set),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_32']: _Recipe(4, 32, _reloc_calc_riscv),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_64']: _Recipe(8, 64, _reloc_calc_riscv),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_ADD8']: _Recipe(1, 8, _reloc_calc_riscv_add),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_ADD16']: _Recipe(2, 16, _reloc_calc_riscv_add),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_ADD32']: _Recipe(4, 32, _reloc_calc_riscv_add),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_ADD64']: _Recipe(8, 64, _reloc_calc_riscv_add),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB8']: _Recipe(1, 8, _reloc_calc_riscv_sub),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB16']: _Recipe(2, 16, _reloc_calc_riscv_sub),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB32']: _Recipe(4, 32, _reloc_calc_riscv_sub),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB64']: _Recipe(8, 64, _reloc_calc_riscv_sub),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB6']: _Recipe(1, 6, _reloc_calc_riscv_sub),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SET6']: _Recipe(1, 6, _reloc_calc_riscv),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SET8']: _Recipe(1, 8, _reloc_calc_riscv),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SET16']: _Recipe(2, 16, _reloc_calc_riscv),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SET32']: _Recipe(4, 32, _reloc_calc_riscv),
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_32_PCREL']: _Recipe(4, 32, _reloc_calc_riscv_pcrel),
+}
+# Relocations of ULEB128 fields, which keep the field's encoded length
+_ULEB128_RECIPES_RISCV = {
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SET_ULEB128']: _reloc_calc_riscv,
+    ENUM_RELOC_TYPE_RISCV['R_RISCV_SUB_ULEB128']: _reloc_calc_riscv_sub,
 }
 
-SYMTAB_ENTRY_VALUE_STRUCT = Struct('<4xI')
+ELF32_RELA_STRUCT = Struct('<IIi')
+ELF32_SYM_VALUE_STRUCT = Struct('<4xI8x')
 BYTE_SIZE_STRUCTS = {
     1: Struct('<B'),
     2: Struct('<H'),
@@ -82,39 +84,79 @@ BYTE_SIZE_STRUCTS = {
 }
 
 
-def _do_apply_relocation_riscv(self: RelocationHandler, stream: BytesIO, reloc, symtab: SymbolTableSection):
-    sym_idx: int = reloc['r_info_sym']
-    if sym_idx >= symtab.num_symbols():
-        raise ELFRelocationError(f"Invalid symbol reference in relocation: index {sym_idx}")
-    # The following line is slow: it uses elftools' slow struct parsing and also gets the symbol name, which is unused.
-    # sym_value: int = symtab.get_symbol(sym_idx)['st_value']
-    symtab.stream.seek(symtab['sh_offset'] + sym_idx * symtab['sh_entsize'])
-    sym_value: int = SYMTAB_ENTRY_VALUE_STRUCT.unpack(symtab.stream.read(SYMTAB_ENTRY_VALUE_STRUCT.size))[0]
-
-    reloc_type = reloc['r_info_type']
-
-    # For some reason checking arch and reloc.is_RELA() is time-consuming when profiled. Don't do it.
-
-    recipe = _RELOCATION_RECIPES_RISCV.get(reloc_type, None)
-
-    if recipe is None:
-        raise ELFRelocationError(
-            'Unsupported relocation type: %s' % reloc_type)
-
-    value_struct = BYTE_SIZE_STRUCTS[recipe.bytesize]
-
-    stream.seek(reloc['r_offset'])
-    original_value = value_struct.unpack(stream.read(value_struct.size))[0]
-    relocated_value = recipe.calc_func(
-        value=original_value,
-        sym_value=sym_value,
-        offset=reloc['r_offset'],
-        addend=reloc['r_addend'] if recipe.has_addend else 0)
-
-    relocated_value = relocated_value % (2 ** (recipe.bytesize * 8))
-    stream.seek(reloc['r_offset'])
-    stream.write(value_struct.pack(relocated_value))
+def _read_uleb128(data: bytearray, offset: int) -> Tuple[int, int]:
+    """
+    :returns: Value, and encoded length
+    """
+    value = 0
+    length = 0
+    while True:
+        byte = data[offset + length]
+        value |= (byte & 0x7f) << (7 * length)
+        length += 1
+        if not byte & 0x80:
+            return value, length
+
+
+def _write_uleb128(data: bytearray, offset: int, length: int, value: int):
+    value %= 1 << (7 * length)
+    for i in range(length):
+        data[offset + i] = (value & 0x7f) | (0x80 if i < length - 1 else 0)
+        value >>= 7
+
+
+def apply_relocations(data: bytearray, relocs: bytes, sym_values: List[int]):
+    """
+    Apply a whole RISC-V ELF32 RELA table to the data of the section it relocates.
+
+    :param relocs: Contents of the relocation section
+    :param sym_values: ``st_value`` of each symbol of the associated symbol table
+    """
+    recipes = _RELOCATION_RECIPES_RISCV
+    for offset, info, addend in ELF32_RELA_STRUCT.iter_unpack(relocs):
+        sym_idx = info >> 8
+        reloc_type = info & 0xff
+        if sym_idx >= len(sym_values):
+            raise ELFRelocationError(f"Invalid symbol reference in relocation: index {sym_idx}")
+        sym_value = sym_values[sym_idx]
+        recipe = recipes.get(reloc_type)
+        if recipe is None:
+            calc_func = _ULEB128_RECIPES_RISCV.get(reloc_type)
+            if calc_func is None:
+                raise ELFRelocationError(f"Unsupported relocation type: {reloc_type}")
+            value, length = _read_uleb128(data, offset)
+            _write_uleb128(data, offset, length, calc_func(value, sym_value, offset, addend))
+            continue
+        value_struct = BYTE_SIZE_STRUCTS[recipe.bytesize]
+        original_value = value_struct.unpack_from(data, offset)[0]
+        mask = (1 << recipe.bits) - 1
+        relocated_value = recipe.calc_func(original_value & mask, sym_value, offset, addend) & mask
+        value_struct.pack_into(data, offset, (original_value & ~mask) | relocated_value)
+
+
+# pyelftools' own method, saved when it gets patched
+_apply_section_relocations: Optional[Callable] = None
+
+
+def _apply_section_relocations_riscv(self: 'RelocationHandler', stream: BytesIO, reloc_section: 'RelocationSection'):
+    # pyelftools decodes every relocation and symbol with its (slow) struct parsing, then patches the stream one
+    # relocation at a time. Decode the whole tables at once instead and patch a copy of the section.
+    elf = self.elffile
+    if elf['e_machine'] != 'EM_RISCV' or elf.elfclass != 32 or not elf.little_endian or not reloc_section.is_RELA():
+        return _apply_section_relocations(self, stream, reloc_section)
+    symtab = elf.get_section(reloc_section['sh_link'])
+    sym_values = [value for value, in ELF32_SYM_VALUE_STRUCT.iter_unpack(symtab.data())]
+    stream.seek(0)
+    data = bytearray(stream.read())
+    apply_relocations(data, reloc_section.data(), sym_values)
+    stream.seek(0)
+    stream.write(data)
 
 
 def patch_elftools_relocs():
-    RelocationHandler._do_apply_relocation = _do_apply_relocation_riscv
+    global _apply_section_relocations
+    # Imported here rather than by every tool that may patch pyelftools, as it is slow to import
+    from elftools.elf.relocation import RelocationHandler
+    if _apply_section_relocations is None:
+        _apply_section_relocations = RelocationHandler.apply_section_relocations
+        RelocationHandler.apply_section_relocations = _apply_section_relocations_riscv
@@ -0,0 +1,331 @@
+from typing import List, Optional, Tuple
+
+# Decoding of RV32IMFC instructions, spelled the way GNU objdump prints them (i.e. with its preferred aliases), so that
+# listings made from either source can be compared.
+
+REG_NAMES = [
+    'zero', 'ra', 'sp', 'gp', 'tp', 't0', 't1', 't2', 's0', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5',
+    'a6', 'a7', 's2', 's3', 's4', 's5', 's6', 's7', 's8', 's9', 's10', 's11', 't3', 't4', 't5', 't6'
+]
+FREG_NAMES = [
+    'ft0', 'ft1', 'ft2', 'ft3', 'ft4', 'ft5', 'ft6', 'ft7', 'fs0', 'fs1', 'fa0', 'fa1', 'fa2', 'fa3', 'fa4', 'fa5',
+    'fa6', 'fa7', 'fs2', 'fs3', 'fs4', 'fs5', 'fs6', 'fs7', 'fs8', 'fs9', 'fs10', 'fs11', 'ft8', 'ft9', 'ft10', 'ft11'
+]
+CSR_NAMES = {
+    0x001: 'fflags', 0x002: 'frm', 0x003: 'fcsr',
+    0xc00: 'cycle', 0xc01: 'time', 0xc02: 'instret', 0xc80: 'cycleh', 0xc81: 'timeh', 0xc82: 'instreth',
+    0x300: 'mstatus', 0x301: 'misa', 0x302: 'medeleg', 0x303: 'mideleg', 0x304: 'mie', 0x305: 'mtvec',
+    0x306: 'mcounteren', 0x307: 'mtvt', 0x340: 'mscratch', 0x341: 'mepc', 0x342: 'mcause', 0x343: 'mtval',
+    0x344: 'mip', 0x345: 'mnxti', 0x347: 'mintstatus', 0x348: 'mscratchcsw', 0x349: 'mscratchcswl',
+    0xb00: 'mcycle', 0xb02: 'minstret', 0xb80: 'mcycleh', 0xb82: 'minstreth',
+    0xf11: 'mvendorid', 0xf12: 'marchid', 0xf13: 'mimpid', 0xf14: 'mhartid',
+    0x7a0: 'tselect', 0x7a1: 'tdata1', 0x7a2: 'tdata2', 0x7a3: 'tdata3',
+    0x7b0: 'dcsr', 0x7b1: 'dpc', 0x7b2: 'dscratch',
+}
+ROUNDING_MODES = ['rne', 'rtz', 'rdn', 'rup', 'rmm', None, None, 'dyn']
+
+BRANCHES = {0: 'beq', 1: 'bne', 4: 'blt', 5: 'bge', 6: 'bltu', 7: 'bgeu'}
+LOADS = {0: 'lb', 1: 'lh', 2: 'lw', 4: 'lbu', 5: 'lhu'}
+STORES = {0: 'sb', 1: 'sh', 2: 'sw'}
+OP_IMMS = {0: 'addi', 2: 'slti', 3: 'sltiu', 4: 'xori', 6: 'ori', 7: 'andi'}
+OPS = {
+    (0x00, 0): 'add', (0x20, 0): 'sub', (0x00, 1): 'sll', (0x00, 2): 'slt', (0x00, 3): 'sltu', (0x00, 4): 'xor',
+    (0x00, 5): 'srl', (0x20, 5): 'sra', (0x00, 6): 'or', (0x00, 7): 'and',
+    (0x01, 0): 'mul', (0x01, 1): 'mulh', (0x01, 2): 'mulhsu', (0x01, 3): 'mulhu',
+    (0x01, 4): 'div', (0x01, 5): 'divu', (0x01, 6): 'rem', (0x01, 7): 'remu',
+}
+CSR_OPS = {1: 'csrrw', 2: 'csrrs', 3: 'csrrc', 5: 'csrrwi', 6: 'csrrsi', 7: 'csrrci'}
+FMAS = {0x43: 'fmadd.s', 0x47: 'fmsub.s', 0x4b: 'fnmsub.s', 0x4f: 'fnmadd.s'}
+FP_ARITH = {0x00: 'fadd.s', 0x04: 'fsub.s', 0x08: 'fmul.s', 0x0c: 'fdiv.s'}
+FP_CSR_ALIASES = {0x001: 'flags', 0x002: 'rm', 0x003: 'csr'}
+C_ALU = {0: 'sub', 1: 'xor', 2: 'or', 3: 'and'}
+
+# Decoded instruction: (size in bytes, mnemonic, operands, branch/jump target address)
+Insn = Tuple[int, str, List[str], Optional[int]]
+
+
+def sext(value: int, bits: int) -> int:
+    sign = 1 << (bits - 1)
+    return (value & (sign - 1)) - (value & sign)
+
+
+def insn_size(first_halfword: int) -> int:
+    return 4 if first_halfword & 3 == 3 else 2
+
+
+def _csr_name(csr: int) -> str:
+    return CSR_NAMES.get(csr, f'0x{csr:x}')
+
+
+def _rm_operands(operands: List[str], rm: int) -> List[str]:
+    # The dynamic rounding mode is implied
+    if rm == 7:
+        return operands
+    return [*operands, ROUNDING_MODES[rm] or str(rm)]
+
+
+def _decode_branch(pc: int, w: int) -> Insn:
+    rs1, rs2 = (w >> 15) & 31, (w >> 20) & 31
+    imm = sext(((w >> 31) & 1) << 12 | ((w >> 7) & 1) << 11 | ((w >> 25) & 0x3f) << 5 | ((w >> 8) & 0xf) << 1, 13)
+    target = pc + imm
+    mnemonic = BRANCHES[(w >> 12) & 7]
+    if mnemonic in ('beq', 'bne') and rs2 == 0:
+        return 4, f'{mnemonic}z', [REG_NAMES[rs1], f'{target:x}'], target
+    if mnemonic == 'bge' and rs1 == 0:
+        return 4, 'blez', [REG_NAMES[rs2], f'{target:x}'], target
+    if mnemonic == 'bge' and rs2 == 0:
+        return 4, 'bgez', [REG_NAMES[rs1], f'{target:x}'], target
+    if mnemonic == 'blt' and rs2 == 0:
+        return 4, 'bltz', [REG_NAMES[rs1], f'{target:x}'], target
+    if mnemonic == 'blt' and rs1 == 0:
+        return 4, 'bgtz', [REG_NAMES[rs2], f'{target:x}'], target
+    return 4, mnemonic, [REG_NAMES[rs1], REG_NAMES[rs2], f'{target:x}'], target
+
+
+def _decode_jalr(rd: int, rs1: int, imm: int) -> Insn:
+    if rd == 0 and rs1 == 1 and imm == 0:
+        return 4, 'ret', [], None
+    if rd in (0, 1):
+        mnemonic = 'jr' if rd == 0 else 'jalr'
+        return 4, mnemonic, [REG_NAMES[rs1] if imm == 0 else f'{imm}({REG_NAMES[rs1]})'], None
+    if imm == 0:
+        return 4, 'jalr', [REG_NAMES[rd], REG_NAMES[rs1]], None
+    return 4, 'jalr', [REG_NAMES[rd], f'{imm}({REG_NAMES[rs1]})'], None
+
+
+def _decode_csr(w: int) -> Insn:
+    rd, funct3, rs1, csr = (w >> 7) & 31, (w >> 12) & 7, (w >> 15) & 31, w >> 20
+    mnemonic = CSR_OPS[funct3]
+    src = str(rs1) if funct3 >= 5 else REG_NAMES[rs1]
+    fp_alias = FP_CSR_ALIASES.get(csr)
+    if mnemonic == 'csrrs' and rs1 == 0:
+        if fp_alias is not None:
+            return 4, f'fr{fp_alias}', [REG_NAMES[rd]], None
+        if csr in (0xc00, 0xc01, 0xc02, 0xc80, 0xc81, 0xc82):
+            return 4, f'rd{CSR_NAMES[csr]}', [REG_NAMES[rd]], None
+        return 4, 'csrr', [REG_NAMES[rd], _csr_name(csr)], None
+    if fp_alias is not None and mnemonic in ('csrrw', 'csrrwi'):
+        alias = f'fs{fp_alias}{"i" if mnemonic == "csrrwi" else ""}'
+        return 4, alias, [src] if rd == 0 else [REG_NAMES[rd], src], None
+    if rd == 0:
+        return 4, f'csr{mnemonic[4:]}', [_csr_name(csr), src], None
+    return 4, mnemonic, [REG_NAMES[rd], _csr_name(csr), src], None
+
+
+def _decode_op_fp(w: int) -> Insn:
+    rd, rm, rs1, rs2, funct7 = (w >> 7) & 31, (w >> 12) & 7, (w >> 15) & 31, (w >> 20) & 31, w >> 25
+    fd, fs1, fs2 = FREG_NAMES[rd], FREG_NAMES[rs1], FREG_NAMES[rs2]
+    if funct7 in FP_ARITH:
+        return 4, FP_ARITH[funct7], _rm_operands([fd, fs1, fs2], rm), None
+    if funct7 == 0x2c and rs2 == 0:
+        return 4, 'fsqrt.s', _rm_operands([fd, fs1], rm), None
+    if funct7 == 0x10 and rm <= 2:
+        if rs1 == rs2:
+            return 4, ('fmv.s', 'fneg.s', 'fabs.s')[rm], [fd, fs1], None
+        return 4, ('fsgnj.s', 'fsgnjn.s', 'fsgnjx.s')[rm], [fd, fs1, fs2], None
+    if funct7 == 0x14 and rm <= 1:
+        return 4, ('fmin.s', 'fmax.s')[rm], [fd, fs1, fs2], None
+    if funct7 == 0x60 and rs2 <= 1:
+        return 4, ('fcvt.w.s', 'fcvt.wu.s')[rs2], _rm_operands([REG_NAMES[rd], fs1], rm), None
+    if funct7 == 0x68 and rs2 <= 1:
+        return 4, ('fcvt.s.w', 'fcvt.s.wu')[rs2], _rm_operands([fd, REG_NAMES[rs1]], rm), None
+    if funct7 == 0x50 and rm <= 2:
+        return 4, ('fle.s', 'flt.s', 'feq.s')[rm], [REG_NAMES[rd], fs1, fs2], None
+    if funct7 == 0x70 and rs2 == 0 and rm <= 1:
+        return 4, ('fmv.x.w', 'fclass.s')[rm], [REG_NAMES[rd], fs1], None
+    if funct7 == 0x78 and rs2 == 0 and rm == 0:
+        return 4, 'fmv.w.x', [fd, REG_NAMES[rs1]], None
+    return _unknown(4, w)
+
+
+def _unknown(size: int, value: int) -> Insn:
+    return size, f'.{size}byte', [f'0x{value:x}'], None
+
+
+def decode32(pc: int, w: int) -> Insn:
+    opcode, rd, funct3, rs1, rs2 = w & 0x7f, (w >> 7) & 31, (w >> 12) & 7, (w >> 15) & 31, (w >> 20) & 31
+    i_imm = sext(w >> 20, 12)
+    if opcode == 0x37:
+        return 4, 'lui', [REG_NAMES[rd], f'0x{w >> 12:x}'], None
+    if opcode == 0x17:
+        return 4, 'auipc', [REG_NAMES[rd], f'0x{w >> 12:x}'], None
+    if opcode == 0x6f:
+        imm = sext(((w >> 31) & 1) << 20 | ((w >> 12) & 0xff) << 12 | ((w >> 20) & 1) << 11 | ((w >> 21) & 0x3ff) << 1,
+                   21)
+        target = pc + imm
+        if rd == 0:
+            return 4, 'j', [f'{target:x}'], target
+        if rd == 1:
+            return 4, 'jal', [f'{target:x}'], target
+        return 4, 'jal', [REG_NAMES[rd], f'{target:x}'], target
+    if opcode == 0x67 and funct3 == 0:
+        return _decode_jalr(rd, rs1, i_imm)
+    if opcode == 0x63 and funct3 in BRANCHES:
+        return _decode_branch(pc, w)
+    if opcode == 0x03 and funct3 in LOADS:
+        return 4, LOADS[funct3], [REG_NAMES[rd], f'{i_imm}({REG_NAMES[rs1]})'], None
+    if opcode == 0x23 and funct3 in STORES:
+        s_imm = sext(((w >> 25) << 5) | ((w >> 7) & 31), 12)
+        return 4, STORES[funct3], [REG_NAMES[rs2], f'{s_imm}({REG_NAMES[rs1]})'], None
+    if opcode == 0x13:
+        if funct3 in (1, 5):
+            shamt = (w >> 20) & 0x1f
+            if funct3 == 1 and w >> 25 == 0:
+                return 4, 'slli', [REG_NAMES[rd], REG_NAMES[rs1], f'0x{shamt:x}'], None
+            if funct3 == 5 and w >> 25 in (0, 0x20):
+                mnemonic = 'srai' if w >> 25 else 'srli'
+                return 4, mnemonic, [REG_NAMES[rd], REG_NAMES[rs1], f'0x{shamt:x}'], None
+            return _unknown(4, w)
+        mnemonic = OP_IMMS[funct3]
+        if mnemonic == 'addi':
+            if rd == 0 and rs1 == 0 and i_imm == 0:
+                return 4, 'nop', [], None
+            if rs1 == 0:
+                return 4, 'li', [REG_NAMES[rd], str(i_imm)], None
+            if i_imm == 0:
+                return 4, 'mv', [REG_NAMES[rd], REG_NAMES[rs1]], None
+        elif mnemonic == 'sltiu' and i_imm == 1:
+            return 4, 'seqz', [REG_NAMES[rd], REG_NAMES[rs1]], None
+        elif mnemonic == 'xori' and i_imm == -1:
+            return 4, 'not', [REG_NAMES[rd], REG_NAMES[rs1]], None
+        return 4, mnemonic, [REG_NAMES[rd], REG_NAMES[rs1], str(i_imm)], None
+    if opcode == 0x33 and (w >> 25, funct3) in OPS:
+        mnemonic = OPS[(w >> 25, funct3)]
+        if mnemonic == 'sub' and rs1 == 0:
+            return 4, 'neg', [REG_NAMES[rd], REG_NAMES[rs2]], None
+        if mnemonic == 'sltu' and rs1 == 0:
+            return 4, 'snez', [REG_NAMES[rd], REG_NAMES[rs2]], None
+        if mnemonic == 'slt' and rs2 == 0:
+            return 4, 'sltz', [REG_NAMES[rd], REG_NAMES[rs1]], None
+        if mnemonic == 'slt' and rs1 == 0:
+            return 4, 'sgtz', [REG_NAMES[rd], REG_NAMES[rs2]], None
+        return 4, mnemonic, [REG_NAMES[rd], REG_NAMES[rs1], REG_NAMES[rs2]], None
+    if opcode == 0x0f:
+        if funct3 == 1:
+            return 4, 'fence.i', [], None
+        pred, succ = (w >> 24) & 0xf, (w >> 20) & 0xf
+        if pred == succ == 0xf:
+            return 4, 'fence', [], None
+        return 4, 'fence', [''.join(c for c, b in zip('iorw', (8, 4, 2, 1)) if x & b) for x in (pred, succ)], None
+    if opcode == 0x73:
+        if funct3 == 0:
+            system = {0x00000073: 'ecall', 0x00100073: 'ebreak', 0x00200073: 'uret', 0x10200073: 'sret',
+                      0x30200073: 'mret', 0x10500073: 'wfi'}
+            if w in system:
+                return 4, system[w], [], None
+            return _unknown(4, w)
+        if funct3 in CSR_OPS:
+            return _decode_csr(w)
+    if opcode == 0x07 and funct3 == 2:
+        return 4, 'flw', [FREG_NAMES[rd], f'{i_imm}({REG_NAMES[rs1]})'], None
+    if opcode == 0x27 and funct3 == 2:
+        s_imm = sext(((w >> 25) << 5) | ((w >> 7) & 31), 12)
+        return 4, 'fsw', [FREG_NAMES[rs2], f'{s_imm}({REG_NAMES[rs1]})'], None
+    if opcode in FMAS and (w >> 25) & 3 == 0:
+        return 4, FMAS[opcode], _rm_operands(
+            [FREG_NAMES[rd], FREG_NAMES[rs1], FREG_NAMES[rs2], FREG_NAMES[w >> 27]], funct3), None
+    if opcode == 0x53:
+        return _decode_op_fp(w)
+    return _unknown(4, w)
+
+
+def decode16(pc: int, c: int) -> Insn:
+    quadrant, funct3 = c & 3, c >> 13
+    rd = (c >> 7) & 31
+    rs2 = (c >> 2) & 31
+    # Registers x8-x15 as encoded in 3-bit fields
+    rdp = 8 + ((c >> 2) & 7)
+    rs1p = 8 + ((c >> 7) & 7)
+    imm6 = sext(((c >> 12) & 1) << 5 | (c >> 2) & 0x1f, 6)
+    if quadrant == 0:
+        if funct3 == 0:
+            imm = ((c >> 11) & 3) << 4 | ((c >> 7) & 0xf) << 6 | ((c >> 6) & 1) << 2 | ((c >> 5) & 1) << 3
+            if imm == 0:
+                return _unknown(2, c)
+            return 2, 'addi', [REG_NAMES[rdp], 'sp', str(imm)], None
+        if funct3 in (1, 5):
+            imm = ((c >> 10) & 7) << 3 | ((c >> 5) & 3) << 6
+            return 2, 'fld' if funct3 == 1 else 'fsd', [FREG_NAMES[rdp], f'{imm}({REG_NAMES[rs1p]})'], None
+        if funct3 in (2, 3, 6, 7):
+            imm = ((c >> 10) & 7) << 3 | ((c >> 6) & 1) << 2 | ((c >> 5) & 1) << 6
+            mnemonic = {2: 'lw', 3: 'flw', 6: 'sw', 7: 'fsw'}[funct3]
+            reg = (FREG_NAMES if funct3 in (3, 7) else REG_NAMES)[rdp]
+            return 2, mnemonic, [reg, f'{imm}({REG_NAMES[rs1p]})'], None
+        return _unknown(2, c)
+    if quadrant == 1:
+        if funct3 == 0:
+            if rd == 0:
+                return 2, 'nop', [], None
+            return 2, 'addi', [REG_NAMES[rd], REG_NAMES[rd], str(imm6)], None
+        if funct3 in (1, 5):
+            imm = sext(((c >> 12) & 1) << 11 | ((c >> 11) & 1) << 4 | ((c >> 9) & 3) << 8 | ((c >> 8) & 1) << 10 |
+                       ((c >> 7) & 1) << 6 | ((c >> 6) & 1) << 7 | ((c >> 3) & 7) << 1 | ((c >> 2) & 1) << 5, 12)
+            target = pc + imm
+            return 2, 'jal' if funct3 == 1 else 'j', [f'{target:x}'], target
+        if funct3 == 2:
+            return 2, 'li', [REG_NAMES[rd], str(imm6)], None
+        if funct3 == 3:
+            if rd == 2:
+                imm = sext(((c >> 12) & 1) << 9 | ((c >> 6) & 1) << 4 | ((c >> 5) & 1) << 6 | ((c >> 3) & 3) << 7 |
+                           ((c >> 2) & 1) << 5, 10)
+                return 2, 'addi', ['sp', 'sp', str(imm)], None
+            return 2, 'lui', [REG_NAMES[rd], f'0x{imm6 & 0xfffff:x}'], None
+        if funct3 == 4:
+            funct2 = (c >> 10) & 3
+            shamt = ((c >> 12) & 1) << 5 | (c >> 2) & 0x1f
+            if funct2 == 0:
+                return 2, 'srli', [REG_NAMES[rs1p], REG_NAMES[rs1p], f'0x{shamt:x}'], None
+            if funct2 == 1:
+                return 2, 'srai', [REG_NAMES[rs1p], REG_NAMES[rs1p], f'0x{shamt:x}'], None
+            if funct2 == 2:
+                return 2, 'andi', [REG_NAMES[rs1p], REG_NAMES[rs1p], str(imm6)], None
+            if (c >> 12) & 1 == 0:
+                return 2, C_ALU[(c >> 5) & 3], [REG_NAMES[rs1p], REG_NAMES[rs1p], REG_NAMES[rdp]], None
+            return _unknown(2, c)
+        imm = sext(((c >> 12) & 1) << 8 | ((c >> 10) & 3) << 3 | ((c >> 5) & 3) << 6 | ((c >> 3) & 3) << 1 |
+                   ((c >> 2) & 1) << 5, 9)
+        target = pc + imm
+        return 2, 'beqz' if funct3 == 6 else 'bnez', [REG_NAMES[rs1p], f'{target:x}'], target
+    # Quadrant 2
+    if funct3 == 0:
+        shamt = ((c >> 12) & 1) << 5 | (c >> 2) & 0x1f
+        return 2, 'slli', [REG_NAMES[rd], REG_NAMES[rd], f'0x{shamt:x}'], None
+    if funct3 == 1:
+        imm = ((c >> 12) & 1) << 5 | ((c >> 5) & 3) << 3 | ((c >> 2) & 7) << 6
+        return 2, 'fld', [FREG_NAMES[rd], f'{imm}(sp)'], None
+    if funct3 in (2, 3):
+        imm = ((c >> 12) & 1) << 5 | ((c >> 4) & 7) << 2 | ((c >> 2) & 3) << 6
+        if funct3 == 2:
+            return 2, 'lw', [REG_NAMES[rd], f'{imm}(sp)'], None
+        return 2, 'flw', [FREG_NAMES[rd], f'{imm}(sp)'], None
+    if funct3 == 4:
+        if (c >> 12) & 1 == 0:
+            if rs2 == 0:
+                if rd == 1:
+                    return 2, 'ret', [], None
+                return 2, 'jr', [REG_NAMES[rd]], None
+            return 2, 'mv', [REG_NAMES[rd], REG_NAMES[rs2]], None
+        if rd == 0 and rs2 == 0:
+            return 2, 'ebreak', [], None
+        if rs2 == 0:
+            return 2, 'jalr', [REG_NAMES[rd]], None
+        return 2, 'add', [REG_NAMES[rd], REG_NAMES[rd], REG_NAMES[rs2]], None
+    if funct3 == 5:
+        imm = ((c >> 10) & 7) << 3 | ((c >> 7) & 7) << 6
+        return 2, 'fsd', [FREG_NAMES[rs2], f'{imm}(sp)'], None
+    imm = ((c >> 9) & 0xf) << 2 | ((c >> 7) & 3) << 6
+    if funct3 == 6:
+        return 2, 'sw', [REG_NAMES[rs2], f'{imm}(sp)'], None
+    return 2, 'fsw', [FREG_NAMES[rs2], f'{imm}(sp)'], None
+
+
+def decode(data: bytes, offset: int, pc: int) -> Insn:
+    """
+    Decode the instruction at ``data[offset:]``, located at address ``pc``.
+    """
+    halfword = data[offset] | data[offset + 1] << 8
+    if insn_size(halfword) == 2:
+        return decode16(pc, halfword)
+    if offset + 4 > len(data):
+        return _unknown(2, halfword)
+    return decode32(pc, int.from_bytes(data[offset:offset + 4], 'little'))
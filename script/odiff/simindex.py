@@ -0,0 +1,170 @@
+import pickle
+from array import array
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Tuple, Set, Iterable
+
+from odiff.asm import Function, AsmLine, BRANCH_OPCODES, ALLOCATABLE_REGISTER_RE
+from odiff.paths import CACHE_DIR, BLOBS_DIR
+from odiff.utils import hash_file, atomic_write
+
+# Bump when the normalization or the layout of the index changes
+FORMAT_VERSION = 1
+FIRMWARE_ELFS = ('bl602_demo_wifi.elf', 'bl602_demo_at.elf', 'sdk_app_ble_sync.elf')
+# Length of the instruction sequences functions are compared by
+NGRAM_LENGTH = 4
+# Fixed-role registers are kept in tokens, other integer and float registers become x and f
+FIXED_REGISTERS = frozenset(('zero', 'ra', 'sp', 'gp', 'tp'))
+# Opcodes whose immediate operand is a constant of the code rather than (part of) a relocated address
+CONSTANT_OPCODES = frozenset(('li', 'slli', 'srli', 'srai', 'andi', 'ori', 'xori', 'slti', 'sltiu'))
+
+# Function of a firmware ELF, with its number of instructions
+IndexedFunction = namedtuple('IndexedFunction', 'elf name address length')
+Match = namedtuple('Match', 'score function')
+
+
+def _operand_token(operand: str, keep_immediate: bool) -> str:
+    if '(' in operand:
+        # Memory operand: the offset of anything but a stack slot may be the low part of a relocated address
+        offset, base = operand[:-1].split('(', 1)
+        return f'{offset if base == "sp" else "#"}({_operand_token(base, True)})'
+    if operand in FIXED_REGISTERS:
+        return operand
+    if ALLOCATABLE_REGISTER_RE.fullmatch(operand):
+        return 'f' if operand[0] == 'f' else 'x'
+    return operand if keep_immediate else '#'
+
+
+def instruction_tokens(func: Function) -> List[str]:
+    """
+    Normalize the instructions of a function so that the same code reads the same in a relocatable object and in a
+    linked ELF, whatever the symbols are called (or whether there are any):
+
+    - registers that register allocation chooses are abstracted, and addresses, relocated immediates and branch
+      destinations are left out,
+    - calls (``auipc``/``jalr`` pairs of objects, relaxed to ``jal`` by the linker) become ``call``, and jumps out of
+      the function ``tail``,
+    - ``mv`` (``addi rd, rs, %lo(symbol)`` in objects) is ``addi``.
+    """
+    tokens: List[str] = []
+    lines: List[AsmLine] = func.asm_lines
+    start = lines[0].offset if lines else 0
+    end = lines[-1].offset if lines else 0
+    idx = 0
+    while idx < len(lines):
+        line = lines[idx]
+        opcode = line.opcode
+        operands = line.operands
+        if opcode == 'auipc' and idx + 1 < len(lines) and lines[idx + 1].opcode in ('jalr', 'jr') \
+                and lines[idx + 1].operands[:1] == operands[:1]:
+            tokens.append('call' if operands[0] == 'ra' else 'tail')
+            idx += 2
+            continue
+        if opcode in BRANCH_OPCODES and operands:
+            try:
+                dest = int(operands[-1], 16)
+            except ValueError:
+                dest = None
+            if opcode == 'jal' and (len(operands) == 1 or operands[0] == 'ra'):
+                tokens.append('call')
+            elif opcode in ('j', 'jal') and dest is not None and not start <= dest <= end:
+                tokens.append('tail')
+            else:
+                tokens.append(f'{opcode} {",".join(_operand_token(o, False) for o in operands[:-1])}')
+            idx += 1
+            continue
+        if opcode == 'mv':
+            opcode = 'addi'
+            operands = [*operands, '0']
+        keep_immediate = opcode in CONSTANT_OPCODES or 'sp' in operands
+        tokens.append(f'{opcode} {",".join(_operand_token(o, keep_immediate) for o in operands)}')
+        idx += 1
+    return tokens
+
+
+def ngrams(func: Function) -> Set[Tuple[str, ...]]:
+    """
+    :returns: Distinct sequences of ``NGRAM_LENGTH`` normalized instructions of the function, or the whole function if
+              it's shorter
+    """
+    tokens = instruction_tokens(func)
+    if len(tokens) <= NGRAM_LENGTH:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + NGRAM_LENGTH]) for i in range(len(tokens) - NGRAM_LENGTH + 1)}
+
+
+class SimilarityIndex:
+    """
+    Inverted index from the instruction n-grams of firmware functions to the functions containing them. Functions are
+    ranked by the Jaccard similarity of their n-gram sets, which tolerates the few instructions the linker rewrites
+    (relaxations) and small source differences.
+    """
+
+    def __init__(self, elf_hashes: Dict[str, str], functions: List[IndexedFunction], ngram_counts: array,
+                 postings: Dict[Tuple[str, ...], array]):
+        self.elf_hashes = elf_hashes
+        self.functions = functions
+        self.ngram_counts = ngram_counts
+        self.postings = postings
+
+    @classmethod
+    def build(cls, elf_paths: Iterable[Path]) -> 'SimilarityIndex':
+        elf_hashes: Dict[str, str] = {}
+        functions: List[IndexedFunction] = []
+        ngram_counts = array('I')
+        postings: Dict[Tuple[str, ...], array] = {}
+        # pyelftools is only needed to build the index, and is slow to import
+        from odiff.elfasm import linked_functions
+        for elf_path in elf_paths:
+            elf_hashes[elf_path.name] = hash_file(elf_path)
+            with open(elf_path, 'rb') as f:
+                funcs = linked_functions(f)
+            for func in funcs:
+                if not func.asm_lines:
+                    continue
+                func_id = len(functions)
+                functions.append(
+                    IndexedFunction(elf_path.name, func.name, func.asm_lines[0].offset, len(func.asm_lines)))
+                grams = ngrams(func)
+                ngram_counts.append(len(grams))
+                for gram in grams:
+                    ids = postings.get(gram)
+                    if ids is None:
+                        ids = postings[gram] = array('I')
+                    ids.append(func_id)
+        return cls(elf_hashes, functions, ngram_counts, postings)
+
+    @classmethod
+    def load(cls, elf_paths: Iterable[Path] = tuple(BLOBS_DIR / name for name in FIRMWARE_ELFS),
+             path: Path = CACHE_DIR / 'simindex.pickle') -> 'SimilarityIndex':
+        """
+        Load the index of ``elf_paths`` from ``path``, building (and storing) it again if any of them changed.
+        """
+        elf_paths = list(elf_paths)
+        elf_hashes = {elf_path.name: hash_file(elf_path) for elf_path in elf_paths}
+        try:
+            with open(path, 'rb') as f:
+                version, index = pickle.load(f)
+            if version == FORMAT_VERSION and index.elf_hashes == elf_hashes:
+                return index
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+            pass
+        index = cls.build(elf_paths)
+        atomic_write(path, pickle.dumps((FORMAT_VERSION, index), protocol=pickle.HIGHEST_PROTOCOL))
+        return index
+
+    def query(self, func: Function, count: int = 5) -> List[Match]:
+        """
+        :returns: The ``count`` indexed functions most similar to ``func``, most similar first
+        """
+        grams = ngrams(func)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for func_id in self.postings.get(gram, ()):
+                shared[func_id] = shared.get(func_id, 0) + 1
+        scores = [
+            (common / (len(grams) + self.ngram_counts[func_id] - common), func_id)
+            for func_id, common in shared.items()
+        ]
+        scores.sort(key=lambda s: (-s[0], s[1]))
+        return [Match(score, self.functions[func_id]) for score, func_id in scores[:count]]
@@ -1,7 +1,8 @@
 import os
 import shutil
 import subprocess
-import sys
+from collections import namedtuple
+from functools import lru_cache
 from typing import List, Any
 
 SUBPROCESS_ENV = {
@@ -9,23 +10,25 @@ SUBPROCESS_ENV = {
     'PATH': os.environ['PATH'],
     'TERM': os.environ.get('TERM', '')
 }
-GCC: str
+# Target prefixes the toolchain may be installed under, in order of preference
+TOOLCHAIN_PREFIXES = ('riscv32-unknown-elf-', 'riscv64-unknown-elf-', 'riscv-unknown-elf-')
 
+Toolchain = namedtuple('Toolchain', 'prefix gcc readelf objdump')
 
-# Locate GCC
-gcc_found = False
-for prefix in ('riscv32-unknown-elf-', 'riscv64-unknown-elf-', 'riscv-unknown-elf-'):
-    if shutil.which(prefix + 'gcc') is not None:
-        PREFIX = prefix
-        GCC = prefix + 'gcc'
-        READELF = prefix + 'readelf'
-        OBJDUMP = prefix + 'objdump'
-        gcc_found = True
-        break
 
-if not gcc_found:
-    print("RISC-V toolchain not found in $PATH. Please install a riscv32-unknown-elf-gcc toolchain", file=sys.stderr)
-    sys.exit(1)
+@lru_cache(maxsize=None)
+def find_toolchain() -> Toolchain:
+    """
+    Locate the RISC-V toolchain in $PATH. This only happens once it's first needed, so that tools (or modes) that
+    don't build or disassemble anything work without it.
+
+    :raises FileNotFoundError: If no RISC-V GCC is in $PATH
+    """
+    for prefix in TOOLCHAIN_PREFIXES:
+        if shutil.which(prefix + 'gcc') is not None:
+            return Toolchain(prefix, prefix + 'gcc', prefix + 'readelf', prefix + 'objdump')
+    raise FileNotFoundError(
+        "RISC-V toolchain not found in $PATH. Please install a riscv32-unknown-elf-gcc toolchain")
 
 
 def run(args: List[Any], check=True, capture_output=False) -> subprocess.CompletedProcess[bytes]:
@@ -36,8 +39,24 @@ def run(args: List[Any], check=True, capture_output=False) -> subprocess.Complet
 
 
 def gcc(*args, check=True, capture_output=False) -> subprocess.CompletedProcess[bytes]:
-    return run([GCC, *args], check=check, capture_output=capture_output)
+    return run([find_toolchain().gcc, *args], check=check, capture_output=capture_output)
+
+
+@lru_cache(maxsize=None)
+def gcc_version() -> str:
+    """
+    Full version banner of the compiler in use, which identifies builds made by it.
+    """
+    return gcc('--version', capture_output=True).stdout.decode()
 
 
 def objdump(*args, check=True, capture_output=False) -> subprocess.CompletedProcess[bytes]:
-    return run([OBJDUMP, *args], check=check, capture_output=capture_output)
+    return run([find_toolchain().objdump, *args], check=check, capture_output=capture_output)
+
+
+@lru_cache(maxsize=None)
+def objdump_version() -> str:
+    """
+    Full version banner of the objdump in use, which the listings it prints depend on.
+    """
+    return objdump('--version', capture_output=True).stdout.decode()
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import os
+import pickle
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Iterable, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from elftools.dwarf.die import DIE
+
+from odiff.ar import open_object, hash_object
+from odiff.c import HeaderFile, CVariable
+from odiff.dwarf2c import die_get_name, die_get_at_type, die_to_ctype_or_func, is_static, Context, ContextRecorder
+from odiff.lib import Library
+from odiff.paths import VENDOR_PATH_PREFIX, REPO_ROOT, CACHE_DIR
+from odiff.riscvreloc import patch_elftools_relocs
+from odiff.utils import get_or_create, remove_prefixes, atomic_write, parallel_map
+
+# Bump when the layout of HeaderFile, the C elements or ObjectHeaders changes, so that stale databases are not loaded
+FORMAT_VERSION = 3
+
+
+def process_file(filename: Path, header_files: Dict[str, HeaderFile], ctx: Context):
+    from elftools.elf.elffile import ELFFile
+    with open_object(filename) as f:
+        elf = ELFFile(f)
+        symtab = elf.get_section_by_name('.symtab')
+        dwarf = elf.get_dwarf_info()
+        try:
+            cu = next(dwarf.iter_CUs())
+        except StopIteration:
+            return
+        lp = dwarf.line_program_for_CU(cu)
+        include_directories: List[str] = [x.decode() for x in lp.header.include_directory]
+        file_entries: List[HeaderFile] = [
+            get_or_create(
+                header_files,
+                remove_prefixes(
+                    f'{include_directories[x.dir_index - 1]}/{x.name.decode()}',
+                    [VENDOR_PATH_PREFIX, f'{REPO_ROOT}/'])
+                if x.dir_index != 0 else x.name.decode(),
+                lambda path: HeaderFile(path)
+            )
+            for x in lp['file_entry']
+        ]
+        cu_die: DIE = cu.get_top_DIE()
+        for die in cu_die.iter_children():
+            die: DIE
+            if not 'DW_AT_decl_file' in die.attributes:
+                continue
+            decl_file = file_entries[die.attributes['DW_AT_decl_file'].value - 1]
+            decl_line = die.attributes['DW_AT_decl_line'].value
+            name: Optional[str] = die_get_name(die)
+            if die.tag == 'DW_TAG_variable':
+                if 'DW_AT_specification' in die.attributes:
+                    var_spec_die = cu.get_DIE_from_refaddr(die.attributes['DW_AT_specification'].value)
+                    name = die_get_name(var_spec_die)
+                    assert name is not None
+                    entry = CVariable(
+                        type=die_get_at_type(var_spec_die), name=name,
+                        extern='DW_AT_external' in die.attributes, static=False)
+                else:
+                    _, static = is_static(symtab, name)
+                    entry = CVariable(
+                        type=die_get_at_type(die), name=name,
+                        extern='DW_AT_external' in die.attributes, static=static,
+                        defined='DW_AT_declaration' not in die.attributes)
+            else:
+                if name is None:
+                    continue
+                entry = die_to_ctype_or_func(ctx, die, symtab)
+            decl_file.defs[name] = entry
+            decl_file.def_lines[name] = decl_line
+            if 'DW_AT_decl_column' in die.attributes:
+                decl_file.def_columns[name] = die.attributes['DW_AT_decl_column'].value
+
+
+class ObjectHeaders:
+    """
+    Definitions collected from a single object, which can be pickled back from a worker process. Functions are
+    resolved against the Context of the object's library once merged.
+    """
+
+    def __init__(self, name: str):
+        self.header_files: Dict[str, HeaderFile] = {}
+        self.ctx = ContextRecorder(name)
+
+    def merge_into(self, header_files: Dict[str, HeaderFile], ctx: Context):
+        """
+        Merge into the header files of a library. Objects must be merged in the order they'd have been collected in.
+        """
+        substitutions = self.ctx.replay(ctx)
+        for path, obj_header in self.header_files.items():
+            header = get_or_create(header_files, path, lambda p: HeaderFile(p))
+            for name, entry in obj_header.defs.items():
+                header.defs[name] = substitutions.get(id(entry), entry)
+            header.def_lines.update(obj_header.def_lines)
+            header.def_columns.update(obj_header.def_columns)
+
+
+def collect_object(name: str, obj_path: Path) -> ObjectHeaders:
+    """
+    :param name: Name of the object for ODR violation reports, e.g. ``vendor_libatcmd/at_server.o``
+    """
+    patch_elftools_relocs()
+    obj = ObjectHeaders(name)
+    process_file(obj_path, obj.header_files, obj.ctx)
+    return obj
+
+
+def _collect_vendor_object(task: Tuple[str, Path]) -> bytes:
+    lib_name, obj_path = task
+    print(f"Collecting vendor {lib_name}/{obj_path.name}")
+    return pickle.dumps(collect_object(f'vendor_{lib_name}/{obj_path.name}', obj_path),
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class TypeDatabase:
+    """
+    C types, variables and functions of a vendor library, extracted from the DWARF of its objects and stored on disk.
+
+    Objects are only collected again when their content changes. Each object is stored pickled on its own: merging
+    resolves functions against a shared Context, which mutates them, so every merge starts from fresh copies.
+    """
+
+    def __init__(self, lib: Library, objects: Dict[str, Tuple[str, bytes]]):
+        """
+        :param objects: Pickled ObjectHeaders and content hash, per object name
+        """
+        self.lib = lib
+        self.objects = objects
+
+    @staticmethod
+    def path(lib: Library, root: Path = CACHE_DIR / 'types') -> Path:
+        return root / f'{lib.name}.pickle'
+
+    @classmethod
+    def load(cls, lib: Library, jobs: int = 1, root: Path = CACHE_DIR / 'types', use_stored: bool = True,
+             patterns: Iterable[str] = ()) -> 'TypeDatabase':
+        """
+        Load the database of ``lib``, collecting whatever objects are new or changed since it was saved.
+
+        :param jobs: Number of objects to collect in parallel
+        :param use_stored: Reuse what's stored for unchanged objects, otherwise collect the objects again
+        :param patterns: Only bring the objects matching these (all of them by default) up to date; what's stored for
+                         the others is kept as is, and only objects in scope should be merged
+        """
+        path = cls.path(lib, root)
+        objects: Dict[str, Tuple[str, bytes]] = {}
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            if entry['version'] == FORMAT_VERSION:
+                objects = entry['objects']
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+            pass
+        obj_paths = list(lib.get_vendorobj_paths(list(patterns)))
+        hashes = {obj_path.name: hash_object(obj_path) for obj_path in obj_paths}
+        stale = [
+            obj_path for obj_path in obj_paths
+            if not use_stored or objects.get(obj_path.name, (None,))[0] != hashes[obj_path.name]
+        ]
+        for obj_path, obj in zip(stale, parallel_map(_collect_vendor_object, [(lib.name, p) for p in stale], jobs)):
+            objects[obj_path.name] = (hashes[obj_path.name], obj)
+        removed = objects.keys() - {obj_path.name for obj_path in lib.get_vendorobj_paths([])}
+        for name in removed:
+            del objects[name]
+        if stale or removed:
+            atomic_write(path, pickle.dumps(
+                {'version': FORMAT_VERSION, 'objects': objects}, protocol=pickle.HIGHEST_PROTOCOL))
+        return cls(lib, objects)
+
+    def object_names(self, patterns: Iterable[str] = ()) -> List[str]:
+        return [obj_path.name for obj_path in self.lib.get_vendorobj_paths(list(patterns))]
+
+    def merge_into(self, header_files: Dict[str, HeaderFile], patterns: Iterable[str] = ()):
+        """
+        Merge the objects matching ``patterns`` (all of them by default) into ``header_files``, e.g. to gather the
+        headers of several libraries.
+        """
+        ctx = Context(f'vendor_{self.lib.name}')
+        for name in self.object_names(patterns):
+            obj: ObjectHeaders = pickle.loads(self.objects[name][1])
+            obj.merge_into(header_files, ctx)
+
+    def header_files(self, patterns: Iterable[str] = ()) -> Dict[str, HeaderFile]:
+        """
+        :returns: Definitions of the objects matching ``patterns``, by header path and then by symbol name
+        """
+        header_files: Dict[str, HeaderFile] = {}
+        self.merge_into(header_files, patterns)
+        return header_files
+
+
+def source_root(header_files: Dict[str, HeaderFile]) -> str:
+    """
+    :returns: Deepest directory containing the sources of all objects, i.e. the library's own directory
+    """
+    return os.path.commonpath([path for path in header_files if path.endswith('.c')])
+
+
+def dump_header_files(header_files: Dict[str, HeaderFile]) -> str:
+    """
+    Render the files of a library's own directory the way dwarf/*.h are laid out.
+    """
+    root = source_root(header_files) + '/'
+    sections: List[str] = []
+    for path, header in sorted(header_files.items()):
+        if not path.startswith(root):
+            continue
+        body = header.to_dump()
+        if body:
+            sections.append(f'/* {"=" * 8} {path} {"=" * 8} */\n\n{body}\n')
+    return '\n'.join(sections)
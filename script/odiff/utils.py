@@ -1,7 +1,11 @@
-from typing import TypeVar, Dict, Callable, Iterable
+import hashlib
+import os
+from pathlib import Path
+from typing import TypeVar, Dict, Callable, Iterable, Iterator
 
 _K = TypeVar('_K')
 _V = TypeVar('_V')
+_R = TypeVar('_R')
 
 
 def get_or_create(dict: Dict[_K, _V], key: _K, create: Callable[[_K], _V]) -> _V:
@@ -18,3 +22,35 @@ def remove_prefixes(text: str, prefixes: Iterable[str]) -> str:
         if text.startswith(prefix):
             return text[len(prefix):]
     return text
+
+
+def hash_file(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def atomic_write(path: Path, data: bytes):
+    """
+    Write ``data`` to ``path`` so that concurrent readers (e.g. other worker processes) never see a partial file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def parallel_map(func: Callable[[_V], _R], items: Iterable[_V], jobs: int = 1) -> Iterator[_R]:
+    """
+    Like ``map``, but spread over ``jobs`` worker processes when ``jobs`` is greater than 1.
+
+    Results are yielded in the order of ``items`` regardless of which worker finishes first, so output built from them
+    stays reproducible. ``func`` and the items must be picklable.
+    """
+    if jobs <= 1:
+        yield from map(func, items)
+        return
+    # Only imported when needed, since multiprocessing adds to the startup time of every tool
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(func, items)
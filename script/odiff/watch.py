@@ -0,0 +1,112 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+from pathlib import Path
+from struct import Struct
+from typing import Iterable, Iterator, Set, Dict, Tuple, List, Optional
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CLOEXEC = 0o2000000
+# wd, mask, cookie and length of the name that follows
+INOTIFY_EVENT_STRUCT = Struct('iIII')
+
+# Editors may write a file in several steps (or several files at once), wait for this long without events
+SETTLE_TIME = 0.05
+POLL_INTERVAL = 0.5
+
+
+class InotifyWatcher:
+    """
+    Files written (or moved) into a set of directories, through Linux's inotify. Subdirectories aren't watched.
+    """
+
+    def __init__(self, dirs: Iterable[Path]):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs: Dict[int, Path] = {}
+        for d in dirs:
+            if not d.is_dir():
+                continue
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(d), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"Cannot watch {d}")
+            self.dirs[wd] = d
+
+    def _read(self, timeout: Optional[float]) -> Set[Path]:
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed: Set[Path] = set()
+        pos = 0
+        while pos < len(data):
+            wd, _, _, length = INOTIFY_EVENT_STRUCT.unpack_from(data, pos)
+            pos += INOTIFY_EVENT_STRUCT.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            if wd in self.dirs and name:
+                changed.add(self.dirs[wd] / os.fsdecode(name))
+        return changed
+
+    def changes(self) -> Iterator[Set[Path]]:
+        while True:
+            changed = self._read(None)
+            while more := self._read(SETTLE_TIME):
+                changed |= more
+            if changed:
+                yield changed
+
+
+class PollingWatcher:
+    """
+    Files modified in a set of directories, found by comparing their mtime and size every ``interval`` seconds. For
+    systems without inotify.
+    """
+
+    def __init__(self, dirs: Iterable[Path], interval: float = POLL_INTERVAL):
+        self.dirs: List[Path] = list(dirs)
+        self.interval = interval
+        self.files = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        files: Dict[Path, Tuple[int, int]] = {}
+        for d in self.dirs:
+            try:
+                entries = list(os.scandir(d))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_file():
+                    st = entry.stat()
+                    files[d / entry.name] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def changes(self) -> Iterator[Set[Path]]:
+        while True:
+            time.sleep(self.interval)
+            files = self._scan()
+            changed = {path for path, stat in files.items() if self.files.get(path) != stat}
+            self.files = files
+            if changed:
+                yield changed
+
+
+def watch_files(dirs: Iterable[Path]) -> Iterator[Set[Path]]:
+    """
+    Wait for files to change in ``dirs``, with inotify where available.
+
+    :returns: Sets of paths (within ``dirs``, as given) changed together
+    """
+    dirs = list(dict.fromkeys(dirs))
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(dirs).changes()
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), polling for changes instead", file=sys.stderr)
+    return PollingWatcher(dirs).changes()
@@ -2,6 +2,8 @@
 
 from typing import List, Union, Optional
 
+from odiff.linkmap import MapIndex
+
 def ident(l, n=1, ch="    "):
     si = ch * n
     return [si + i for i in l]
@@ -304,7 +306,10 @@ def HasField(addr):
         return context.r.hasField(addr)
     print("You are not in any register")
 
-def CAccess(peris, addr, mask):
+def CAccess(peris, addr, mask, symbols: Optional[MapIndex] = None):
+    """
+    :param symbols: Symbols of a linker map, to describe addresses outside of peripherals (e.g. ``wifi_env+0x10``)
+    """
     for p_name, p in peris.items():
         if p.base <= addr and p.base + p.size >= addr:
             r = p.findReg(addr)
@@ -320,6 +325,8 @@ def CAccess(peris, addr, mask):
                             return f"({p_name.upper()}->{r.name}.value) & {hex(mask)}"
                 else:
                     return f"{p_name.upper()}->{r.name}"
+    if symbols is not None:
+        return symbols.describe(addr)
             
 
 def RegFromComment(addr, comment:str):
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+from odiff.ar import open_object
+from odiff.elfasm import object_functions
+from odiff.paths import BLOBS_DIR
+from odiff.simindex import SimilarityIndex, FIRMWARE_ELFS
+
+
+def main():
+    parser = ArgumentParser(description="Find the firmware functions most similar to the functions of an object")
+    parser.add_argument(
+        '-n', '--count', type=int, default=5, help="Number of matches to show per function")
+    parser.add_argument(
+        '--elf', dest='elfs', type=str, action='append',
+        help="Firmware ELF to search in, can be repeated (default: the ones in blobs/)")
+    parser.add_argument(dest='object', type=str, help="Object file (or archive member, e.g. blobs/libatcmd.a/at.o)")
+    parser.add_argument(dest='functions', type=str, nargs='*', help="Functions to look up (default: all)")
+    args = parser.parse_args()
+    elf_paths = [Path(p) for p in args.elfs] if args.elfs else [BLOBS_DIR / name for name in FIRMWARE_ELFS]
+    with open_object(Path(args.object)) as f:
+        funcs = object_functions(f)
+    unknown = set(args.functions) - set(funcs)
+    if unknown:
+        parser.error(f"Unknown functions: {', '.join(sorted(unknown))}")
+    index = SimilarityIndex.load(elf_paths)
+    for name, func in funcs.items():
+        if args.functions and name not in args.functions:
+            continue
+        start = time.perf_counter()
+        matches = index.query(func, args.count)
+        elapsed = time.perf_counter() - start
+        print(f'{name} ({len(func.asm_lines)} instructions, {elapsed * 1000:.1f} ms)')
+        for score, match in matches:
+            print(f'  {score:.2f}  {match.elf}  0x{match.address:08x}  {match.name} ({match.length} instructions)')
+
+
+if __name__ == '__main__':
+    main()
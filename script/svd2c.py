@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import xml.etree.ElementTree as ET
 from reglib import *
+from odiff.linkmap import MapIndex
+from odiff.paths import BLOBS_DIR
 from typing import Mapping
 
 peris :Mapping[str, peripheral] = {}
@@ -55,4 +57,4 @@ if __name__ == '__main__':
             mask = 0
             if len(sys.argv) == 3:
                 mask = int(sys.argv[2], 16)
-            print(CAccess(peris, addr, mask))
\ No newline at end of file
+            print(CAccess(peris, addr, mask, MapIndex.load(BLOBS_DIR / 'bl602_demo_wifi.map')))
\ No newline at end of file